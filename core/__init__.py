@@ -1,4 +1,4 @@
-from typing import Iterable
+from typing import Iterable, List
 
 
 def readlines(file, EOF: str = None) -> Iterable[str]:
@@ -10,3 +10,12 @@ def readlines(file, EOF: str = None) -> Iterable[str]:
         else:
             # exclude the newline
             yield line[:-1]
+
+
+def splitlines(text: str) -> List[str]:
+    # Same lines as readlines, without dropping the last character of a
+    # final line which has no newline
+    lines = text.split('\n')
+    if lines[-1] == str():
+        lines.pop()
+    return lines
@@ -3,11 +3,12 @@ from __future__ import annotations
 import json
 
 from enum import Enum
-from typing import Iterable, Optional
+from typing import Any, Iterable, List, Optional
 
 
 NodeType = Enum('NodeType', [
     'SEQUENCE',
+    'STATEMENT_LIST',
     'BLOCK',
     'EXPRESSION',
     'ADD',
@@ -31,6 +32,7 @@ NodeType = Enum('NodeType', [
     'INT',
     'STR',
     'ARRAY',
+    'ARRAY_LIST',
     'WHILE',
     'IF',
     'ELSE',
@@ -57,11 +59,21 @@ class Node:
             type: NodeType,
             left: Optional[Node] = None,
             right: Optional[Node] = None,
-            value: Optional[str] = None):
+            value: Optional[str] = None,
+            children: Optional[List[Node]] = None,
+            row: Optional[int] = None,
+            column: Optional[int] = None):
         self.type = type
         self.left = left
         self.right = right
         self.value = value
+        # N-ary nodes (eg. statement list) have children instead of left and right
+        self.children = children
+        # Value known before walking (eg. array of literals), if any
+        self.constant: Any = None
+        # Source position of the first token, if parsed
+        self.row = row
+        self.column = column
 
     def as_dict(self) -> dict:
         # Recursive traversal
@@ -72,6 +84,8 @@ class Node:
             result['left'] = self.left.as_dict()
         if self.right:
             result['right'] = self.right.as_dict()
+        if self.children is not None:
+            result['children'] = [child.as_dict() for child in self.children]
         return result
 
     def as_json(self) -> str:
@@ -87,6 +101,9 @@ class Node:
                 yield ';'
             elif node.is_leaf:
                 yield '%s\t%s' % (node.type.name, node.value)
+            elif node.children is not None:
+                yield '%s\t%d' % (node.type.name, len(node.children))
+                stack.extend(reversed(node.children))  # Push (to end)
             else:
                 yield node.type.name
                 stack.append(node.right)  # Push (to end)
@@ -98,6 +115,11 @@ class Node:
         else:
             if node.is_leaf:
                 yield '%s\t%s' % (node.type.name, node.value)
+            elif node.children is not None:
+                yield '%s\t%d' % (node.type.name, len(node.children))
+                for child in node.children:
+                    for child_node in self.as_lines_recursive(child):
+                        yield child_node
             else:
                 yield node.type.name
                 for left_node in self.as_lines_recursive(node.left):
@@ -109,3 +131,23 @@ class Node:
         return '<{class_name} {type}>'.format(
             class_name=self.__class__.__name__,
             type=self.type.name)
+
+
+def locate(node: Optional[Node], source: Optional[Node]) -> Optional[Node]:
+    # Position of a node rewritten from another, eg. when optimized
+    if node is not None and source is not None:
+        node.row = source.row
+        node.column = source.column
+    return node
+
+
+def literal_value(node: Optional[Node]) -> Any:
+    # Value of a literal, or None if not known before walking
+    if node is None:
+        return None
+    elif node.type is NodeType.INT:
+        return int(node.value)
+    elif node.type is NodeType.STR:
+        return node.value
+    else:
+        return node.constant
@@ -0,0 +1,164 @@
+import contextlib
+import io
+import random
+import time
+import tracemalloc
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.ast import Node
+from core.lexer import Lexer
+from core.parser import Parser
+from core.walker import Walker
+
+
+class ProgramGenerator:
+    '''
+    Seeded generator of elang programs which terminate, for benchmarks.
+    '''
+    def __init__(
+        self,
+        seed: int = 0,
+        statements: int = 100,
+        depth: int = 1,
+        array_length: int = 0,
+        identifiers: int = 8,
+    ) -> None:
+        self.random = random.Random(seed)
+        self.statements = statements
+        self.depth = depth
+        self.array_length = array_length
+        self.identifiers = max(1, identifiers)
+        self.arrays = 0
+
+    def identifier(self) -> str:
+        return 'v{}'.format(self.random.randrange(self.identifiers))
+
+    def operand(self) -> str:
+        if self.random.random() < 0.5:
+            return self.identifier()
+        return str(self.random.randrange(100))
+
+    def expression(self) -> str:
+        operator = self.random.choice(['+', '-', '*'])
+        return '% ({} {} {}) 1000'.format(operator, self.operand(), self.operand())
+
+    def condition(self) -> str:
+        operator = self.random.choice(['<', '>', '==', '!='])
+        return '{} {} {}'.format(operator, self.identifier(), self.operand())
+
+    def assignment(self) -> str:
+        return '{} = {};'.format(self.identifier(), self.expression())
+
+    def array(self) -> str:
+        name = 'a{}'.format(self.arrays)
+        self.arrays += 1
+        items = ''.join(
+            '{}, '.format(self.operand())
+            for _ in range(self.array_length))
+        return '{} = [{}];'.format(name, items)
+
+    def nested(self, depth: int, indent: str) -> List[str]:
+        if depth == 0:
+            return [indent + self.assignment()]
+        lines = [indent + 'if ({}) {{'.format(self.condition())]
+        lines.extend(self.nested(depth - 1, indent + '    '))
+        lines.append(indent + '}')
+        return lines
+
+    def statement(self) -> List[str]:
+        choice = self.random.random()
+        if self.array_length > 0 and choice < 0.1:
+            return [self.array()]
+        elif self.depth > 0 and choice < 0.4:
+            return self.nested(self.depth, indent='')
+        else:
+            return [self.assignment()]
+
+    def lines(self) -> Iterable[str]:
+        for index in range(self.identifiers):
+            yield 'v{} = {};'.format(index, index)
+        for _ in range(self.statements):
+            for line in self.statement():
+                yield line
+
+    def __call__(self) -> str:
+        return '\n'.join(self.lines()) + '\n'
+
+
+def count_nodes(node: Optional[Node]) -> int:
+    # Non-recursive traversal
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        count += 1
+        stack.append(node.left)
+        stack.append(node.right)
+        if node.children is not None:
+            stack.extend(node.children)
+    return count
+
+
+def measure(function: Callable[[], Any], repeat: int) -> Tuple[Any, Dict[str, Any]]:
+    # Best of repeated runs, then one more traced run for peak memory
+    result = None
+    seconds = None
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = function()
+            elapsed = time.perf_counter() - start
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+        tracemalloc.start()
+        try:
+            function()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    except (RecursionError, MemoryError) as error:
+        return None, dict(error=type(error).__name__)
+    return result, dict(seconds=seconds, peak_memory_bytes=peak)
+
+
+def per_second(count: int, seconds: float) -> Optional[float]:
+    return count / seconds if seconds else None
+
+
+def bench_pipeline(program: str, repeat: int = 3) -> Dict[str, Any]:
+    lexer = Lexer()
+    parser = Parser()
+    report = dict(source=dict(
+        lines=program.count('\n'),
+        bytes=len(program.encode('utf-8'))))
+
+    tokens, report['lex'] = measure(
+        lambda: list(lexer.from_program_text(program)), repeat)
+    if tokens is None:
+        return report
+    report['lex']['tokens'] = len(tokens)
+    report['lex']['tokens_per_second'] = per_second(
+        len(tokens), report['lex']['seconds'])
+
+    ast, report['parse'] = measure(lambda: parser(tokens), repeat)
+    if ast is None:
+        return report
+    nodes = count_nodes(ast)
+    report['parse']['nodes'] = nodes
+    report['parse']['nodes_per_second'] = per_second(
+        nodes, report['parse']['seconds'])
+
+    def walk() -> bool:
+        with contextlib.redirect_stdout(io.StringIO()):
+            Walker()(ast)
+        return True
+
+    walked, report['walk'] = measure(walk, repeat)
+    if walked is None:
+        return report
+    report['walk']['nodes'] = nodes
+    report['walk']['nodes_per_second'] = per_second(
+        nodes, report['walk']['seconds'])
+    return report
@@ -0,0 +1,544 @@
+from array import array
+from enum import IntEnum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from core.ast import Node, NodeType
+from core.inference import block_frame_sizes
+from core.resolver import Resolver, Slot, undefined_message
+from core.variables import Variable
+
+
+class Opcode(IntEnum):
+    # Stack
+    LOAD_CONST = 1
+    LOAD_CONST_ARRAY = 2
+    LOAD_SLOT = 3
+    STORE_SLOT = 4
+    POP = 5
+    BUILD_ARRAY = 6
+    LOAD_ARRAY = 7
+    LOAD_INDEX = 8
+    STORE_INDEX = 9
+    LOAD_MAP = 10
+    STORE_MAP = 11
+    STORE_SLOT_CHECKED = 12
+    BUILD_MAP = 13
+
+    # Operators
+    ADD = 20
+    SUBTRACT = 21
+    MULTIPLY = 22
+    DIVIDE = 23
+    MOD = 24
+    EQUAL = 25
+    NOT_EQUAL = 26
+    LESS_THAN = 27
+    LESS_THAN_OR_EQUAL = 28
+    GREATER_THAN = 29
+    GREATER_THAN_OR_EQUAL = 30
+    NOT = 33
+
+    # Control flow
+    JUMP = 40
+    POP_JUMP_IF_FALSE = 41
+    SCOPE_ENTER = 42
+    SCOPE_EXIT = 43
+    # Short-circuit, keep the left operand as the result or pop it
+    JUMP_IF_FALSE_OR_POP = 44
+    JUMP_IF_TRUE_OR_POP = 45
+
+    # Compare and branch, jump unless the comparison holds
+    JUMP_IF_NOT_EQUAL = 50
+    JUMP_IF_NOT_NOT_EQUAL = 51
+    JUMP_IF_NOT_LESS_THAN = 52
+    JUMP_IF_NOT_LESS_THAN_OR_EQUAL = 53
+    JUMP_IF_NOT_GREATER_THAN = 54
+    JUMP_IF_NOT_GREATER_THAN_OR_EQUAL = 55
+
+    # Superinstructions
+    LOAD_SLOT_SLOT = 60
+    LOAD_SLOT_CONST = 61
+    INCREMENT_SLOT = 62
+
+    # Statements
+    PRINT_CHARACTER = 70
+    PRINT_VALUE = 71
+    ASSERT = 72
+    FAIL = 73
+
+
+# Every instruction is an opcode and two arguments
+INSTRUCTION_SIZE = 3
+
+BINARY_OPCODES = dict([
+    (NodeType.ADD, Opcode.ADD),
+    (NodeType.SUBTRACT, Opcode.SUBTRACT),
+    (NodeType.MULTIPLY, Opcode.MULTIPLY),
+    (NodeType.DIVIDE, Opcode.DIVIDE),
+    (NodeType.MOD, Opcode.MOD),
+    (NodeType.EQUAL, Opcode.EQUAL),
+    (NodeType.NOT_EQUAL, Opcode.NOT_EQUAL),
+    (NodeType.LESS_THAN, Opcode.LESS_THAN),
+    (NodeType.LESS_THAN_OR_EQUAL, Opcode.LESS_THAN_OR_EQUAL),
+    (NodeType.GREATER_THAN, Opcode.GREATER_THAN),
+    (NodeType.GREATER_THAN_OR_EQUAL, Opcode.GREATER_THAN_OR_EQUAL),
+])
+
+# Right operand only evaluated when the left does not decide the result
+SHORT_CIRCUIT_OPCODES = dict([
+    (NodeType.AND, Opcode.JUMP_IF_FALSE_OR_POP),
+    (NodeType.OR, Opcode.JUMP_IF_TRUE_OR_POP),
+])
+
+COMPARE_JUMP_OPCODES = dict([
+    (NodeType.EQUAL, Opcode.JUMP_IF_NOT_EQUAL),
+    (NodeType.NOT_EQUAL, Opcode.JUMP_IF_NOT_NOT_EQUAL),
+    (NodeType.LESS_THAN, Opcode.JUMP_IF_NOT_LESS_THAN),
+    (NodeType.LESS_THAN_OR_EQUAL, Opcode.JUMP_IF_NOT_LESS_THAN_OR_EQUAL),
+    (NodeType.GREATER_THAN, Opcode.JUMP_IF_NOT_GREATER_THAN),
+    (NodeType.GREATER_THAN_OR_EQUAL, Opcode.JUMP_IF_NOT_GREATER_THAN_OR_EQUAL),
+])
+
+JUMP_OPCODES = frozenset([
+    Opcode.JUMP,
+    Opcode.POP_JUMP_IF_FALSE,
+] + list(COMPARE_JUMP_OPCODES.values()) + list(SHORT_CIRCUIT_OPCODES.values()))
+
+# Opcodes whose first argument is an index into slots
+SLOT_OPCODES = frozenset([
+    Opcode.LOAD_SLOT,
+    Opcode.STORE_SLOT,
+    Opcode.STORE_SLOT_CHECKED,
+    Opcode.LOAD_ARRAY,
+    Opcode.LOAD_MAP,
+    Opcode.STORE_MAP,
+    Opcode.LOAD_SLOT_SLOT,
+    Opcode.LOAD_SLOT_CONST,
+    Opcode.INCREMENT_SLOT,
+])
+
+# Opcodes whose first argument is an index into constants
+CONSTANT_OPCODES = frozenset([
+    Opcode.LOAD_CONST,
+    Opcode.LOAD_CONST_ARRAY,
+    Opcode.ASSERT,
+    Opcode.FAIL,
+])
+
+
+class Code:
+    '''
+    Flat instruction stream in an integer array, with the constants and
+    variable slots its instructions refer to by index.
+    '''
+    def __init__(self) -> None:
+        self.instructions = array('i')
+        self.constants: List[Any] = []
+        # Depth and index of every slot, with its name for messages
+        self.slots: List[Tuple[int, int]] = []
+        self.names: List[str] = []
+        # Global scope before the run, and after
+        self.preset_names: List[str] = []
+        self.global_names: List[str] = []
+        self.constant_index: Dict[Tuple[type, Any], int] = dict()
+        self.slot_index: Dict[Tuple[str, int, int], int] = dict()
+
+    def __len__(self) -> int:
+        return len(self.instructions)
+
+    def add_constant(self, value: Any) -> int:
+        if type(value) is list:
+            # Arrays are mutable, never shared
+            self.constants.append(value)
+            return len(self.constants) - 1
+        key = (type(value), value)
+        if key not in self.constant_index:
+            self.constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return self.constant_index[key]
+
+    def add_slot(self, name: str, slot: Slot) -> int:
+        key = (name, slot.depth, slot.index)
+        if key not in self.slot_index:
+            self.slot_index[key] = len(self.slots)
+            self.slots.append((slot.depth, slot.index))
+            self.names.append(name)
+        return self.slot_index[key]
+
+    def emit(self, opcode: Opcode, a: int = 0, b: int = 0) -> int:
+        offset = len(self.instructions)
+        self.instructions.extend([opcode, a, b])
+        return offset
+
+    def patch(self, offset: int, target: Optional[int] = None) -> None:
+        # Point jump at offset to target, by default the next instruction
+        self.instructions[offset + 1] = len(self) if target is None else target
+
+
+class BytecodeCompiler:
+    '''
+    Compile a tree into Code with an explicit stack of tasks instead of
+    recursion, like the walker, so programs are only limited in depth by
+    memory. Every task is an action and its argument; actions push the tasks
+    of their node in reverse order, and emit instructions when popped.
+    '''
+    def __call__(
+        self,
+        node: Optional[Node],
+        variables: Optional[Dict[str, Variable]] = None,
+    ) -> Code:
+        self.code = Code()
+        self.resolver = Resolver(variables)
+        self.frame_sizes = block_frame_sizes(node, variables)
+        self.code.preset_names = self.resolver.global_names()
+        self.tasks: List[Tuple[Callable[[Any], None], Any]] = [
+            (self.compile_statement, node)]
+        tasks = self.tasks
+        while tasks:
+            action, argument = tasks.pop()
+            action(argument)
+        self.code.global_names = self.resolver.global_names()
+        return self.code
+
+    def emit(self, opcode: Opcode, a: int = 0, b: int = 0) -> int:
+        return self.code.emit(opcode, a, b)
+
+    def emit_instruction(self, instruction: Tuple[Opcode, int, int]) -> None:
+        self.code.emit(*instruction)
+
+    def push_emit(self, opcode: Opcode, a: int = 0, b: int = 0) -> None:
+        # Emitted once the tasks pushed after it are done
+        self.tasks.append((self.emit_instruction, (opcode, a, b)))
+
+    def emit_fail(self, message: str) -> None:
+        # Errors are raised when reached, like the walker
+        self.emit(Opcode.FAIL, self.code.add_constant(message))
+
+    def add_slot(self, name: str) -> Optional[int]:
+        slot = self.resolver.resolve(name)
+        return None if slot is None else self.code.add_slot(name, slot)
+
+    def push_statements(self, nodes: List[Node]) -> None:
+        tasks = self.tasks
+        for node in reversed(nodes):
+            tasks.append((self.compile_statement, node))
+
+    def compile_statement(self, node: Optional[Node]) -> None:
+        tasks = self.tasks
+        if node is None:
+            return
+        elif node.type is NodeType.STATEMENT_LIST:
+            self.push_statements(node.children)
+        elif node.type is NodeType.SEQUENCE:
+            # Chain is linked backwards, from last statement to first
+            nodes = []
+            while node is not None and node.type is NodeType.SEQUENCE:
+                nodes.append(node.left)
+                node = node.right
+            nodes.append(node)
+            self.push_statements(list(reversed(nodes)))
+        elif node.type is NodeType.BLOCK:
+            size = self.frame_sizes[id(node)]
+            if size == 0:
+                # Declares nothing, runs in the enclosing frame
+                tasks.append((self.compile_statement, node.left))
+                return
+            self.emit(Opcode.SCOPE_ENTER, size)
+            self.resolver.enter()
+            tasks.append((self.exit_block, None))
+            tasks.append((self.compile_statement, node.left))
+        elif node.type is NodeType.ASSIGN:
+            self.compile_assign(node)
+        elif node.type is NodeType.IF:
+            # Offsets of the jumps taken when the condition is false
+            jumps_else: List[int] = []
+            tasks.append((self.compile_else, (node, jumps_else)))
+            tasks.append((self.compile_statement, node.right.left))
+            tasks.append((self.compile_condition, (node.left, jumps_else)))
+        elif node.type is NodeType.WHILE:
+            start = len(self.code)
+            jumps_end: List[int] = []
+            tasks.append((self.end_while, (start, jumps_end)))
+            tasks.append((self.compile_statement, node.right))
+            tasks.append((self.compile_condition, (node.left, jumps_end)))
+        elif node.type is NodeType.PRINT_CHARACTER:
+            self.push_emit(Opcode.PRINT_CHARACTER)
+            tasks.append((self.compile_expression, node.left))
+        elif node.type is NodeType.PRINT_STRING:
+            self.push_emit(Opcode.PRINT_VALUE)
+            tasks.append((self.compile_expression, node.left))
+        elif node.type is NodeType.ASSERT:
+            tasks.append((self.emit_assert, node))
+            tasks.append((self.compile_expression, node.left))
+        else:
+            # Expression as statement, value is unused
+            self.push_emit(Opcode.POP)
+            tasks.append((self.compile_expression, node))
+
+    def emit_assert(self, node: Node) -> None:
+        self.emit(Opcode.ASSERT, self.code.add_constant(
+            'assertion failed - node {}'.format(node.left.type.name)))
+
+    def exit_block(self, _: Any) -> None:
+        self.resolver.exit()
+        self.emit(Opcode.SCOPE_EXIT)
+
+    def compile_else(self, argument: Tuple[Node, List[int]]) -> None:
+        node, jumps_else = argument
+        if node.right.right is None:
+            self.patch_all(jumps_else)
+            return
+        jump_end = self.emit(Opcode.JUMP)
+        self.patch_all(jumps_else)
+        self.tasks.append((self.code.patch, jump_end))
+        self.tasks.append((self.compile_statement, node.right.right))
+
+    def end_while(self, argument: Tuple[int, List[int]]) -> None:
+        start, jumps_end = argument
+        self.emit(Opcode.JUMP, start)
+        self.patch_all(jumps_end)
+
+    def patch_all(self, offsets: List[int]) -> None:
+        for offset in offsets:
+            self.code.patch(offset)
+
+    def emit_jump(self, argument: Tuple[Opcode, List[int]]) -> None:
+        opcode, jumps = argument
+        jumps.append(self.emit(opcode))
+
+    def compile_condition(self, argument: Tuple[Node, List[int]]) -> None:
+        # Adds offsets of the jumps taken when the condition is false
+        node, jumps = argument
+        tasks = self.tasks
+        if node.type in COMPARE_JUMP_OPCODES:
+            tasks.append((self.emit_jump, (COMPARE_JUMP_OPCODES[node.type], jumps)))
+            tasks.append((self.compile_operands, node))
+        elif node.type is NodeType.AND:
+            # Either operand being false skips the rest
+            tasks.append((self.compile_condition, (node.right, jumps)))
+            tasks.append((self.compile_condition, (node.left, jumps)))
+        else:
+            tasks.append((self.emit_jump, (Opcode.POP_JUMP_IF_FALSE, jumps)))
+            tasks.append((self.compile_expression, node))
+
+    def compile_assign(self, node: Node) -> None:
+        target, expression = node.left, node.right
+        tasks = self.tasks
+        if target.type is NodeType.IDENTIFIER:
+            self.compile_assign_identifier(target.value, expression)
+        elif target.type is NodeType.IDENTIFIER_ARRAY:
+            tasks.append((self.store_array_item, target))
+            tasks.append((self.compile_expression, expression))
+        elif target.type is NodeType.IDENTIFIER_MAP:
+            if target.left.type is not NodeType.IDENTIFIER:
+                self.emit_fail('identifier map missing identifier')
+                return
+            name = target.left.value
+            if self.resolver.resolve(name) is None:
+                # Default value must be assigned first
+                tasks.append((self.emit_fail, undefined_message(name)))
+                tasks.append((self.compile_expression, target.right))
+                tasks.append((self.compile_expression, expression))
+                return
+            map_slot = self.add_slot(name + '#')
+            if map_slot is None:
+                # Declared before the value is evaluated, which declares nothing
+                self.emit(Opcode.BUILD_MAP)
+                map_slot = self.code.add_slot(
+                    name + '#', self.resolver.declare(name + '#', dict))
+                self.emit(Opcode.STORE_SLOT, map_slot)
+            self.push_emit(Opcode.STORE_MAP, map_slot)
+            tasks.append((self.compile_expression, target.right))
+            tasks.append((self.compile_expression, expression))
+        else:
+            self.emit_fail('cannot assign to unknown type')
+
+    def store_array_item(self, target: Node) -> None:
+        # Value to store is on the stack
+        indices = self.compile_array(target)
+        if indices is None:
+            return
+        tasks = self.tasks
+        self.push_emit(Opcode.STORE_INDEX)
+        tasks.append((self.compile_expression, indices[-1]))
+        for index in reversed(indices[:-1]):
+            self.push_emit(Opcode.LOAD_INDEX)
+            tasks.append((self.compile_expression, index))
+
+    def compile_assign_identifier(self, name: str, expression: Node) -> None:
+        slot = self.resolver.resolve(name)
+        if (
+            slot is not None and
+            slot.type is int and
+            expression.type in (NodeType.ADD, NodeType.SUBTRACT) and
+            expression.left.type is NodeType.IDENTIFIER and
+            expression.left.value == name and
+            expression.right.type is NodeType.INT
+        ):
+            # x = + x 1
+            step = int(expression.right.value)
+            if expression.type is NodeType.SUBTRACT:
+                step = -step
+            self.emit(
+                Opcode.INCREMENT_SLOT,
+                self.code.add_slot(name, slot),
+                self.code.add_constant(step))
+            return
+        value_type = self.resolver.expression_type(expression)
+        self.tasks.append((self.store_identifier, (name, value_type)))
+        self.tasks.append((self.compile_expression, expression))
+
+    def store_identifier(self, argument: Tuple[str, Optional[type]]) -> None:
+        name, value_type = argument
+        slot = self.resolver.resolve(name)
+        if slot is None:
+            slot = self.resolver.declare(name, value_type)
+            self.emit(Opcode.STORE_SLOT, self.code.add_slot(name, slot))
+        elif value_type is not None and value_type is slot.type:
+            self.emit(Opcode.STORE_SLOT, self.code.add_slot(name, slot))
+        else:
+            # Type of the variable is fixed by its first assignment
+            self.emit(Opcode.STORE_SLOT_CHECKED, self.code.add_slot(name, slot))
+
+    def compile_array(self, node: Node) -> Optional[List[Node]]:
+        # Loads the array of `name @ index @ ...`, returns index expressions
+        indices = []
+        while node.type is NodeType.IDENTIFIER_ARRAY:
+            indices.append(node.right)
+            node = node.left
+        if node.type is not NodeType.IDENTIFIER:
+            self.emit_fail('identifier array missing identifier')
+            return None
+        slot = self.resolver.resolve(node.value)
+        if slot is None:
+            self.emit_fail(undefined_message(node.value))
+            return None
+        opcode = Opcode.LOAD_SLOT if slot.type is list else Opcode.LOAD_ARRAY
+        self.emit(opcode, self.code.add_slot(node.value, slot))
+        return list(reversed(indices))
+
+    def compile_identifier(self, name: str) -> Optional[int]:
+        slot = self.add_slot(name)
+        if slot is None:
+            self.emit_fail('variable {} referenced before assignment'.format(name))
+        return slot
+
+    def compile_operands(self, node: Node) -> None:
+        left, right = node.left, node.right
+        if left is not None and left.type is NodeType.IDENTIFIER:
+            left_slot = self.add_slot(left.value)
+            if left_slot is not None:
+                if right is not None and right.type is NodeType.IDENTIFIER:
+                    right_slot = self.add_slot(right.value)
+                    if right_slot is not None:
+                        self.emit(Opcode.LOAD_SLOT_SLOT, left_slot, right_slot)
+                        return
+                elif right is not None and right.type is NodeType.INT:
+                    self.emit(
+                        Opcode.LOAD_SLOT_CONST,
+                        left_slot,
+                        self.code.add_constant(int(right.value)))
+                    return
+        self.tasks.append((self.compile_expression, right))
+        self.tasks.append((self.compile_expression, left))
+
+    def compile_short_circuit(self, node: Node) -> None:
+        # Left operand is on the stack
+        jump_end = self.emit(SHORT_CIRCUIT_OPCODES[node.type])
+        self.tasks.append((self.code.patch, jump_end))
+        self.tasks.append((self.compile_expression, node.right))
+
+    def load_map_item(self, node: Node) -> None:
+        # Key is on the stack
+        name = node.left.value
+        slot = self.add_slot(name)
+        map_slot = self.add_slot(name + '#')
+        if slot is None:
+            self.emit_fail(undefined_message(name))
+        elif map_slot is None:
+            self.emit_fail(undefined_message(name + '#'))
+        else:
+            self.emit(Opcode.LOAD_MAP, slot, map_slot)
+
+    def push_items(self, items: List[Node]) -> None:
+        # Array of the items, evaluated in order
+        tasks = self.tasks
+        self.push_emit(Opcode.BUILD_ARRAY, len(items))
+        for item in reversed(items):
+            tasks.append((self.compile_expression, item))
+
+    def compile_expression(self, node: Optional[Node]) -> None:
+        tasks = self.tasks
+        if node is None:
+            self.emit(Opcode.LOAD_CONST, self.code.add_constant(None))
+        elif node.type is NodeType.INT:
+            self.emit(Opcode.LOAD_CONST, self.code.add_constant(int(node.value)))
+        elif node.type is NodeType.STR:
+            self.emit(Opcode.LOAD_CONST, self.code.add_constant(node.value))
+        elif node.type is NodeType.IDENTIFIER:
+            slot = self.compile_identifier(node.value)
+            if slot is not None:
+                self.emit(Opcode.LOAD_SLOT, slot)
+        elif node.type in BINARY_OPCODES:
+            self.push_emit(BINARY_OPCODES[node.type])
+            tasks.append((self.compile_operands, node))
+        elif node.type in SHORT_CIRCUIT_OPCODES:
+            tasks.append((self.compile_short_circuit, node))
+            tasks.append((self.compile_expression, node.left))
+        elif node.type is NodeType.NOT:
+            self.push_emit(Opcode.NOT)
+            tasks.append((self.compile_expression, node.left))
+        elif node.type is NodeType.ARRAY_LIST:
+            if node.constant is not None:
+                self.emit(Opcode.LOAD_CONST_ARRAY, self.code.add_constant(node.constant))
+            else:
+                self.push_items(node.children)
+        elif node.type is NodeType.ARRAY:
+            # Chain is linked backwards, from last item to first
+            items = []
+            while node is not None and node.type is NodeType.ARRAY:
+                items.append(node.left)
+                node = node.right
+            self.push_items(list(reversed(items)))
+        elif node.type is NodeType.IDENTIFIER_ARRAY:
+            indices = self.compile_array(node)
+            if indices is None:
+                return
+            for index in reversed(indices):
+                self.push_emit(Opcode.LOAD_INDEX)
+                tasks.append((self.compile_expression, index))
+        elif node.type is NodeType.IDENTIFIER_MAP:
+            if node.left.type is not NodeType.IDENTIFIER:
+                self.emit_fail('identifier map missing identifier')
+                return
+            tasks.append((self.load_map_item, node))
+            tasks.append((self.compile_expression, node.right))
+        else:
+            self.emit_fail('unknown node type - node {}'.format(node.type.name))
+
+
+def disassemble(code: Code) -> Iterable[str]:
+    instructions = code.instructions
+
+    def format_slot(index: int) -> str:
+        depth, slot_index = code.slots[index]
+        return '{} ({} {}:{})'.format(index, code.names[index], depth, slot_index)
+
+    for offset in range(0, len(instructions), INSTRUCTION_SIZE):
+        opcode = Opcode(instructions[offset])
+        a = instructions[offset + 1]
+        b = instructions[offset + 2]
+        parts = ['{:>6}  {:<34}'.format(offset, opcode.name)]
+        if opcode in JUMP_OPCODES:
+            parts.append('-> {}'.format(a))
+        elif opcode in SLOT_OPCODES:
+            parts.append(format_slot(a))
+            if opcode in (Opcode.LOAD_SLOT_SLOT, Opcode.LOAD_MAP):
+                parts.append(format_slot(b))
+            elif opcode in (Opcode.LOAD_SLOT_CONST, Opcode.INCREMENT_SLOT):
+                parts.append('{} ({!r})'.format(b, code.constants[b]))
+        elif opcode in CONSTANT_OPCODES:
+            parts.append('{} ({!r})'.format(a, code.constants[a]))
+        elif opcode in (Opcode.BUILD_ARRAY, Opcode.SCOPE_ENTER):
+            parts.append(str(a))
+        yield ' '.join(parts).rstrip()
@@ -0,0 +1,212 @@
+from core.ast import Node, NodeType
+
+import glob
+import hashlib
+import marshal
+import os
+import sys
+
+from typing import Any, List, Optional
+
+
+AST_FILE_MAGIC = b'ELAST2'
+CODE_FILE_MAGIC = b'ELPYC1'
+
+# Cache is trimmed to this size, least recently used first
+AST_CACHE_MAX_BYTES = 64 << 20
+
+CORE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+NODE_TYPE_BY_VALUE = dict([
+    (node_type.value, node_type)
+    for node_type in NodeType
+])
+
+# Preorder marker for a missing node
+NO_NODE = 0
+# Children count of a node with left and right instead of children
+NO_CHILDREN = -1
+
+
+def get_cache_path() -> str:
+    cache_path = os.environ.get('ELANG_CACHE_DIR')
+    if cache_path:
+        return cache_path
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'elang')
+
+
+def get_interpreter_version() -> str:
+    # Any change to the interpreter source invalidates cached trees. Files
+    # are not read, their modification time and size tell a change
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(sys.version.encode())
+    for path in sorted(glob.glob(os.path.join(CORE_PATH, '*.py'))):
+        stat = os.stat(path)
+        digest.update('{}:{}:{};'.format(
+            os.path.basename(path), stat.st_mtime_ns, stat.st_size).encode())
+    return digest.hexdigest()
+
+
+def dump_ast(node: Node) -> bytes:
+    '''
+    Flatten the tree in preorder: for every node its type, value, constant,
+    row, column and children count (or NO_CHILDREN, followed by left and
+    right).
+    '''
+    # Non-recursive traversal
+    flat: List[Any] = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            flat.append(NO_NODE)
+            continue
+        flat.append(node.type.value)
+        flat.append(node.value)
+        flat.append(node.constant)
+        flat.append(node.row)
+        flat.append(node.column)
+        if node.children is None:
+            flat.append(NO_CHILDREN)
+            stack.append(node.right)
+            stack.append(node.left)
+        else:
+            flat.append(len(node.children))
+            stack.extend(reversed(node.children))
+    return AST_FILE_MAGIC + marshal.dumps(flat)
+
+
+def load_ast(data: bytes) -> Node:
+    if not data.startswith(AST_FILE_MAGIC):
+        raise ValueError('not a cached abstract syntax tree')
+    flat = marshal.loads(data[len(AST_FILE_MAGIC):])
+    # Slots to fill in preorder, as (parent, attribute or child index)
+    root = Node(type=NodeType.STATEMENT_LIST, children=[None])
+    slots = [(root, 0)]
+    position = 0
+    while slots:
+        parent, slot = slots.pop()
+        type_value = flat[position]
+        position += 1
+        if type_value == NO_NODE:
+            node = None
+        else:
+            value, constant, row, column, count = flat[position:position + 5]
+            position += 5
+            node = Node(
+                type=NODE_TYPE_BY_VALUE[type_value], value=value, row=row, column=column)
+            node.constant = constant
+            if count == NO_CHILDREN:
+                slots.append((node, 'right'))
+                slots.append((node, 'left'))
+            else:
+                node.children = [None] * count
+                slots.extend((node, index) for index in reversed(range(count)))
+        if type(slot) is int:
+            parent.children[slot] = node
+        else:
+            setattr(parent, slot, node)
+    return root.children[0]
+
+
+def dump_code(code: Any) -> bytes:
+    return CODE_FILE_MAGIC + marshal.dumps(code)
+
+
+def load_code(data: bytes) -> Any:
+    if not data.startswith(CODE_FILE_MAGIC):
+        raise ValueError('not a cached code object')
+    return marshal.loads(data[len(CODE_FILE_MAGIC):])
+
+
+class AstCache:
+    '''
+    Parsed programs on disk, keyed by source content and interpreter version,
+    like __pycache__ for Python.
+    '''
+    suffix = '.ast'
+    dump = staticmethod(dump_ast)
+    load = staticmethod(load_ast)
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = AST_CACHE_MAX_BYTES,
+    ) -> None:
+        self.path = path or get_cache_path()
+        self.max_bytes = max_bytes
+        self.interpreter_version = get_interpreter_version()
+
+    def get_key(self, source: bytes, variant: str = str()) -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(self.interpreter_version.encode())
+        digest.update(variant.encode())
+        digest.update(b'\0')
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get_file_path(self, key: str) -> str:
+        return os.path.join(self.path, key + self.suffix)
+
+    def get(self, source: bytes, variant: str = str()) -> Optional[Any]:
+        file_path = self.get_file_path(self.get_key(source, variant))
+        try:
+            with open(file_path, 'rb') as file:
+                value = self.load(file.read())
+            # Mark as recently used
+            os.utime(file_path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError, TypeError, IndexError, KeyError):
+            # Corrupt entry
+            self.remove(file_path)
+            return None
+        return value
+
+    def set(self, source: bytes, value: Any, variant: str = str()) -> None:
+        file_path = self.get_file_path(self.get_key(source, variant))
+        temporary_path = '{}.{}.tmp'.format(file_path, os.getpid())
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(temporary_path, 'wb') as file:
+                file.write(self.dump(value))
+            os.replace(temporary_path, file_path)
+        except (OSError, ValueError):
+            # Caching is best effort (eg. read-only home, unmarshallable)
+            self.remove(temporary_path)
+            return
+        self.evict()
+
+    def remove(self, file_path: str) -> None:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        entries = []
+        for file_path in glob.glob(os.path.join(self.path, '*' + self.suffix)):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, file_path))
+        total_bytes = sum(size for _, size, _ in entries)
+        # Least recently used first
+        for _, size, file_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            self.remove(file_path)
+            total_bytes -= size
+
+
+class CodeCache(AstCache):
+    '''
+    Compiled code objects of transpiled programs on disk, keyed by their
+    Python source.
+    '''
+    suffix = '.pyc'
+    dump = staticmethod(dump_code)
+    load = staticmethod(load_code)
@@ -0,0 +1,428 @@
+import sys
+from typing import Any, Callable, List, Optional
+
+from core.ast import Node, NodeType
+from core.output import Output, print_value
+from core.inference import block_frame_sizes
+from core.resolver import (
+    Resolver, Slot, global_frame, store_global_frame, undefined_message)
+from core.variables import Table, VariableType
+from core.walker import Walker, as_map_key, copy_array
+
+
+# Compiled node, runs the node when called
+Closure = Callable[[], Any]
+
+
+def nothing() -> None:
+    pass
+
+
+BINARY_CLOSURES = dict([
+    # Returns integer
+    (NodeType.ADD, lambda left, right: lambda: left() + right()),
+    (NodeType.SUBTRACT, lambda left, right: lambda: left() - right()),
+    (NodeType.MULTIPLY, lambda left, right: lambda: left() * right()),
+    (NodeType.DIVIDE, lambda left, right: lambda: left() // right()),
+    (NodeType.MOD, lambda left, right: lambda: left() % right()),
+
+    # Returns 1 or 0
+    (NodeType.EQUAL, lambda left, right: lambda: 1 if left() == right() else 0),
+    (NodeType.NOT_EQUAL, lambda left, right: lambda: 1 if left() != right() else 0),
+    (NodeType.LESS_THAN, lambda left, right: lambda: 1 if left() < right() else 0),
+    (NodeType.LESS_THAN_OR_EQUAL, lambda left, right: lambda: 1 if left() <= right() else 0),
+    (NodeType.GREATER_THAN, lambda left, right: lambda: 1 if left() > right() else 0),
+    (NodeType.GREATER_THAN_OR_EQUAL, lambda left, right: lambda: 1 if left() >= right() else 0),
+
+    # Binary, but does not necessarily return int. Right is only evaluated
+    # when left does not decide the result.
+    (NodeType.AND, lambda left, right: lambda: left() and right()),
+    (NodeType.OR, lambda left, right: lambda: left() or right()),
+])
+
+
+# Right operand is a literal, eg. `+ i 1`
+CONSTANT_BINARY_CLOSURES = dict([
+    (NodeType.ADD, lambda left, right: lambda: left() + right),
+    (NodeType.SUBTRACT, lambda left, right: lambda: left() - right),
+    (NodeType.MULTIPLY, lambda left, right: lambda: left() * right),
+    (NodeType.DIVIDE, lambda left, right: lambda: left() // right),
+    (NodeType.MOD, lambda left, right: lambda: left() % right),
+    (NodeType.EQUAL, lambda left, right: lambda: 1 if left() == right else 0),
+    (NodeType.NOT_EQUAL, lambda left, right: lambda: 1 if left() != right else 0),
+    (NodeType.LESS_THAN, lambda left, right: lambda: 1 if left() < right else 0),
+    (NodeType.LESS_THAN_OR_EQUAL, lambda left, right: lambda: 1 if left() <= right else 0),
+    (NodeType.GREATER_THAN, lambda left, right: lambda: 1 if left() > right else 0),
+    (NodeType.GREATER_THAN_OR_EQUAL, lambda left, right: lambda: 1 if left() >= right else 0),
+])
+
+
+def fail(message: str) -> Closure:
+    # Errors are raised when reached, like the walker
+    def run_fail() -> None:
+        raise Exception(message)
+    return run_fail
+
+
+class ClosureEngine:
+    '''
+    Compile a tree into nested Python closures once, each specialized for its
+    node type, then run the closures. Variables are read from list frames,
+    like the vm. Programs nested too deep to compile by recursion are walked
+    instead.
+    '''
+    def __init__(
+        self,
+        table: Optional[Table] = None,
+        output: Optional[Output] = None,
+    ) -> None:
+        self.table = Table() if table is None else table
+        self.output = Output() if output is None else output
+        # Frame of every block being run, the global frame first
+        self.frames: List[list] = []
+        self.resolver = Resolver()
+        self.compile_by_type = dict([
+            (NodeType.STATEMENT_LIST, self.compile_statement_list),
+            (NodeType.SEQUENCE, self.compile_sequence),
+            (NodeType.BLOCK, self.compile_block),
+            (NodeType.INT, self.compile_literal),
+            (NodeType.STR, self.compile_literal),
+            (NodeType.ARRAY_LIST, self.compile_array_list),
+            (NodeType.ARRAY, self.compile_array),
+            (NodeType.IDENTIFIER, self.compile_identifier),
+            (NodeType.IDENTIFIER_ARRAY, self.compile_identifier_array),
+            (NodeType.IDENTIFIER_MAP, self.compile_identifier_map),
+            (NodeType.ASSIGN, self.compile_assign),
+            (NodeType.NOT, self.compile_not),
+            (NodeType.IF, self.compile_if),
+            (NodeType.WHILE, self.compile_while),
+            (NodeType.PRINT_CHARACTER, self.compile_print_character),
+            (NodeType.PRINT_STRING, self.compile_print_string),
+            (NodeType.ASSERT, self.compile_assert),
+        ])
+        for node_type in BINARY_CLOSURES:
+            self.compile_by_type[node_type] = self.compile_binary
+
+    def __call__(self, node: Node) -> None:
+        global_scope = self.table.scope_stack[self.table.scope_global]
+        self.resolver = Resolver(global_scope)
+        self.frame_sizes = block_frame_sizes(node, global_scope)
+        preset_names = self.resolver.global_names()
+        try:
+            run = self.compile(node)
+        except RecursionError:
+            # Nested beyond the Python stack, nothing has run yet
+            walker = Walker(output=self.output)
+            walker.table = self.table
+            walker(node)
+            return
+        self.frames[:] = [global_frame(
+            preset_names, self.resolver.global_names(), global_scope)]
+        try:
+            run()
+        finally:
+            self.output.flush()
+            store_global_frame(
+                self.resolver.global_names(), self.frames[0], global_scope)
+
+    def compile(self, node: Optional[Node]) -> Closure:
+        if node is None:
+            return nothing
+        compile_node = self.compile_by_type.get(node.type)
+        if compile_node is None:
+            return fail('unknown node type - node {}'.format(node.type.name))
+        return compile_node(node)
+
+    def compile_statements(self, nodes: List[Node]) -> Closure:
+        statements = tuple(self.compile(node) for node in nodes)
+        if len(statements) == 0:
+            return nothing
+        elif len(statements) == 1:
+            return statements[0]
+
+        def run_statements() -> None:
+            for statement in statements:
+                statement()
+        return run_statements
+
+    def compile_statement_list(self, node: Node) -> Closure:
+        return self.compile_statements(node.children)
+
+    def compile_sequence(self, node: Node) -> Closure:
+        # Chain is linked backwards, from last statement to first
+        nodes = []
+        while node is not None and node.type is NodeType.SEQUENCE:
+            nodes.append(node.left)
+            node = node.right
+        nodes.append(node)
+        return self.compile_statements(list(reversed(nodes)))
+
+    def compile_block(self, node: Node) -> Closure:
+        size = self.frame_sizes[id(node)]
+        if size == 0:
+            # Declares nothing, runs in the enclosing frame
+            return self.compile(node.left)
+        self.resolver.enter()
+        body = self.compile(node.left)
+        self.resolver.exit()
+        frames = self.frames
+
+        def run_block() -> None:
+            frames.append([None] * size)
+            body()
+            frames.pop()
+        return run_block
+
+    def compile_literal(self, node: Node) -> Closure:
+        value = int(node.value) if node.type is NodeType.INT else node.value
+        return lambda: value
+
+    def compile_array_list(self, node: Node) -> Closure:
+        if node.constant is not None:
+            constant = node.constant
+            return lambda: copy_array(constant)
+        items = tuple(self.compile(child) for child in node.children)
+        return lambda: [item() for item in items]
+
+    def compile_array(self, node: Node) -> Closure:
+        # Chain is linked backwards, from last item to first
+        items = []
+        while node is not None and node.type is NodeType.ARRAY:
+            items.append(self.compile(node.left))
+            node = node.right
+        items = tuple(reversed(items))
+        return lambda: [item() for item in items]
+
+    def compile_slot(self, slot: Slot) -> Closure:
+        frames = self.frames
+        depth, index, _ = slot
+        return lambda: frames[depth][index]
+
+    def compile_identifier(self, node: Node) -> Closure:
+        slot = self.resolver.resolve(node.value)
+        if slot is None:
+            return fail('variable {} referenced before assignment'.format(node.value))
+        return self.compile_slot(slot)
+
+    def compile_array_base(self, name: str) -> Closure:
+        slot = self.resolver.resolve(name)
+        if slot is None:
+            return fail(undefined_message(name))
+        read = self.compile_slot(slot)
+        if slot.type is list:
+            return read
+        message = 'variable type mismatch - {} is not of type {}'.format(
+            name, VariableType.ARRAY)
+
+        def read_array() -> Any:
+            value = read()
+            if type(value) is not list:
+                raise Exception(message)
+            return value
+        return read_array
+
+    def compile_indices(self, node: Node) -> Optional[tuple]:
+        # Array and index closures of `name @ index @ ...`, from first to last
+        indices = []
+        while node.type is NodeType.IDENTIFIER_ARRAY:
+            indices.append(self.compile(node.right))
+            node = node.left
+        if node.type is not NodeType.IDENTIFIER:
+            return None
+        return self.compile_array_base(node.value), tuple(reversed(indices))
+
+    def compile_identifier_array(self, node: Node) -> Closure:
+        compiled = self.compile_indices(node)
+        if compiled is None:
+            return fail('identifier array missing identifier')
+        read_array, indices = compiled
+
+        if len(indices) == 1:
+            index = indices[0]
+            return lambda: read_array()[index()]
+
+        def read_items() -> Any:
+            item = read_array()
+            for index in indices:
+                item = item[index()]
+            return item
+        return read_items
+
+    def compile_identifier_map(self, node: Node) -> Closure:
+        if node.left.type is not NodeType.IDENTIFIER:
+            return fail('identifier map missing identifier')
+        name = node.left.value
+        key = self.compile(node.right)
+        slot = self.resolver.resolve(name)
+        map_slot = self.resolver.resolve(name + '#')
+        if slot is None or map_slot is None:
+            message = undefined_message(name if slot is None else name + '#')
+
+            def fail_map() -> None:
+                key()
+                raise Exception(message)
+            return fail_map
+        frames = self.frames
+        depth, index, _ = slot
+        map_depth, map_index, _ = map_slot
+
+        def read_map() -> Any:
+            map_key = as_map_key(key())
+            return frames[map_depth][map_index].get(map_key, frames[depth][index])
+        return read_map
+
+    def compile_assign(self, node: Node) -> Closure:
+        target = node.left
+        if target.type is NodeType.IDENTIFIER:
+            return self.compile_assign_identifier(target, node.right)
+        elif target.type is NodeType.IDENTIFIER_ARRAY:
+            return self.compile_assign_array(target, node.right)
+        elif target.type is NodeType.IDENTIFIER_MAP:
+            return self.compile_assign_map(target, node.right)
+        else:
+            return fail('cannot assign to unknown type')
+
+    def compile_assign_identifier(self, target: Node, expression: Node) -> Closure:
+        name = target.value
+        slot = self.resolver.resolve(name)
+        value_type = self.resolver.expression_type(expression)
+        evaluate = self.compile(expression)
+        frames = self.frames
+        if slot is None:
+            depth, index, _ = self.resolver.declare(name, value_type)
+
+            def declare() -> None:
+                frames[depth][index] = evaluate()
+            return declare
+        depth, index, variable_type = slot
+        if value_type is not None and value_type is variable_type:
+            def assign() -> None:
+                frames[depth][index] = evaluate()
+            return assign
+
+        def assign_checked() -> None:
+            # Type of the variable is fixed by its first assignment
+            value = evaluate()
+            frame = frames[depth]
+            if type(value) is not type(frame[index]):
+                raise Exception('variable type mismatch')
+            frame[index] = value
+        return assign_checked
+
+    def compile_assign_array(self, target: Node, expression: Node) -> Closure:
+        evaluate = self.compile(expression)
+        compiled = self.compile_indices(target)
+        if compiled is None:
+            return fail('identifier array missing identifier')
+        read_array, indices = compiled
+        outer_indices, last_index = indices[:-1], indices[-1]
+
+        def assign_item() -> None:
+            value = evaluate()
+            item = read_array()
+            for index in outer_indices:
+                item = item[index()]
+            item[last_index()] = value
+        return assign_item
+
+    def compile_assign_map(self, target: Node, expression: Node) -> Closure:
+        if target.left.type is not NodeType.IDENTIFIER:
+            return fail('identifier map missing identifier')
+        name = target.left.value
+        key = self.compile(target.right)
+        evaluate = self.compile(expression)
+        if self.resolver.resolve(name) is None:
+            # Default value must be assigned first
+            message = undefined_message(name)
+
+            def fail_map() -> None:
+                evaluate()
+                key()
+                raise Exception(message)
+            return fail_map
+        frames = self.frames
+        map_slot = self.resolver.resolve(name + '#')
+        if map_slot is None:
+            # Declared before the value is evaluated, which declares nothing
+            depth, index, _ = self.resolver.declare(name + '#', dict)
+
+            def declare_map() -> None:
+                map_value = dict()
+                frames[depth][index] = map_value
+                value = evaluate()
+                map_value[as_map_key(key())] = value
+            return declare_map
+        depth, index, _ = map_slot
+
+        def assign_map() -> None:
+            value = evaluate()
+            frames[depth][index][as_map_key(key())] = value
+        return assign_map
+
+    def compile_binary(self, node: Node) -> Closure:
+        left = self.compile(node.left)
+        if (
+            node.right is not None and
+            node.right.type is NodeType.INT and
+            node.type in CONSTANT_BINARY_CLOSURES
+        ):
+            return CONSTANT_BINARY_CLOSURES[node.type](left, int(node.right.value))
+        return BINARY_CLOSURES[node.type](left, self.compile(node.right))
+
+    def compile_not(self, node: Node) -> Closure:
+        operand = self.compile(node.left)
+        return lambda: 0 if operand() else 1
+
+    def compile_if(self, node: Node) -> Closure:
+        condition = self.compile(node.left)
+        then_branch = self.compile(node.right.left)
+        if node.right.right is None:
+            def run_if() -> None:
+                if condition():
+                    then_branch()
+            return run_if
+        else_branch = self.compile(node.right.right)
+
+        def run_if_else() -> None:
+            if condition():
+                then_branch()
+            else:
+                else_branch()
+        return run_if_else
+
+    def compile_while(self, node: Node) -> Closure:
+        condition = self.compile(node.left)
+        body = self.compile(node.right)
+
+        def run_while() -> None:
+            while condition():
+                body()
+        return run_while
+
+    def compile_print_character(self, node: Node) -> Closure:
+        evaluate = self.compile(node.left)
+        write = self.output.write
+        return lambda: write(chr(evaluate()))
+
+    def compile_print_string(self, node: Node) -> Closure:
+        write = self.output.write
+        if node.constant is not None:
+            # Text printed, known when optimized
+            text = node.constant
+            return lambda: write(text)
+        evaluate = self.compile(node.left)
+        return lambda: print_value(evaluate(), write)
+
+    def compile_assert(self, node: Node) -> Closure:
+        condition = self.compile(node.left)
+        message = 'assertion failed'
+        debug_message = '{} - node {}'.format(message, node.left.type.name)
+        output = self.output
+
+        def run_assert() -> None:
+            if not condition():
+                # Program output first
+                output.flush()
+                print(debug_message, file=sys.stderr)
+                raise AssertionError(message)
+        return run_assert
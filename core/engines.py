@@ -0,0 +1,16 @@
+import importlib
+
+
+# Engines of elang run --engine, by name, as module and class: only the
+# engine that runs is imported
+ENGINES = dict([
+    ('walker', ('core.walker', 'Walker')),
+    ('closure', ('core.closures', 'ClosureEngine')),
+    ('vm', ('core.vm', 'VirtualMachine')),
+    ('python', ('core.transpiler', 'PythonEngine')),
+])
+
+
+def load_engine(name: str) -> type:
+    module_name, class_name = ENGINES[name]
+    return getattr(importlib.import_module(module_name), class_name)
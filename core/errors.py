@@ -4,3 +4,7 @@ class LexerError(Exception):
 
 class LexerSyntaxError(LexerError):
     pass
+
+
+class TokenFileError(LexerError):
+    pass
@@ -0,0 +1,186 @@
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from core.ast import Node, NodeType
+from core.resolver import Resolver
+from core.variables import VARIABLE_TYPE_BY_VALUE_TYPE, Variable, VariableType
+
+
+class TypeMismatch(NamedTuple):
+    message: str
+    # Assignment or indexed identifier that fails when run
+    node: Node
+
+    def __str__(self) -> str:
+        return self.message
+
+
+class InferredTypes:
+    def __init__(self) -> None:
+        # Python type of every variable when proven, by name, for every scope
+        # by id of its block node. The global scope is keyed by the root node.
+        self.scopes: Dict[int, Dict[str, Optional[type]]] = dict()
+        # Variables declared by every block, by id of the block node
+        self.frame_sizes: Dict[int, int] = dict()
+        # Assignments declaring a variable of a proven type, by id of the
+        # assign node
+        self.declarations: Dict[int, VariableType] = dict()
+        # Assignments of a value the type of the variable, by id of the node
+        self.updates: Set[int] = set()
+        # Indexed identifiers of a variable proven to be an array
+        self.arrays: Set[int] = set()
+        # Fail whenever run, found before running
+        self.errors: List[TypeMismatch] = []
+
+
+def infer_types(
+    node: Optional[Node],
+    variables: Optional[Dict[str, Variable]] = None,
+) -> InferredTypes:
+    '''
+    Type of every variable in every scope, from the source alone.
+
+    The type of a variable is fixed by its first assignment, so it is proven
+    whenever the type of that value is. Assignments and indexing that always
+    fail are reported as errors, and the rest proven not to need a check
+    at all when run.
+    '''
+    resolver = Resolver(variables)
+    inferred = InferredTypes()
+    # Type of every expression evaluated, when proven
+    expression_types: Dict[int, Optional[type]] = dict()
+
+    def scope_types() -> Dict[str, Optional[type]]:
+        return dict(
+            (name, slot.type) for name, slot in resolver.scopes[-1].items())
+
+    # Explicit stack, programs may nest deeper than Python recursion allows.
+    # Statements are visited in order, expressions after their operands.
+    STATEMENT, EXPRESSION, TYPE, ASSIGN, EXIT = range(5)
+    stack: List[Tuple[int, Optional[Node]]] = [(STATEMENT, node)]
+    while stack:
+        action, current = stack.pop()
+        if current is None:
+            continue
+        elif action == EXIT:
+            inferred.scopes[id(current)] = scope_types()
+            inferred.frame_sizes[id(current)] = resolver.exit()
+        elif action == ASSIGN:
+            assign_type(resolver, inferred, expression_types, current)
+        elif action == TYPE:
+            expression_types[id(current)] = expression_type(
+                resolver, inferred, expression_types, current)
+        elif action == EXPRESSION:
+            stack.append((TYPE, current))
+            if current.children is not None:
+                stack.extend(
+                    (EXPRESSION, child) for child in reversed(current.children))
+            else:
+                stack.append((EXPRESSION, current.right))
+                stack.append((EXPRESSION, current.left))
+        elif current.type is NodeType.STATEMENT_LIST:
+            stack.extend((STATEMENT, child) for child in reversed(current.children))
+        elif current.type is NodeType.SEQUENCE:
+            # Chain is linked backwards, from last statement to first
+            stack.append((STATEMENT, current.left))
+            stack.append((STATEMENT, current.right))
+        elif current.type is NodeType.BLOCK:
+            resolver.enter()
+            stack.append((EXIT, current))
+            stack.append((STATEMENT, current.left))
+        elif current.type is NodeType.IF:
+            stack.append((STATEMENT, current.right.right))
+            stack.append((STATEMENT, current.right.left))
+            stack.append((EXPRESSION, current.left))
+        elif current.type is NodeType.WHILE:
+            stack.append((STATEMENT, current.right))
+            stack.append((EXPRESSION, current.left))
+        elif current.type is NodeType.ASSIGN:
+            stack.append((ASSIGN, current))
+            if current.left.type is not NodeType.IDENTIFIER:
+                stack.append((EXPRESSION, current.left))
+            stack.append((EXPRESSION, current.right))
+        elif current.type in (
+            NodeType.PRINT_CHARACTER, NodeType.PRINT_STRING, NodeType.ASSERT,
+        ):
+            stack.append((EXPRESSION, current.left))
+        else:
+            stack.append((EXPRESSION, current))
+    if node is not None:
+        inferred.scopes[id(node)] = dict(
+            (name, slot.type) for name, slot in resolver.scopes[0].items())
+    return inferred
+
+
+def block_frame_sizes(
+    node: Optional[Node],
+    variables: Optional[Dict[str, Variable]] = None,
+) -> Dict[int, int]:
+    '''
+    Number of variables declared by every block, by id of the block node.
+    A block declaring none needs no scope of its own.
+    '''
+    return infer_types(node, variables).frame_sizes
+
+
+def expression_type(
+    resolver: Resolver,
+    inferred: InferredTypes,
+    expression_types: Dict[int, Optional[type]],
+    node: Node,
+) -> Optional[type]:
+    # Operands already typed
+    def operand_type(operand: Optional[Node]) -> Optional[type]:
+        return None if operand is None else expression_types.get(id(operand))
+
+    if node.type is NodeType.IDENTIFIER_ARRAY:
+        check_array(resolver, inferred, node)
+        return None
+    return resolver.value_type(node, operand_type)
+
+
+def check_array(resolver: Resolver, inferred: InferredTypes, node: Node) -> None:
+    base = node
+    while base.type is NodeType.IDENTIFIER_ARRAY:
+        base = base.left
+    if base.type is not NodeType.IDENTIFIER:
+        return
+    slot = resolver.resolve(base.value)
+    if slot is None or slot.type is None:
+        return
+    elif slot.type is list:
+        inferred.arrays.add(id(node))
+    else:
+        inferred.errors.append(TypeMismatch(
+            'variable type mismatch - {} is not of type {}'.format(
+                base.value, VariableType.ARRAY),
+            node))
+
+
+def assign_type(
+    resolver: Resolver,
+    inferred: InferredTypes,
+    expression_types: Dict[int, Optional[type]],
+    node: Node,
+) -> None:
+    target = node.left
+    value_type = expression_types.get(id(node.right))
+    slot = resolver.declare_assigned(node, value_type)
+    if target.type is not NodeType.IDENTIFIER:
+        return
+    elif slot is not None:
+        if value_type is not None:
+            inferred.declarations[id(node)] = VARIABLE_TYPE_BY_VALUE_TYPE[value_type]
+        return
+    name = target.value
+    slot = resolver.resolve(name)
+    if value_type is None or slot.type is None:
+        return
+    elif value_type is slot.type:
+        inferred.updates.add(id(node))
+    else:
+        inferred.errors.append(TypeMismatch(
+            'variable type mismatch - {} is of type {}, not {}'.format(
+                name,
+                VARIABLE_TYPE_BY_VALUE_TYPE[slot.type],
+                VARIABLE_TYPE_BY_VALUE_TYPE[value_type]),
+            node))
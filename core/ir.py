@@ -0,0 +1,404 @@
+from typing import Callable, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple, Union
+
+from core.ast import Node, NodeType, locate
+from core.resolver import ARITHMETIC_NODE_TYPES, COMPARISON_NODE_TYPES, Resolver
+
+
+# Integer expression that cannot fail and has no side effect, as nested
+# tuples, equal whenever the source is:
+# - ('INT', value)
+# - ('VAR', name), of a variable holding an int
+# - (node type, operand, ...)
+Expression = tuple
+
+# Where a node is held: its parent and the attribute or child index
+Position = Tuple[Node, Union[str, int]]
+
+# Operands of these must not be zero
+DIVISION_NODE_TYPES = frozenset([
+    NodeType.DIVIDE,
+    NodeType.MOD,
+])
+
+LEAF_KINDS = frozenset(['INT', 'VAR'])
+
+# Names of temporary variables cannot be written in a program, since
+# identifiers are ASCII, but are still valid Python (see Transpiler)
+TEMPORARY_NAME = 'τ{}'
+
+
+def get_node(position: Position) -> Optional[Node]:
+    parent, key = position
+    if type(key) is int:
+        return parent.children[key]
+    return getattr(parent, key)
+
+
+def set_node(position: Position, node: Node) -> None:
+    parent, key = position
+    if type(key) is int:
+        parent.children[key] = node
+    else:
+        setattr(parent, key, node)
+
+
+def is_leaf(expression: Expression) -> bool:
+    return expression[0] in LEAF_KINDS
+
+
+def expression_names(expression: Expression) -> FrozenSet[str]:
+    names = set()
+    stack = [expression]
+    while stack:
+        expression = stack.pop()
+        if expression[0] == 'VAR':
+            names.add(expression[1])
+        elif not is_leaf(expression):
+            stack.extend(expression[1:])
+    return frozenset(names)
+
+
+def lower_node(
+    node: Node,
+    lowered: Dict[int, Optional[Expression]],
+    is_int: Callable[[str], bool],
+) -> Optional[Expression]:
+    # Operands are lowered already
+    def operand(child: Optional[Node]) -> Optional[Expression]:
+        return None if child is None else lowered.get(id(child))
+
+    if node.type is NodeType.INT:
+        return ('INT', int(node.value))
+    elif node.type is NodeType.IDENTIFIER:
+        return ('VAR', node.value) if is_int(node.value) else None
+    elif node.type is NodeType.NOT:
+        left = operand(node.left)
+        return None if left is None else (node.type, left)
+    elif (
+        node.type in ARITHMETIC_NODE_TYPES or
+        node.type in COMPARISON_NODE_TYPES or
+        node.type in (NodeType.AND, NodeType.OR)
+    ):
+        left, right = operand(node.left), operand(node.right)
+        if left is None or right is None:
+            return None
+        elif node.type in DIVISION_NODE_TYPES and right[0] != 'INT':
+            # Divisor might be zero
+            return None
+        elif node.type in DIVISION_NODE_TYPES and right[1] == 0:
+            return None
+        return (node.type, left, right)
+    return None
+
+
+def lower(root: Optional[Node], is_int: Callable[[str], bool]) -> Dict[int, Optional[Expression]]:
+    '''
+    Expression of every node under root, by id of the node, None when it
+    might fail, have an effect or not be an int.
+    '''
+    lowered: Dict[int, Optional[Expression]] = dict()
+    # Operands before the operation, without recursion
+    stack: List[Tuple[Optional[Node], bool]] = [(root, False)]
+    while stack:
+        node, is_visited = stack.pop()
+        if node is None:
+            continue
+        elif is_visited:
+            lowered[id(node)] = lower_node(node, lowered, is_int)
+            continue
+        stack.append((node, True))
+        if node.children is not None:
+            stack.extend((child, False) for child in node.children)
+        else:
+            stack.append((node.left, False))
+            stack.append((node.right, False))
+    return lowered
+
+
+def operand_positions(node: Node) -> List[Position]:
+    # Expressions evaluated by node, never the identifier of an array or map
+    if node.children is not None:
+        return [(node, index) for index in range(len(node.children))]
+    elif node.type is NodeType.IDENTIFIER_ARRAY:
+        if node.left.type is NodeType.IDENTIFIER_ARRAY:
+            return [(node, 'left'), (node, 'right')]
+        return [(node, 'right')]
+    elif node.type is NodeType.IDENTIFIER_MAP:
+        return [(node, 'right')]
+    positions: List[Position] = []
+    if node.left is not None:
+        positions.append((node, 'left'))
+    if node.right is not None:
+        positions.append((node, 'right'))
+    return positions
+
+
+def statement_positions(node: Node) -> List[Position]:
+    # Expressions evaluated by a statement, before any of its other effects
+    if node.type is NodeType.ASSIGN:
+        target = node.left
+        positions = [(node, 'right')]
+        if target.type is NodeType.IDENTIFIER_ARRAY:
+            positions.append((node, 'left'))
+        elif target.type is NodeType.IDENTIFIER_MAP:
+            positions.append((target, 'right'))
+        return positions
+    elif node.type in (
+        NodeType.IF, NodeType.PRINT_CHARACTER, NodeType.PRINT_STRING, NodeType.ASSERT,
+    ):
+        return [(node, 'left')]
+    return []
+
+
+def statement_children(node: Node) -> List[Node]:
+    # Statements nested in a statement, in order
+    if node.type is NodeType.STATEMENT_LIST:
+        return list(node.children)
+    elif node.type is NodeType.SEQUENCE:
+        # Chain is linked backwards, from last statement to first
+        return [node.right, node.left]
+    elif node.type is NodeType.BLOCK:
+        return [node.left]
+    elif node.type is NodeType.IF:
+        return [node.right.left, node.right.right]
+    elif node.type is NodeType.WHILE:
+        return [node.right]
+    return []
+
+
+def nested_statements(node: Optional[Node]) -> Iterator[Node]:
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        yield node
+        stack.extend(reversed(statement_children(node)))
+
+
+def assigned_names(node: Optional[Node]) -> FrozenSet[str]:
+    # Variables assigned anywhere in a statement
+    names = set()
+    for statement in nested_statements(node):
+        if (
+            statement.type is NodeType.ASSIGN and
+            statement.left.type is NodeType.IDENTIFIER
+        ):
+            names.add(statement.left.value)
+    return frozenset(names)
+
+
+def occurrences(
+    positions: List[Position],
+    lowered: Dict[int, Optional[Expression]],
+    is_wanted: Callable[[Expression], bool],
+    is_nested: bool,
+) -> Iterator[Tuple[Position, Expression]]:
+    # Operations wanted, outermost first, and inside them when nested
+    stack = list(reversed(positions))
+    while stack:
+        position = stack.pop()
+        node = get_node(position)
+        if node is None:
+            continue
+        expression = lowered.get(id(node))
+        if expression is not None and not is_leaf(expression) and is_wanted(expression):
+            yield position, expression
+            if not is_nested:
+                continue
+        stack.extend(reversed(operand_positions(node)))
+
+
+def expression_size(expression: Expression) -> int:
+    size = 0
+    stack = [expression]
+    while stack:
+        expression = stack.pop()
+        size += 1
+        if not is_leaf(expression):
+            stack.extend(expression[1:])
+    return size
+
+
+def expression_nodes(node: Node) -> Iterator[Node]:
+    # Node and all its operands
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(get_node(position) for position in operand_positions(node))
+
+
+class SubexpressionOptimizer:
+    '''
+    Compute integer expressions that cannot fail no more often than needed:
+    - in a while loop, those reading no variable assigned in the loop are
+      computed once, before the loop (loop-invariant code motion)
+    - in the statements of a block, one computed again before any variable
+      it reads is assigned is computed once (common subexpression
+      elimination)
+
+    Results are kept in temporary variables, declared in a block of their
+    own around the loop, or in the block of the statements (the global
+    scope for top-level statements). The tree is
+    changed in place, see Optimizer.
+    '''
+    def __init__(self) -> None:
+        self.temporary_count = 0
+
+    def __call__(self, root: Optional[Node]) -> Optional[Node]:
+        if root is None:
+            return root
+        # A placeholder parent, so the root can be replaced like any node
+        holder = Node(type=NodeType.BLOCK, left=root)
+        resolver = Resolver()
+        if root.type is NodeType.STATEMENT_LIST:
+            # Top-level statements, their temporaries are global
+            self.share(root, resolver)
+        EXIT, VISIT = range(2)
+        stack: List[Tuple[int, Optional[Position]]] = [(VISIT, (holder, 'left'))]
+        while stack:
+            action, position = stack.pop()
+            if action == EXIT:
+                resolver.exit()
+                continue
+            node = get_node(position)
+            if node is None:
+                continue
+            elif node.type is NodeType.BLOCK:
+                resolver.enter()
+                stack.append((EXIT, None))
+                if node.left is not None and node.left.type is NodeType.STATEMENT_LIST:
+                    self.share(node.left, resolver)
+                stack.append((VISIT, (node, 'left')))
+            elif node.type is NodeType.WHILE:
+                block = self.hoist(node, resolver)
+                if block is not None:
+                    set_node(position, block)
+                    resolver.enter()
+                    for statement in block.left.children[:-1]:
+                        resolver.declare(statement.left.value, int)
+                    stack.append((EXIT, None))
+                stack.append((VISIT, (node, 'right')))
+            elif node.type is NodeType.ASSIGN:
+                self.declare(node, resolver)
+            elif node.type is NodeType.STATEMENT_LIST:
+                stack.extend(
+                    (VISIT, (node, index))
+                    for index in reversed(range(len(node.children))))
+            elif node.type is NodeType.SEQUENCE:
+                stack.append((VISIT, (node, 'left')))
+                stack.append((VISIT, (node, 'right')))
+            elif node.type is NodeType.IF:
+                stack.append((VISIT, (node.right, 'right')))
+                stack.append((VISIT, (node.right, 'left')))
+        return holder.left
+
+    def temporary(self, expression_node: Node) -> Tuple[str, Node]:
+        # Name, and the statement assigning it
+        name = TEMPORARY_NAME.format(self.temporary_count)
+        self.temporary_count += 1
+        return name, locate(Node(
+            type=NodeType.ASSIGN,
+            left=locate(Node(type=NodeType.IDENTIFIER, value=name), expression_node),
+            right=expression_node), expression_node)
+
+    def declare(self, node: Node, resolver: Resolver) -> None:
+        # Same declarations as the engines, only ints matter here
+        target = node.left
+        if target.type is not NodeType.IDENTIFIER:
+            return
+        elif resolver.resolve(target.value) is not None:
+            return
+        lowered = lower(node.right, int_names(resolver))
+        value_type = int if lowered.get(id(node.right)) is not None else None
+        resolver.declare(target.value, value_type)
+
+    def hoist(self, loop: Node, resolver: Resolver) -> Optional[Node]:
+        # Block of the temporaries then the loop, None when nothing to hoist
+        assigned = assigned_names(loop)
+        positions: List[Position] = [(loop, 'left')]
+        for statement in nested_statements(loop.right):
+            if statement.type is NodeType.WHILE:
+                positions.append((statement, 'left'))
+            positions.extend(statement_positions(statement))
+        lowered: Dict[int, Optional[Expression]] = dict()
+        for position in positions:
+            lowered.update(lower(get_node(position), int_names(resolver)))
+
+        def is_invariant(expression: Expression) -> bool:
+            return len(expression_names(expression) & assigned) == 0
+
+        statements: List[Node] = []
+        names: Dict[Expression, str] = dict()
+        for position, expression in list(occurrences(
+            positions, lowered, is_invariant, is_nested=False,
+        )):
+            node = get_node(position)
+            if expression not in names:
+                names[expression], statement = self.temporary(node)
+                statements.append(statement)
+            set_node(position, locate(
+                Node(type=NodeType.IDENTIFIER, value=names[expression]), node))
+        if len(statements) == 0:
+            return None
+        statements.append(loop)
+        return locate(Node(
+            type=NodeType.BLOCK,
+            left=locate(Node(type=NodeType.STATEMENT_LIST, children=statements), loop)), loop)
+
+    def share(self, statement_list: Node, resolver: Resolver) -> None:
+        # Declarations are undone after, the statements are visited again
+        scope = dict(resolver.scopes[-1])
+        # Occurrences of every expression, since last assigned
+        groups: Dict[Expression, List[Tuple[int, Position]]] = dict()
+        found: List[Tuple[Expression, List[Tuple[int, Position]]]] = []
+        for index, statement in enumerate(statement_list.children):
+            if statement is None:
+                continue
+            positions = statement_positions(statement)
+            lowered: Dict[int, Optional[Expression]] = dict()
+            for position in positions:
+                lowered.update(lower(get_node(position), int_names(resolver)))
+            for position, expression in occurrences(
+                positions, lowered, lambda _: True, is_nested=True,
+            ):
+                if expression not in groups:
+                    groups[expression] = []
+                    found.append((expression, groups[expression]))
+                groups[expression].append((index, position))
+            if statement.type is NodeType.ASSIGN:
+                self.declare(statement, resolver)
+            assigned = assigned_names(statement)
+            for expression in list(groups):
+                if len(expression_names(expression) & assigned) > 0:
+                    del groups[expression]
+        resolver.scopes[-1] = scope
+
+        # Largest first, skipping any overlapping one already shared
+        shared_ids: Set[int] = set()
+        inserts: List[Tuple[int, Node]] = []
+        found.sort(key=lambda item: -expression_size(item[0]))
+        for _, group in found:
+            if len(group) < 2:
+                continue
+            nodes = [get_node(position) for _, position in group]
+            node_ids = set(
+                id(descendant) for node in nodes for descendant in expression_nodes(node))
+            if len(node_ids & shared_ids) > 0:
+                continue
+            shared_ids.update(node_ids)
+            name, statement = self.temporary(nodes[0])
+            inserts.append((group[0][0], statement))
+            for _, position in group:
+                set_node(position, locate(
+                    Node(type=NodeType.IDENTIFIER, value=name), get_node(position)))
+        for index, statement in sorted(inserts, key=lambda insert: -insert[0]):
+            statement_list.children.insert(index, statement)
+
+
+def int_names(resolver: Resolver) -> Callable[[str], bool]:
+    def is_int(name: str) -> bool:
+        slot = resolver.resolve(name)
+        return slot is not None and slot.type is int
+    return is_int
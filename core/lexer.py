@@ -1,13 +1,60 @@
 from core import readlines
 from core.tokens import (
     KEYWORDS_BY_SEQUENCE, LITERAL_TOKEN_TYPES, OPERATOR_TOKEN_TYPES,
-    SYMBOL_TOKEN_TYPES, WHITESPACE_TOKEN_TYPES, WHITESPACES_BY_NAME,
-    Token, TokenType)
+    SYMBOL_TOKEN_TYPES, TOKEN_ID_BY_NAME, WHITESPACE_TOKEN_TYPES,
+    WHITESPACES_BY_NAME, Token, TokenStream, TokenType)
 from core.errors import LexerSyntaxError
 
+import itertools
+import mmap
+import os
 import re
 
-from typing import Iterable, Iterator
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+# Any byte outside of 7-bit ASCII
+NON_ASCII_REGEX = re.compile(rb'[\x80-\xff]')
+
+WHITESPACE_RUN = 'WHITESPACE_RUN'
+
+# Smaller sources are lexed in process, as workers cost more than they save
+PARALLEL_THRESHOLD = 1 << 18
+
+# Chunks per worker, to balance uneven lines
+PARALLEL_CHUNKS_PER_JOB = 4
+
+
+# Token without row, as (column, name, value)
+LineToken = Tuple[int, str, Optional[str]]
+
+
+class LineTokenCache:
+    '''
+    Tokens of a single line, keyed by the content of the line. Every token
+    ends at the line boundary, so a line lexes the same on any row.
+    '''
+    def __init__(self, max_size: int = 1 << 16) -> None:
+        self.max_size = max_size
+        self.tokens_by_line: OrderedDict[str, List[LineToken]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, line: str) -> Optional[List[LineToken]]:
+        line_tokens = self.tokens_by_line.get(line)
+        if line_tokens is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.tokens_by_line.move_to_end(line)
+        return line_tokens
+
+    def set(self, line: str, line_tokens: List[LineToken]) -> None:
+        self.tokens_by_line[line] = line_tokens
+        if len(self.tokens_by_line) > self.max_size:
+            # Evict least recently used
+            self.tokens_by_line.popitem(last=False)
 
 
 class Lexer:
@@ -16,7 +63,9 @@ class Lexer:
             name=token_type.name,
             pattern=token_type.pattern)
 
-    def __init__(self) -> None:
+    def __init__(self, cache: Optional[LineTokenCache] = None) -> None:
+        self.cache = cache
+
         # Note: order matters for enum class and enum
         match_token_types = []
         # Highest match priority
@@ -34,6 +83,50 @@ class Lexer:
             for token_type in match_token_types
         ])
 
+        # Compile master pattern once
+        self.pattern = re.compile(self.regex)
+
+        # Whole source scanning skips runs of whitespace in a single match
+        self.regex_source = '|'.join([
+            '(?P<{}>[{}]+)'.format(WHITESPACE_RUN, ''.join(
+                token_type.pattern for token_type in WHITESPACE_TOKEN_TYPES)),
+            self.regex,
+        ])
+        self.pattern_text = re.compile(self.regex_source)
+        self.pattern_bytes = re.compile(self.regex_source.encode())
+
+        # Group index of the value capture group, by token name
+        value_token_types = [
+            token_type
+            for token_type in match_token_types
+            if re.compile(token_type.pattern).groups > 0
+        ]
+        self.value_group_by_name = self.get_value_groups(
+            self.pattern, value_token_types)
+        self.value_group_by_name_source = self.get_value_groups(
+            self.pattern_text, value_token_types)
+
+        self.skip_names = frozenset(
+            [WHITESPACE_RUN, TokenType.COMMENT_LINE.name] + list(WHITESPACES_BY_NAME))
+
+        # Tokens which require more than extracting a value
+        self.check_names = frozenset([
+            TokenType.LITERAL_CHAR.name,
+            TokenType.IDENTIFIER.name,
+            TokenType.MISMATCH.name,
+        ])
+
+    def get_value_groups(
+        self,
+        pattern: re.Pattern,
+        token_types: Iterable[TokenType],
+    ) -> Dict[str, int]:
+        # Assuming 1 capture group per pair
+        return dict([
+            (token_type.name, pattern.groupindex[token_type.name] + 1)
+            for token_type in token_types
+        ])
+
     def __call__(self, line: str) -> Iterator[Token]:
         return self.from_program_line(line, row=1)
 
@@ -66,52 +159,212 @@ class Lexer:
     def from_program_lines(self, lines: Iterable[str]) -> Iterable[Token]:
         row = 1
         for line in lines:
-            for token in self.from_program_line(line=line, row=row):
-                yield token
+            if self.cache is None:
+                for token in self.from_program_line(line=line, row=row):
+                    yield token
+            else:
+                for column, name, value in self.from_program_line_cached(line, row):
+                    yield Token(row=row, column=column, name=name, value=value)
             row += 1
         yield Token(row=row, column=1, name=TokenType.TERMINAL.name, value=None)
 
     def from_program_file(self, file) -> Iterable[Token]:
-        return self.from_program_lines(readlines(file))
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError):
+            # Not memory mappable (eg. pipe, empty file), read line by line
+            return self.from_program_lines(readlines(file))
+        return self.from_program_mmap(buffer)
 
-    def from_program_line(self, line: str, row: int) -> Iterator[Token]:
-        for mo in re.finditer(self.regex, line):
-            token_name = mo.lastgroup
+    def from_program_mmap(self, buffer: mmap.mmap) -> Iterator[Token]:
+        with buffer:
+            for token in self.from_program_buffer(buffer):
+                yield token
+
+    def from_program_buffer(self, buffer: Union[bytes, mmap.mmap]) -> Iterator[Token]:
+        if buffer.find(b'\r') >= 0:
+            buffer = translate_newlines(bytes(buffer))
+        if NON_ASCII_REGEX.search(buffer):
+            # Columns count characters, not bytes
+            return self.from_program_text(str(buffer, 'utf-8'))
+        return self.scan(buffer, self.pattern_bytes, newline=b'\n')
 
-            # Generically extract token value
-            pair_groups = mo.groups()
-            matched_groups = list(filter(None, pair_groups))
-            if len(matched_groups) == 2:
-                # Assuming 1 capture group per pair
-                token_value = matched_groups[1]
+    def from_program_text(self, text: str, first_row: int = 1) -> Iterator[Token]:
+        text = translate_newlines(text)
+        return self.scan(text, self.pattern_text, newline='\n', first_row=first_row)
+
+    def from_program_text_parallel(self, text: str, jobs: Optional[int] = None) -> Iterator[Token]:
+        '''
+        Lex line ranges in worker processes, then merge them in order. Every
+        token ends at the line boundary, so the tokens are the same as
+        from_program_text.
+        '''
+        text = translate_newlines(text)
+        jobs = jobs or os.cpu_count() or 1
+        if jobs == 1 or len(text) < PARALLEL_THRESHOLD:
+            return self.from_program_text(text)
+        return self.merge_chunks(text, jobs)
+
+    def merge_chunks(self, text: str, jobs: int) -> Iterator[Token]:
+        # Imported when used, it is slow to import
+        from concurrent.futures import ProcessPoolExecutor
+        chunks = split_chunks(text, jobs * PARALLEL_CHUNKS_PER_JOB) or [(1, text)]
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            streams = executor.map(lex_chunk, chunks)
+            for index, stream in enumerate(streams):
+                if index < len(chunks) - 1:
+                    # Only the last chunk ends the program
+                    stream = itertools.islice(stream, len(stream) - 1)
+                for token in stream:
+                    yield token
+
+    def scan(
+        self,
+        source: Union[str, bytes, mmap.mmap],
+        pattern: re.Pattern,
+        newline: Union[str, bytes],
+        first_row: int = 1,
+    ) -> Iterator[Token]:
+        # Whole source in one pass, with row and column from newline offsets
+        row = first_row
+        line_start = 0
+        next_newline = source.find(newline)
+        value_group_by_name = self.value_group_by_name_source
+        for mo in pattern.finditer(source):
+            token_name = mo.lastgroup
+            if token_name in self.skip_names:
+                continue
+            start = mo.start()
+            while 0 <= next_newline < start:
+                row += 1
+                line_start = next_newline + 1
+                next_newline = source.find(newline, line_start)
+            if token_name in value_group_by_name:
+                token_value = mo.group(value_group_by_name[token_name]) or None
+                if token_value is not None and type(token_value) is not str:
+                    token_value = token_value.decode('ascii')
             else:
                 token_value = None
+            if token_name not in self.check_names:
+                yield Token(row, 1 + start - line_start, token_name, token_value)
+                continue
+            yield self.make_token(
+                token_name=token_name,
+                token_value=token_value,
+                row=row,
+                column=1 + start - line_start,
+                source=source,
+                line_start=line_start,
+                line_end=next_newline)
+        # Count remaining lines, including a last line without newline
+        while next_newline >= 0:
+            row += 1
+            line_start = next_newline + 1
+            next_newline = source.find(newline, line_start)
+        if line_start < len(source):
+            row += 1
+        yield Token(row=row, column=1, name=TokenType.TERMINAL.name, value=None)
 
-            column = 1 + mo.start()
+    @classmethod
+    def get_line(cls, source, line_start: int, line_end: int) -> str:
+        line = source[line_start:] if line_end < 0 else source[line_start:line_end]
+        return line if type(line) is str else line.decode('utf-8')
 
-            if token_name == TokenType.COMMENT_LINE.name:
-                continue
-            elif token_name in WHITESPACES_BY_NAME:
+    def from_program_line_cached(self, line: str, row: int) -> List[LineToken]:
+        line_tokens = self.cache.get(line)
+        if line_tokens is None:
+            line_tokens = [
+                (token.column, token.name, token.value)
+                for token in self.from_program_line(line=line, row=row)
+            ]
+            self.cache.set(line, line_tokens)
+        return line_tokens
+
+    def from_program_line(self, line: str, row: int) -> Iterator[Token]:
+        for mo in self.pattern.finditer(line):
+            token_name = mo.lastgroup
+            if token_name in self.skip_names:
                 continue
-            elif token_name == TokenType.LITERAL_CHAR.name:
-                if token_value == '\\n':
-                    token_value = '10'
-                elif token_value == '\\\\':
-                    token_value = '92'
-                elif len(token_value) == 1 and token_value not in ['\n', '\\']:
-                    token_value = str(ord(token_value[0]))
-                else:
-                    raise LexerSyntaxError(
-                        'invalid character literal on line {} at character {} - <<<{}>>>'.format(
-                            row, column, line))
-                token_name = TokenType.LITERAL_INT.name
-            elif token_name == TokenType.IDENTIFIER.name:
-                if token_value in KEYWORDS_BY_SEQUENCE:
-                    # Identifier matches an existing keyword
-                    token_name = KEYWORDS_BY_SEQUENCE[token_value].name
-                    token_value = None
-            elif token_name == TokenType.MISMATCH.name:
+            if token_name in self.value_group_by_name:
+                token_value = mo.group(self.value_group_by_name[token_name]) or None
+            else:
+                token_value = None
+            yield self.make_token(
+                token_name=token_name,
+                token_value=token_value,
+                row=row,
+                column=1 + mo.start(),
+                source=line)
+
+    def make_token(
+        self,
+        token_name: str,
+        token_value: str,
+        row: int,
+        column: int,
+        source: Union[str, bytes, mmap.mmap],
+        line_start: int = 0,
+        line_end: int = -1,
+    ) -> Token:
+        if token_name == TokenType.LITERAL_CHAR.name:
+            if token_value == '\\n':
+                token_value = '10'
+            elif token_value == '\\\\':
+                token_value = '92'
+            elif len(token_value) == 1 and token_value not in ['\n', '\\']:
+                token_value = str(ord(token_value[0]))
+            else:
                 raise LexerSyntaxError(
-                    'syntax error on line {} at character {} - <<<{}>>>'.format(
-                        row, column, line))
-            yield Token(row=row, column=column, name=token_name, value=token_value)
+                    'invalid character literal on line {} at character {} - <<<{}>>>'.format(
+                        row, column, self.get_line(source, line_start, line_end)))
+            token_name = TokenType.LITERAL_INT.name
+        elif token_name == TokenType.IDENTIFIER.name:
+            if token_value in KEYWORDS_BY_SEQUENCE:
+                # Identifier matches an existing keyword
+                token_name = KEYWORDS_BY_SEQUENCE[token_value].name
+                token_value = None
+        elif token_name == TokenType.MISMATCH.name:
+            raise LexerSyntaxError(
+                'syntax error on line {} at character {} - <<<{}>>>'.format(
+                    row, column, self.get_line(source, line_start, line_end)))
+        return Token(row=row, column=column, name=token_name, value=token_value)
+
+
+def translate_newlines(source: Union[str, bytes]) -> Union[str, bytes]:
+    # Same lines as a file read in text mode: \r\n and \r end a line too
+    if type(source) is str:
+        if '\r' not in source:
+            return source
+        return source.replace('\r\n', '\n').replace('\r', '\n')
+    return source.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+
+
+def split_chunks(text: str, count: int) -> List[Tuple[int, str]]:
+    # Split on line boundaries, as (first row, text)
+    chunks = []
+    size = max(1, len(text) // count)
+    start = 0
+    row = 1
+    while start < len(text):
+        end = text.find('\n', start + size)
+        end = len(text) if end < 0 else end + 1
+        chunks.append((row, text[start:end]))
+        row += text.count('\n', start, end)
+        start = end
+    return chunks
+
+
+# Lexer of a worker process
+worker_lexer = None
+
+
+def lex_chunk(chunk: Tuple[int, str]) -> TokenStream:
+    global worker_lexer
+    if worker_lexer is None:
+        worker_lexer = Lexer()
+    first_row, text = chunk
+    stream = TokenStream()
+    for token in worker_lexer.from_program_text(text, first_row=first_row):
+        stream.append(
+            TOKEN_ID_BY_NAME[token.name], token.row, token.column, token.value)
+    return stream
@@ -0,0 +1,38 @@
+from typing import Union
+
+from core.ast import NodeType
+
+
+def as_int(value: Union[int, bool]) -> int:
+    return 1 if value else 0
+
+
+BINARY_OPERATORS = dict([
+    # Returns integer
+    (NodeType.ADD, lambda a, b: a + b),
+    (NodeType.SUBTRACT, lambda a, b: a - b),
+    (NodeType.MULTIPLY, lambda a, b: a * b),
+    (NodeType.DIVIDE, lambda a, b: a // b),
+    (NodeType.MOD, lambda a, b: a % b),
+
+    # Returns 1 or 0
+    (NodeType.EQUAL, lambda a, b: as_int(a == b)),
+    (NodeType.NOT_EQUAL, lambda a, b: as_int(a != b)),
+    (NodeType.LESS_THAN, lambda a, b: as_int(a < b)),
+    (NodeType.LESS_THAN_OR_EQUAL, lambda a, b: as_int(a <= b)),
+    (NodeType.GREATER_THAN, lambda a, b: as_int(a > b)),
+    (NodeType.GREATER_THAN_OR_EQUAL, lambda a, b: as_int(a >= b)),
+])
+
+
+# Binary, but does not necessarily return int. Returns the left operand when
+# it decides the result, without evaluating the right.
+LOGICAL_NODE_TYPES = frozenset([
+    NodeType.AND,
+    NodeType.OR,
+])
+
+
+UNARY_OPERATORS = dict([
+    (NodeType.NOT, lambda x: 0 if x else 1)
+])
@@ -0,0 +1,144 @@
+from typing import Any, Dict, List, Optional
+
+from core.ast import Node, NodeType, literal_value, locate
+from core.ir import SubexpressionOptimizer
+from core.operators import BINARY_OPERATORS, UNARY_OPERATORS
+from core.output import print_value
+
+
+# Levels of elang -O
+OPTIMIZE_NONE = 0
+OPTIMIZE_BASIC = 1
+OPTIMIZE_LOOPS = 2
+OPTIMIZE_MAX = 2
+
+LITERAL_NODE_TYPES = frozenset([
+    NodeType.INT,
+    NodeType.STR,
+])
+
+
+def is_literal(node: Optional[Node]) -> bool:
+    return node is not None and node.type in LITERAL_NODE_TYPES
+
+
+def make_literal(value: Any) -> Optional[Node]:
+    if type(value) is int:
+        node = Node(type=NodeType.INT, value=str(value))
+        node.constant = value
+        return node
+    elif type(value) is str:
+        return Node(type=NodeType.STR, value=value)
+    return None
+
+
+def empty_statement() -> Node:
+    return Node(type=NodeType.STATEMENT_LIST, children=[])
+
+
+def printed_text(node: Optional[Node]) -> Optional[str]:
+    # Output of print, when known before running
+    value = literal_value(node)
+    if value is None:
+        return None
+    parts: List[str] = []
+    print_value(value, parts.append)
+    return str().join(parts)
+
+
+class Optimizer:
+    '''
+    Rewrite a parsed tree into an equivalent one that is cheaper to run, at
+    level 1:
+    - literals are converted to their value once (see Node.constant)
+    - operators with literal operands are folded into a literal
+    - if and while with a literal condition drop the branch never taken
+    - printing a literal is turned into the text printed, escapes replaced
+
+    At level 2, integer expressions are also computed once outside the loops
+    and statements that repeat them (see SubexpressionOptimizer).
+
+    The given tree is left unchanged, so it can still be cached or reused.
+    Errors (eg. division by zero) are left to happen when the program runs.
+    '''
+    def __init__(self, level: int = OPTIMIZE_BASIC) -> None:
+        self.level = level
+
+    def __call__(self, node: Optional[Node]) -> Optional[Node]:
+        if node is None or self.level <= OPTIMIZE_NONE:
+            return node
+        # Children before their parent, without recursion
+        optimized: Dict[int, Optional[Node]] = dict()
+        stack = [(node, False)]
+        while stack:
+            current, is_visited = stack.pop()
+            if current is None or id(current) in optimized:
+                continue
+            elif is_visited:
+                optimized[id(current)] = self.optimize(current, optimized)
+                continue
+            stack.append((current, True))
+            if current.children is not None:
+                stack.extend((child, False) for child in current.children)
+            else:
+                stack.append((current.left, False))
+                stack.append((current.right, False))
+        if self.level >= OPTIMIZE_LOOPS:
+            # Changes the optimized copy only
+            return SubexpressionOptimizer()(optimized[id(node)])
+        return optimized[id(node)]
+
+    def optimize(self, node: Node, optimized: Dict[int, Optional[Node]]) -> Optional[Node]:
+        def get(child: Optional[Node]) -> Optional[Node]:
+            return None if child is None else optimized[id(child)]
+
+        new_node = Node(
+            type=node.type,
+            left=get(node.left),
+            right=get(node.right),
+            value=node.value,
+            children=None if node.children is None else [
+                get(child) for child in node.children],
+            row=node.row,
+            column=node.column,
+        )
+        new_node.constant = node.constant
+        return self.rewrite(new_node)
+
+    def rewrite(self, node: Node) -> Optional[Node]:
+        if node.type is NodeType.INT:
+            node.constant = int(node.value)
+        elif node.type in BINARY_OPERATORS:
+            if is_literal(node.left) and is_literal(node.right):
+                return self.fold(node, BINARY_OPERATORS[node.type], node.left, node.right)
+        elif node.type in UNARY_OPERATORS:
+            if is_literal(node.left):
+                return self.fold(node, UNARY_OPERATORS[node.type], node.left)
+        elif node.type in (NodeType.AND, NodeType.OR):
+            if is_literal(node.left):
+                left_value = literal_value(node.left)
+                if bool(left_value) is (node.type is NodeType.OR):
+                    # Left decides the result
+                    return node.left
+                elif is_literal(node.right):
+                    return node.right
+        elif node.type is NodeType.IF:
+            if is_literal(node.left):
+                branches = node.right
+                branch = branches.left if literal_value(node.left) else branches.right
+                return locate(empty_statement(), node) if branch is None else branch
+        elif node.type is NodeType.WHILE:
+            if is_literal(node.left) and not literal_value(node.left):
+                return locate(empty_statement(), node)
+        elif node.type is NodeType.PRINT_STRING:
+            node.constant = printed_text(node.left)
+        return node
+
+    def fold(self, node: Node, operation: Any, *operands: Node) -> Node:
+        try:
+            value = operation(*[literal_value(operand) for operand in operands])
+        except (ArithmeticError, TypeError, ValueError):
+            # Raised when run instead, like without optimizing
+            return node
+        literal = make_literal(value)
+        return node if literal is None else locate(literal, node)
@@ -0,0 +1,91 @@
+import sys
+from enum import Enum
+from typing import Any, Callable, List, Optional
+
+
+FlushMode = Enum('FlushMode', [
+    # When a newline is written
+    'LINE',
+    # When the buffer is full
+    'SIZE',
+    # When the run ends
+    'EXIT',
+])
+
+
+DEFAULT_BUFFER_SIZE = 8192
+
+
+def unescape(value: str) -> str:
+    # Replace escaped newline and tab in string
+    if '\\' not in value:
+        return value
+    return value.replace(r'\n', '\n').replace(r'\t', '\t')
+
+
+def print_str(value: str, write: Callable[[str], Any]) -> None:
+    write(unescape(value))
+
+
+def print_value(value: Any, write: Callable[[str], Any]) -> None:
+    if type(value) is int:
+        write(str(value))
+    elif type(value) is str:
+        write(unescape(value))
+    elif type(value) is list:
+        for item in value:
+            print_value(item, write)
+    else:
+        raise Exception('cannot print unknown value type')
+
+
+class Output:
+    '''
+    Program output, buffered and written to a sink when flushed. A sink is
+    anything with write(str), by default standard output at the time of the
+    flush. Output written before a run ends is flushed by every engine.
+    '''
+    def __init__(
+        self,
+        sink: Optional[Any] = None,
+        flush_mode: FlushMode = FlushMode.SIZE,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+    ) -> None:
+        self.sink = sink
+        self.flush_mode = flush_mode
+        self.buffer_size = buffer_size
+        self.parts: List[str] = []
+        self.size = 0
+        # Called for every putc, chosen once
+        if flush_mode is FlushMode.LINE:
+            self.write = self.write_line
+        elif flush_mode is FlushMode.SIZE:
+            self.write = self.write_sized
+        else:
+            self.write = self.parts.append
+
+    def write_line(self, text: str) -> None:
+        self.parts.append(text)
+        if '\n' in text:
+            self.flush()
+
+    def write_sized(self, text: str) -> None:
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def getvalue(self) -> str:
+        # Buffered, not yet flushed
+        return str().join(self.parts)
+
+    def flush(self) -> None:
+        if len(self.parts) == 0:
+            return
+        sink = sys.stdout if self.sink is None else self.sink
+        sink.write(self.getvalue())
+        self.parts.clear()
+        self.size = 0
+        flush_sink = getattr(sink, 'flush', None)
+        if flush_sink is not None:
+            flush_sink()
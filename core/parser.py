@@ -1,35 +1,64 @@
-from core.ast import Node, NodeType
-from core.tokens import Token, TokenType
+from core.ast import Node, NodeType, literal_value
+from core.tokens import (
+    TOKEN_TYPE_BY_ID, Token, TokenStream, TokenType, as_compact_tokens)
 
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+
+# Source position as (row, column)
+Position = Tuple[int, int]
+
+BINARY_OPERATOR_BY_TOKEN_ID = dict([
+    (TokenType.OPERATOR_ADD.id, NodeType.ADD),
+    (TokenType.OPERATOR_SUBTRACT.id, NodeType.SUBTRACT),
+    (TokenType.OPERATOR_MULTIPLY.id, NodeType.MULTIPLY),
+    (TokenType.OPERATOR_DIVIDE.id, NodeType.DIVIDE),
+    (TokenType.OPERATOR_MOD.id, NodeType.MOD),
+    (TokenType.OPERATOR_LESS.id, NodeType.LESS_THAN),
+    (TokenType.OPERATOR_EQUAL.id, NodeType.EQUAL),
+    (TokenType.OPERATOR_NOT_EQUAL.id, NodeType.NOT_EQUAL),
+    (TokenType.OPERATOR_LESS_OR_EQUAL.id, NodeType.LESS_THAN_OR_EQUAL),
+    (TokenType.OPERATOR_GREATER.id, NodeType.GREATER_THAN),
+    (TokenType.OPERATOR_GREATER_OR_EQUAL.id, NodeType.GREATER_THAN_OR_EQUAL),
+    (TokenType.OPERATOR_AND.id, NodeType.AND),
+    (TokenType.OPERATOR_OR.id, NodeType.OR),
+])
 
 
 class Parser:
     @property
-    def row(self) -> int:
-        return self.token and self.token.row
-    
-    @property
-    def column(self) -> int:
-        return self.token and self.token.column
+    def token_label(self) -> str:
+        return self.token_id and TOKEN_TYPE_BY_ID[self.token_id].name
 
     @property
-    def token_value(self) -> str:
-        return self.token and self.token.value
-    
-    @property
-    def token_label(self) -> str:
-        return self.token and self.token.name
-    
+    def position(self) -> Position:
+        # Of the current token, where the node about to be parsed starts
+        return self.row, self.column
+
     def __init__(self) -> None:
         self.tokens = None
-        self.token = None
+        self.token_id = None
+        self.row = None
+        self.column = None
+        self.token_value = None
 
-    def __call__(self, tokens: List[Token]) -> Node:
-        self.tokens = (token for token in tokens)
-        self.next_token()   # Consume first token
+    def __call__(self, tokens: Union[Iterable[Token], TokenStream]) -> Node:
+        self.start(tokens)
         return self.parse_sequence()
 
+    def stream(self, tokens: Union[Iterable[Token], TokenStream]) -> Iterator[Node]:
+        '''
+        Yield each top-level statement as soon as it is parsed, instead of
+        building the sequence of the whole program.
+        '''
+        self.start(tokens)
+        return self.parse_top_level()
+
+    def start(self, tokens: Union[Iterable[Token], TokenStream]) -> None:
+        # Tokens are compared by integer id, not by name
+        self.tokens = as_compact_tokens(tokens)
+        self.next_token()   # Consume first token
+
     def fail(self, message: str) -> None:
         raise Exception(' - ' .join([
             message,
@@ -40,10 +69,10 @@ class Parser:
         ]))
 
     def next_token(self) -> None:
-        self.token = next(self.tokens)
+        self.token_id, self.row, self.column, self.token_value = next(self.tokens)
 
     def accept(self, token: TokenType) -> bool:
-        return self.token_label == token.name
+        return self.token_id == token.id
 
     def expect(self, token: TokenType) -> str:
         if self.accept(token):
@@ -53,42 +82,63 @@ class Parser:
         else:
             self.fail('expected token {}'.format(token.name))
 
-    def make_leaf(self, type: NodeType, value: str) -> Node:
-        return Node(type=type, value=value)
+    def make_leaf(self, type: NodeType, value: str, position: Position) -> Node:
+        row, column = position
+        return Node(type=type, value=value, row=row, column=column)
+
+    def make_node(
+        self,
+        type: NodeType,
+        left: Node,
+        right: Optional[Node] = None,
+        position: Optional[Position] = None,
+    ) -> Node:
+        # Starts with its left node, unless given
+        row, column = position or (left.row, left.column)
+        return Node(type=type, left=left, right=right, row=row, column=column)
 
-    def make_node(self, type: NodeType, left: Node, right: Optional[Node] = None) -> Node:
-        return Node(type=type, left=left, right=right)
+    def make_list(self, type: NodeType, children: List[Node], position: Position) -> Node:
+        row, column = position
+        return Node(type=type, children=children, row=row, column=column)
 
     def parse_identifier(self) -> Node:
         # Leaf
+        position = self.position
         name = self.expect(TokenType.IDENTIFIER)
-        return self.make_leaf(NodeType.IDENTIFIER, name)
+        return self.make_leaf(NodeType.IDENTIFIER, name, position)
 
     def parse_integer(self) -> Node:
         # Leaf
+        position = self.position
         value = self.expect(TokenType.LITERAL_INT)
-        integer = self.make_leaf(NodeType.INT, value)
+        integer = self.make_leaf(NodeType.INT, value, position)
         return integer
     
     def parse_string(self) -> Node:
         # Leaf
+        position = self.position
         value = self.expect(TokenType.LITERAL_STR)
-        string = self.make_leaf(NodeType.STR, value)
+        string = self.make_leaf(NodeType.STR, value, position)
         return string
 
     def parse_array(self) -> Node:
         '''
         array = "[" { expression "," } "]" ";" ;
         '''
+        position = self.position
         self.expect(TokenType.SYMBOL_OPEN_SQUARE_BRACKET)
-        array = None
+        items = []
         while not self.accept(TokenType.TERMINAL):
             if self.accept(TokenType.SYMBOL_CLOSE_SQUARE_BRACKET):
                 break
-            expression = self.parse_expression()
+            items.append(self.parse_expression())
             self.expect(TokenType.SYMBOL_COMMA)
-            array = self.make_node(NodeType.ARRAY, expression, array)
         self.expect(TokenType.SYMBOL_CLOSE_SQUARE_BRACKET)
+        array = self.make_list(NodeType.ARRAY_LIST, items, position)
+        # Array of literals is built once, here
+        values = [literal_value(item) for item in items]
+        if None not in values:
+            array.constant = values
         return array
 
     def parse_expression_binary(self):
@@ -98,47 +148,24 @@ class Parser:
                               expression
                               ;
         '''
-        if self.accept(TokenType.OPERATOR_ADD):
-            type = NodeType.ADD
-        elif self.accept(TokenType.OPERATOR_SUBTRACT):
-            type = NodeType.SUBTRACT
-        elif self.accept(TokenType.OPERATOR_MULTIPLY):
-            type = NodeType.MULTIPLY
-        elif self.accept(TokenType.OPERATOR_DIVIDE):
-            type = NodeType.DIVIDE
-        elif self.accept(TokenType.OPERATOR_MOD):
-            type = NodeType.MOD
-        elif self.accept(TokenType.OPERATOR_LESS):
-            type = NodeType.LESS_THAN
-        elif self.accept(TokenType.OPERATOR_EQUAL):
-            type = NodeType.EQUAL
-        elif self.accept(TokenType.OPERATOR_NOT_EQUAL):
-            type = NodeType.NOT_EQUAL
-        elif self.accept(TokenType.OPERATOR_LESS_OR_EQUAL):
-            type = NodeType.LESS_THAN_OR_EQUAL
-        elif self.accept(TokenType.OPERATOR_GREATER):
-            type = NodeType.GREATER_THAN
-        elif self.accept(TokenType.OPERATOR_GREATER_OR_EQUAL):
-            type = NodeType.GREATER_THAN_OR_EQUAL
-        elif self.accept(TokenType.OPERATOR_AND):
-            type = NodeType.AND
-        elif self.accept(TokenType.OPERATOR_OR):
-            type = NodeType.OR
-        else:
+        type = BINARY_OPERATOR_BY_TOKEN_ID.get(self.token_id)
+        if type is None:
             # Unknown / unregistered
             self.fail('unknown operator')
+        position = self.position
         self.next_token()  # Consume operator
         left_expression = self.parse_expression()
         right_expression = self.parse_expression()
-        return self.make_node(type, left_expression, right_expression)
+        return self.make_node(type, left_expression, right_expression, position)
 
     def parse_expression_not(self) -> Node:
         '''
         expression_not = "not" expression ;
         '''
+        position = self.position
         self.expect(TokenType.OPERATOR_NOT)
         expression = self.parse_expression()
-        return self.make_node(NodeType.NOT, expression)
+        return self.make_node(NodeType.NOT, expression, position=position)
 
     def parse_identifier_operator(self) -> Node:
         '''
@@ -212,15 +239,17 @@ class Parser:
         '''
         while = "while" expression_parenthesis keyword_block ;
         '''
+        position = self.position
         self.expect(TokenType.KEYWORD_WHILE)
         expression_parenthesis = self.parse_expression_parenthesis()
         block = self.parse_keyword_block()
-        return self.make_node(NodeType.WHILE, expression_parenthesis, block)
+        return self.make_node(NodeType.WHILE, expression_parenthesis, block, position)
 
     def parse_if(self) -> Node:
         '''
         if = "if" expression_parenthesis keyword_block [ "else" keyword_block ] ;
         '''
+        position = self.position
         self.expect(TokenType.KEYWORD_IF)
         expression_parenthesis = self.parse_expression_parenthesis()
         if_block = self.parse_keyword_block()
@@ -231,15 +260,18 @@ class Parser:
         return self.make_node(
             NodeType.IF,
             expression_parenthesis,
-            self.make_node(NodeType.IF, if_block, else_block))
+            self.make_node(NodeType.IF, if_block, else_block),
+            position)
 
     def parse_print_character(self) -> Node:
         '''
         print_character = "putc" expression_parenthesis ";" ;
         '''
+        position = self.position
         self.expect(TokenType.KEYWORD_PRINT_CHARACTER)
         expression_parenthesis = self.parse_expression_parenthesis()
-        print_character = self.make_node(NodeType.PRINT_CHARACTER, expression_parenthesis)
+        print_character = self.make_node(
+            NodeType.PRINT_CHARACTER, expression_parenthesis, position=position)
         self.expect(TokenType.SYMBOL_SEMICOLON)
         return print_character
 
@@ -247,9 +279,11 @@ class Parser:
         '''
         print_string = "print" expression_parenthesis ";" ;
         '''
+        position = self.position
         self.expect(TokenType.KEYWORD_PRINT_STRING)
         expression_parenthesis = self.parse_expression_parenthesis()
-        print_string = self.make_node(NodeType.PRINT_STRING, expression_parenthesis)
+        print_string = self.make_node(
+            NodeType.PRINT_STRING, expression_parenthesis, position=position)
         self.expect(TokenType.SYMBOL_SEMICOLON)
         return print_string
 
@@ -257,9 +291,11 @@ class Parser:
         '''
         assert = "assert" expression_parenthesis ";" ;
         '''
+        position = self.position
         self.expect(TokenType.KEYWORD_ASSERT)
         expression_parenthesis = self.parse_expression_parenthesis()
-        _assert = self.make_node(NodeType.ASSERT, expression_parenthesis)
+        _assert = self.make_node(
+            NodeType.ASSERT, expression_parenthesis, position=position)
         self.expect(TokenType.SYMBOL_SEMICOLON)
         return _assert
 
@@ -267,14 +303,18 @@ class Parser:
         '''
         block = "{" { statement } "}" ;
         '''
+        position = self.position
         self.expect(TokenType.SYMBOL_OPEN_BRACE)
-        sequence = None
+        statements = []
         while not self.accept(TokenType.TERMINAL):
             if self.accept(TokenType.SYMBOL_CLOSE_BRACE):
                 break
-            sequence = self.make_node(NodeType.SEQUENCE, self.parse_statement(), sequence)
+            statements.append(self.parse_statement())
         self.expect(TokenType.SYMBOL_CLOSE_BRACE)
-        return self.make_node(NodeType.BLOCK, sequence)
+        return self.make_node(
+            NodeType.BLOCK,
+            self.make_list(NodeType.STATEMENT_LIST, statements, position),
+            position=position)
 
     def parse_keyword_block(self) -> Node:
         '''
@@ -313,16 +353,178 @@ class Parser:
         else:
             self.fail('invalid statement')
 
+    def parse_top_level(self) -> Iterator[Node]:
+        while not self.accept(TokenType.TERMINAL):
+            if self.accept(TokenType.SYMBOL_SEMICOLON):
+                self.next_token()
+                continue
+            yield self.parse_statement()
+
+    def parse_sequence(self) -> Node:
+        '''
+        sequence = ";" | { statement } ;
+        '''
+        position = self.position
+        return self.make_list(
+            NodeType.STATEMENT_LIST,
+            list(self.parse_top_level()),
+            position)
+
+
+def shift_rows(node: Optional[Node], shift: int) -> None:
+    # Non-recursive traversal
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        if node.row is not None:
+            node.row += shift
+        if node.children is not None:
+            stack.extend(node.children)
+        else:
+            stack.append(node.left)
+            stack.append(node.right)
+
+
+class Statement(NamedTuple):
+    start: Position
+    end: Position
+    # Last position the statement depends on: the token after it when the
+    # parser looked ahead for "else", otherwise its end
+    lookahead: Position
+    node: Node
+
+
+class IncrementalParser(Parser):
+    '''
+    Parser which keeps the top-level statements of the previous parse, and
+    reuses those whose lines (up to and including the lookahead token) did
+    not change. Tokens are line-local, so equal lines lex to equal tokens.
+    '''
+    def __init__(self) -> None:
+        super().__init__()
+        self.lines: List[str] = []
+        self.statements: List[Statement] = []
+        self.statement_by_start: Dict[Position, Statement] = dict()
+        self.last_row = None
+        self.last_column = None
+        self.else_lookahead = None
+        # Rows [1, prefix] are unchanged, and so are rows after the change
+        # which are shifted by `shift` rows
+        self.prefix = 0
+        self.suffix_row = 0
+        self.shift = 0
+        self.reused = 0
+
+    def __call__(
+        self,
+        tokens: Union[Iterable[Token], TokenStream],
+        lines: Optional[List[str]] = None,
+    ) -> Node:
+        if lines is None:
+            # Unknown changes, nothing can be reused
+            self.statement_by_start = dict()
+            lines = []
+        else:
+            self.diff_lines(lines)
+        self.reused = 0
+        try:
+            ast = super().__call__(tokens)
+        except Exception:
+            # Statements of a failed parse are incomplete
+            self.lines = []
+            self.statements = []
+            raise
+        self.lines = lines
+        return ast
+
+    def diff_lines(self, lines: List[str]) -> None:
+        # Sentinel line for the terminal row
+        old_lines = self.lines + [None]
+        new_lines = lines + [None]
+        size = min(len(old_lines), len(new_lines))
+        prefix = 0
+        while prefix < size and old_lines[prefix] == new_lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while (
+            suffix < size - prefix and
+            old_lines[-1 - suffix] == new_lines[-1 - suffix]
+        ):
+            suffix += 1
+        self.prefix = prefix
+        self.shift = len(new_lines) - len(old_lines)
+        # First unchanged row after the change, in the previous lines
+        self.suffix_row = len(old_lines) - suffix + 1
+        self.statement_by_start = dict(
+            (statement.start, statement)
+            for statement in self.statements)
+
+    def next_token(self) -> None:
+        self.last_row, self.last_column = self.row, self.column
+        super().next_token()
+
+    def parse_if(self) -> Node:
+        node = super().parse_if()
+        if node.right.right is None:
+            self.else_lookahead = (self.row, self.column)
+        return node
+
+    def find_reusable(self) -> Optional[Statement]:
+        row = self.row
+        if row <= self.prefix:
+            old_row = row
+        elif row - self.shift >= self.suffix_row:
+            old_row = row - self.shift
+        else:
+            return None
+        statement = self.statement_by_start.get((old_row, self.column))
+        if statement is None:
+            return None
+        if old_row <= self.prefix and statement.lookahead[0] > self.prefix:
+            # Statement, or its lookahead, spans a changed line
+            return None
+        return statement
+
+    def skip_statement(self, statement: Statement) -> None:
+        end_row, end_column = statement.end
+        if end_row > self.prefix:
+            end_row += self.shift
+        while (self.row, self.column) <= (end_row, end_column):
+            self.next_token()
+
     def parse_sequence(self) -> Node:
         '''
         sequence = ";" | { statement } ;
         '''
-        sequence = None
+        position = self.position
+        statements = []
         while not self.accept(TokenType.TERMINAL):
             if self.accept(TokenType.SYMBOL_SEMICOLON):
                 self.next_token()
                 continue
-            sequence = self.make_node(NodeType.SEQUENCE, self.parse_statement(), sequence)
-        if sequence is None:
-            sequence = self.make_node(NodeType.SEQUENCE, None)
-        return sequence
+            start = (self.row, self.column)
+            statement = self.find_reusable()
+            if statement is None:
+                node = self.parse_statement()
+                has_lookahead = self.else_lookahead == (self.row, self.column)
+            else:
+                self.skip_statement(statement)
+                node = statement.node
+                if start[0] != statement.start[0]:
+                    # Moved with the lines after the change
+                    shift_rows(node, start[0] - statement.start[0])
+                has_lookahead = statement.lookahead != statement.end
+                self.reused += 1
+            end = (self.last_row, self.last_column)
+            statements.append(Statement(
+                start=start,
+                end=end,
+                lookahead=(self.row, self.column) if has_lookahead else end,
+                node=node))
+        self.statements = statements
+        return self.make_list(
+            NodeType.STATEMENT_LIST,
+            [statement.node for statement in statements],
+            position)
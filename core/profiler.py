@@ -0,0 +1,154 @@
+import json
+import time
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from core.ast import Node, NodeType
+
+
+# Lines and loops listed by the report, hottest first
+REPORT_LIMIT = 10
+
+
+class NodeProfile:
+    def __init__(self, node: Node) -> None:
+        self.node = node
+        # Times evaluated, and seconds spent evaluating it in total and
+        # outside of the nodes it evaluated
+        self.visits = 0
+        self.time = 0.0
+        self.self_time = 0.0
+
+    def as_dict(self) -> dict:
+        return dict(
+            type=self.node.type.name,
+            row=self.node.row,
+            column=self.node.column,
+            visits=self.visits,
+            time=self.time,
+            self_time=self.self_time,
+        )
+
+
+class LineProfile(NamedTuple):
+    row: int
+    # Nodes evaluated on the line, and seconds spent in them
+    visits: int
+    time: float
+
+
+class LoopProfile(NamedTuple):
+    row: Optional[int]
+    column: Optional[int]
+    iterations: int
+    # Including the nodes of its condition and body
+    time: float
+
+
+class Profiler:
+    '''
+    Count visits and time spent in every node evaluated by a walker, see
+    Walker(profiler=...). A node is timed from its evaluation until its value
+    is left on the value stack, so the continuations of a node count as its
+    own time. Profiles of every walk add up.
+    '''
+    def __init__(self, clock=time.perf_counter) -> None:
+        self.clock = clock
+        self.profiles: Dict[int, NodeProfile] = dict()
+        # Nodes being evaluated, as [profile, start, time of nested nodes]
+        self.frames: List[List[Any]] = []
+
+    def start(self) -> None:
+        # Nodes of a failed walk never finish
+        self.frames = []
+
+    def enter(self, node: Node) -> None:
+        profile = self.profiles.get(id(node))
+        if profile is None:
+            profile = self.profiles[id(node)] = NodeProfile(node)
+        profile.visits += 1
+        self.frames.append([profile, self.clock(), 0.0])
+
+    def exit(self, _: Any) -> None:
+        # Continuation, pushed below the tasks of the node
+        profile, start, nested_time = self.frames.pop()
+        elapsed = self.clock() - start
+        profile.time += elapsed
+        profile.self_time += elapsed - nested_time
+        if self.frames:
+            self.frames[-1][2] += elapsed
+
+    @property
+    def total_time(self) -> float:
+        return sum(profile.self_time for profile in self.profiles.values())
+
+    def lines(self) -> List[LineProfile]:
+        # Hottest first, nodes without a position are left out
+        visits: Dict[int, int] = dict()
+        times: Dict[int, float] = dict()
+        for profile in self.profiles.values():
+            row = profile.node.row
+            if row is None:
+                continue
+            visits[row] = visits.get(row, 0) + profile.visits
+            times[row] = times.get(row, 0.0) + profile.self_time
+        lines = [LineProfile(row, visits[row], times[row]) for row in visits]
+        lines.sort(key=lambda line: (-line.time, line.row))
+        return lines
+
+    def loops(self) -> List[LoopProfile]:
+        # Hottest first, an iteration is an evaluation of the body
+        loops = []
+        for profile in self.profiles.values():
+            node = profile.node
+            if node.type is not NodeType.WHILE:
+                continue
+            body = self.profiles.get(id(node.right))
+            loops.append(LoopProfile(
+                row=node.row,
+                column=node.column,
+                iterations=0 if body is None else body.visits,
+                time=profile.time))
+        loops.sort(key=lambda loop: -loop.time)
+        return loops
+
+    def as_dict(self) -> dict:
+        return dict(
+            total_time=self.total_time,
+            lines=[line._asdict() for line in self.lines()],
+            loops=[loop._asdict() for loop in self.loops()],
+            nodes=[profile.as_dict() for profile in self.profiles.values()],
+        )
+
+    def as_json(self) -> str:
+        return json.dumps(self.as_dict(), indent=2)
+
+    def report(
+        self,
+        source_lines: Optional[List[str]] = None,
+        limit: int = REPORT_LIMIT,
+    ) -> Iterable[str]:
+        total_time = self.total_time or 1.0
+
+        def source(row: Optional[int]) -> str:
+            if source_lines is None or row is None or not 0 < row <= len(source_lines):
+                return str()
+            return source_lines[row - 1].strip()
+
+        yield 'Total time: {:.6f} s'.format(self.total_time)
+        yield str()
+        yield 'Hottest lines'
+        yield '{:>6} {:>12} {:>12} {:>7}  {}'.format(
+            'Line', 'Nodes', 'Time (s)', 'Time %', 'Source')
+        for line in self.lines()[:limit]:
+            yield '{:>6} {:>12} {:>12.6f} {:>6.1f}%  {}'.format(
+                line.row, line.visits, line.time,
+                100 * line.time / total_time, source(line.row))
+        yield str()
+        yield 'Hottest loops'
+        yield '{:>6} {:>12} {:>12} {:>7}  {}'.format(
+            'Line', 'Iterations', 'Time (s)', 'Time %', 'Source')
+        for loop in self.loops()[:limit]:
+            yield '{:>6} {:>12} {:>12.6f} {:>6.1f}%  {}'.format(
+                '?' if loop.row is None else loop.row, loop.iterations, loop.time,
+                100 * loop.time / total_time, source(loop.row))
@@ -0,0 +1,217 @@
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from core.ast import Node, NodeType
+from core.variables import VARIABLE_TYPE_BY_VALUE_TYPE, Variable
+
+
+VALUE_TYPE_BY_VARIABLE_TYPE = dict([
+    (variable_type, value_type)
+    for value_type, variable_type in VARIABLE_TYPE_BY_VALUE_TYPE.items()
+])
+
+ARITHMETIC_NODE_TYPES = frozenset([
+    NodeType.ADD,
+    NodeType.SUBTRACT,
+    NodeType.MULTIPLY,
+    NodeType.DIVIDE,
+    NodeType.MOD,
+])
+
+# Returns 1 or 0
+COMPARISON_NODE_TYPES = frozenset([
+    NodeType.EQUAL,
+    NodeType.NOT_EQUAL,
+    NodeType.LESS_THAN,
+    NodeType.LESS_THAN_OR_EQUAL,
+    NodeType.GREATER_THAN,
+    NodeType.GREATER_THAN_OR_EQUAL,
+    NodeType.NOT,
+])
+
+# Typed from the types of their operands
+TYPED_OPERAND_NODE_TYPES = ARITHMETIC_NODE_TYPES | frozenset([
+    NodeType.AND,
+    NodeType.OR,
+])
+
+# Types for which + returns the same type
+ADD_VALUE_TYPES = frozenset([int, str, list])
+
+# Fail unless both operands are int, when either is
+INT_OPERAND_NODE_TYPES = frozenset([
+    NodeType.ADD,
+    NodeType.SUBTRACT,
+    NodeType.DIVIDE,
+])
+
+
+def arithmetic_type(
+    node_type: NodeType,
+    left_type: Optional[type],
+    right_type: Optional[type],
+) -> Optional[type]:
+    # Type of the result, when the operation succeeds
+    if left_type is right_type:
+        if left_type is int:
+            return int
+        elif node_type is NodeType.ADD and left_type in ADD_VALUE_TYPES:
+            return left_type
+    elif node_type in INT_OPERAND_NODE_TYPES and int in (left_type, right_type):
+        return int
+    elif node_type is NodeType.MOD and left_type is int:
+        return int
+    return None
+
+
+def undefined_message(name: str) -> str:
+    return 'variable reference before assignment - {} is undefined'.format(name)
+
+
+class Slot(NamedTuple):
+    # Depth of the block declaring the variable, 0 is the global scope
+    depth: int
+    # Position in the frame of that block
+    index: int
+    # Python type of the value, when proven from the source
+    type: Optional[type]
+
+
+class Resolver:
+    '''
+    Assign every variable a slot in the frame of the block that declares it.
+
+    The statements of a block run in order, and a nested block only sees the
+    declarations before it. So which declaration a name refers to, and
+    whether it is declared at all, is known from the source alone.
+    '''
+    def __init__(self, variables: Optional[Dict[str, Variable]] = None) -> None:
+        self.scopes: List[Dict[str, Slot]] = [dict()]
+        # Variables of earlier runs, eg. previous top-level statements
+        for name, variable in (variables or dict()).items():
+            self.declare(name, VALUE_TYPE_BY_VARIABLE_TYPE.get(variable.type))
+
+    @property
+    def depth(self) -> int:
+        return len(self.scopes) - 1
+
+    def enter(self) -> None:
+        self.scopes.append(dict())
+
+    def exit(self) -> int:
+        # Returns size of the frame
+        return len(self.scopes.pop())
+
+    def resolve(self, name: str) -> Optional[Slot]:
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def declare(self, name: str, value_type: Optional[type]) -> Slot:
+        scope = self.scopes[-1]
+        slot = Slot(self.depth, len(scope), value_type)
+        scope[name] = slot
+        return slot
+
+    def global_names(self) -> List[str]:
+        # In slot order
+        return list(self.scopes[0])
+
+    def value_type(
+        self,
+        node: Node,
+        operand_type: Callable[[Optional[Node]], Optional[type]],
+    ) -> Optional[type]:
+        # Type of the value of an expression, from the types of its operands
+        if node.type is NodeType.INT:
+            return int
+        elif node.type is NodeType.STR:
+            # Empty string has no value
+            return None if node.value is None else str
+        elif node.type in (NodeType.ARRAY_LIST, NodeType.ARRAY):
+            return list
+        elif node.type is NodeType.IDENTIFIER:
+            slot = self.resolve(node.value)
+            return None if slot is None else slot.type
+        elif node.type in COMPARISON_NODE_TYPES:
+            return int
+        elif node.type in ARITHMETIC_NODE_TYPES:
+            return arithmetic_type(
+                node.type, operand_type(node.left), operand_type(node.right))
+        elif node.type in (NodeType.AND, NodeType.OR):
+            left_type = operand_type(node.left)
+            if left_type is operand_type(node.right):
+                return left_type
+        return None
+
+    def expression_type(self, node: Optional[Node]) -> Optional[type]:
+        types: Dict[int, Optional[type]] = dict()
+
+        def operand_type(operand: Optional[Node]) -> Optional[type]:
+            return None if operand is None else types.get(id(operand))
+
+        # Explicit stack, operands are typed first
+        stack: List[Tuple[bool, Optional[Node]]] = [(False, node)]
+        while stack:
+            is_typed, current = stack.pop()
+            if current is None:
+                continue
+            elif is_typed:
+                types[id(current)] = self.value_type(current, operand_type)
+            else:
+                stack.append((True, current))
+                if current.type in TYPED_OPERAND_NODE_TYPES:
+                    stack.append((False, current.right))
+                    stack.append((False, current.left))
+        return operand_type(node)
+
+    def declare_assigned(
+        self,
+        node: Node,
+        value_type: Optional[type],
+    ) -> Optional[Slot]:
+        '''
+        Declare what an assignment declares, the same for every engine: a
+        variable when first assigned, the map of a variable when first
+        assigned a key. Returns the new slot, if any.
+        '''
+        target = node.left
+        if target.type is NodeType.IDENTIFIER:
+            if self.resolve(target.value) is None:
+                return self.declare(target.value, value_type)
+        elif (
+            target.type is NodeType.IDENTIFIER_MAP and
+            target.left.type is NodeType.IDENTIFIER
+        ):
+            name = target.left.value
+            if self.resolve(name) is not None and self.resolve(name + '#') is None:
+                return self.declare(name + '#', dict)
+        return None
+
+
+def global_frame(
+    preset_names: List[str],
+    global_names: List[str],
+    variables: Dict[str, Variable],
+) -> List[object]:
+    # Values of variables declared before the run, then empty slots
+    frame: List[object] = [variables[name].value for name in preset_names]
+    frame.extend([None] * (len(global_names) - len(preset_names)))
+    return frame
+
+
+def store_global_frame(
+    names: Iterable[str],
+    frame: List[object],
+    variables: Dict[str, Variable],
+) -> None:
+    for name, value in zip(names, frame):
+        if value is None:
+            # Never assigned, the run stopped before
+            continue
+        elif name in variables:
+            variables[name].value = value
+        else:
+            variables[name] = Variable(
+                name, VARIABLE_TYPE_BY_VALUE_TYPE[type(value)], value)
+
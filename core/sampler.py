@@ -0,0 +1,102 @@
+import threading
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from core.ast import Node, NodeType
+
+
+# Seconds between samples. The walker only lets another thread run every
+# sys.getswitchinterval() seconds, so sampling more often is no better.
+SAMPLE_INTERVAL = 0.005
+
+FRAME_NODE_TYPES = frozenset([
+    NodeType.WHILE,
+    NodeType.IF,
+    NodeType.BLOCK,
+])
+
+# Continuations of the walker left on the task stack while the nodes they
+# were given run, see Walker.loop, Walker.branch and Walker.evaluate_block
+FRAME_ACTION_NAMES = frozenset([
+    'loop',
+    'branch',
+    'clear_value',
+    'exit_scope',
+])
+
+
+def frame_name(node: Node) -> str:
+    # Never a semicolon, which separates frames
+    return '{}:{}'.format(node.type.name.lower(), '?' if node.row is None else node.row)
+
+
+class SamplingProfiler:
+    '''
+    Record what a walker is running from a side thread, every interval: the
+    while, if and block nodes it is in, outermost first. The walker runs as
+    it does without sampling, a sample only reads its task stack.
+
+    Samples are counted by path, and written in the collapsed stack format
+    of flame graph tools, one path per line:
+
+        program;while:6;block:6;while:10 42
+    '''
+    def __init__(
+        self,
+        walker,
+        name: str = 'program',
+        interval: float = SAMPLE_INTERVAL,
+    ) -> None:
+        self.walker = walker
+        # Root of every path, eg. the file name
+        self.name = name
+        self.interval = interval
+        self.samples: Dict[Tuple[str, ...], int] = dict()
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+
+    def start(self) -> None:
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self.run, name='elang sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def path(self) -> Optional[Tuple[str, ...]]:
+        # None when not walking
+        walker = self.walker
+        # Copied at once, the walker keeps changing it
+        tasks = walker.tasks[:]
+        running_loop = walker.running_loop
+        if len(tasks) == 0 and running_loop is None:
+            return None
+        names: List[str] = [self.name]
+        for action, argument in tasks:
+            if (
+                type(argument) is Node and
+                argument.type in FRAME_NODE_TYPES and
+                getattr(action, '__name__', None) in FRAME_ACTION_NAMES
+            ):
+                names.append(frame_name(argument))
+        if running_loop is not None:
+            # Compiled, including any loop nested in it
+            names.append(frame_name(running_loop))
+        return tuple(names)
+
+    def sample(self) -> None:
+        path = self.path()
+        if path is not None:
+            self.samples[path] = self.samples.get(path, 0) + 1
+
+    def collapsed(self) -> Iterable[str]:
+        for path, count in sorted(self.samples.items()):
+            yield '{} {}'.format(';'.join(path), count)
@@ -0,0 +1,260 @@
+from typing import Any, Callable, List, Optional, Set
+
+from core.ast import Node, NodeType
+from core.output import unescape
+from core.resolver import Resolver
+from core.variables import Table, Variable, VariableType
+
+
+# Iterations of a while loop before it is specialized
+HOT_LOOP_ITERATIONS = 100
+
+INDENT = '    '
+
+ARITHMETIC_OPERATORS = dict([
+    (NodeType.ADD, '+'),
+    (NodeType.SUBTRACT, '-'),
+    (NodeType.MULTIPLY, '*'),
+    (NodeType.DIVIDE, '//'),
+    (NodeType.MOD, '%'),
+])
+
+COMPARISON_OPERATORS = dict([
+    (NodeType.EQUAL, '=='),
+    (NodeType.NOT_EQUAL, '!='),
+    (NodeType.LESS_THAN, '<'),
+    (NodeType.LESS_THAN_OR_EQUAL, '<='),
+    (NodeType.GREATER_THAN, '>'),
+    (NodeType.GREATER_THAN_OR_EQUAL, '>='),
+])
+
+LOGICAL_OPERATORS = dict([
+    (NodeType.AND, 'and'),
+    (NodeType.OR, 'or'),
+])
+
+
+class NotSpecializable(Exception):
+    pass
+
+
+def identifier_names(node: Optional[Node]) -> Set[str]:
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node is None:
+            continue
+        elif node.type is NodeType.IDENTIFIER:
+            names.add(node.value)
+        if node.children is not None:
+            stack.extend(node.children)
+        else:
+            stack.append(node.left)
+            stack.append(node.right)
+    return names
+
+
+def local_name(name: str) -> str:
+    # Never a Python keyword or builtin
+    return 'v_' + name
+
+
+class SpecializedLoop:
+    '''
+    A while loop compiled into a Python function, for the types its
+    variables had when it was compiled: every variable holds an int.
+    '''
+    def __init__(
+        self,
+        function: Callable[[List[Variable], Callable[[str], Any]], None],
+        outer_names: List[str],
+        inner_names: List[str],
+        source: str,
+    ) -> None:
+        self.function = function
+        # Declared before the loop, and in the loop
+        self.outer_names = outer_names
+        self.inner_names = inner_names
+        self.source = source
+
+    def guard(self, table: Table) -> Optional[List[Variable]]:
+        # Variables read and written by the loop, None unless as compiled
+        variables = []
+        for name in self.outer_names:
+            variable, _ = table.get(name)
+            if variable.type is not VariableType.INT:
+                return None
+            variables.append(variable)
+        for name in self.inner_names:
+            variable, _ = table.get(name)
+            if not variable.is_undefined:
+                return None
+        return variables
+
+    def __call__(self, variables: List[Variable], write: Callable[[str], Any]) -> None:
+        # Condition was true, runs the body first
+        self.function(variables, write)
+
+
+class LoopSpecializer:
+    '''
+    Translate a while loop into the source of a Python function, where every
+    variable is a Python local, when every variable it reads or writes holds
+    an int, given the variables of the table. Values are read from the
+    variables before the loop, and written back after it, even on error.
+    '''
+    def __call__(self, node: Node, table: Table) -> Optional[SpecializedLoop]:
+        names = identifier_names(node)
+        outer_names = []
+        for name in sorted(names):
+            variable, _ = table.get(name)
+            if variable.is_undefined:
+                continue
+            elif variable.type is not VariableType.INT:
+                return None
+            outer_names.append(name)
+        inner_names = sorted(names.difference(outer_names))
+        self.lines: List[str] = []
+        self.resolver = Resolver()
+        for name in outer_names:
+            self.resolver.declare(name, int)
+        self.depth = 0
+        self.emit('def run_loop(variables, write):')
+        self.depth = 1
+        for index, name in enumerate(outer_names):
+            self.emit('{} = variables[{}].value'.format(local_name(name), index))
+        self.emit('try:')
+        self.depth = 2
+        self.emit('while True:')
+        try:
+            self.compile_suite(node.right)
+            self.depth = 3
+            self.emit('if not {}:'.format(self.compile_condition(node.left)))
+            self.depth = 4
+            self.emit('break')
+        except (NotSpecializable, RecursionError):
+            return None
+        self.depth = 1
+        self.emit('finally:')
+        self.depth = 2
+        for index, name in enumerate(outer_names):
+            self.emit('variables[{}].value = {}'.format(index, local_name(name)))
+        if len(outer_names) == 0:
+            self.emit('pass')
+        source = '\n'.join(self.lines) + '\n'
+        try:
+            code = compile(source, '<elang loop>', 'exec')
+        except (SyntaxError, RecursionError, MemoryError):
+            # Nested beyond the limits of the Python compiler
+            return None
+        namespace = dict()
+        exec(code, namespace)
+        return SpecializedLoop(namespace['run_loop'], outer_names, inner_names, source)
+
+    def emit(self, line: str) -> None:
+        self.lines.append(INDENT * self.depth + line)
+
+    def compile_suite(self, node: Optional[Node]) -> None:
+        self.depth += 1
+        count = len(self.lines)
+        self.compile_statement(node)
+        if len(self.lines) == count:
+            self.emit('pass')
+        self.depth -= 1
+
+    def compile_statement(self, node: Optional[Node]) -> None:
+        if node is None:
+            return
+        elif node.type is NodeType.STATEMENT_LIST:
+            for child in node.children:
+                self.compile_statement(child)
+        elif node.type is NodeType.SEQUENCE:
+            # Chain is linked backwards, from last statement to first
+            nodes = []
+            while node is not None and node.type is NodeType.SEQUENCE:
+                nodes.append(node.left)
+                node = node.right
+            nodes.append(node)
+            for child in reversed(nodes):
+                self.compile_statement(child)
+        elif node.type is NodeType.BLOCK:
+            self.resolver.enter()
+            self.compile_statement(node.left)
+            self.resolver.exit()
+        elif node.type is NodeType.ASSIGN:
+            if node.left.type is not NodeType.IDENTIFIER:
+                raise NotSpecializable()
+            name = node.left.value
+            source = self.compile_expression(node.right)
+            if self.resolver.resolve(name) is None:
+                self.resolver.declare(name, int)
+            self.emit('{} = {}'.format(local_name(name), source))
+        elif node.type is NodeType.IF:
+            self.emit('if {}:'.format(self.compile_condition(node.left)))
+            self.compile_suite(node.right.left)
+            if node.right.right is not None:
+                self.emit('else:')
+                self.compile_suite(node.right.right)
+        elif node.type is NodeType.WHILE:
+            self.emit('while {}:'.format(self.compile_condition(node.left)))
+            self.compile_suite(node.right)
+        elif node.type is NodeType.PRINT_CHARACTER:
+            self.emit('write(chr({}))'.format(self.compile_expression(node.left)))
+        elif node.type is NodeType.PRINT_STRING:
+            if node.constant is not None:
+                # Text printed, known when optimized
+                self.emit('write({!r})'.format(node.constant))
+            else:
+                self.emit('write({})'.format(self.compile_text(node.left)))
+        else:
+            raise NotSpecializable()
+
+    def compile_text(self, node: Optional[Node]) -> str:
+        # Printed text, every value evaluated before any is written
+        if node is None:
+            raise NotSpecializable()
+        elif node.type is NodeType.STR:
+            if node.value is None:
+                raise NotSpecializable()
+            return repr(unescape(node.value))
+        elif node.type is NodeType.ARRAY_LIST:
+            return "''.join([{}])".format(', '.join(
+                self.compile_text(child) for child in node.children))
+        return 'str({})'.format(self.compile_expression(node))
+
+    def compile_condition(self, node: Optional[Node]) -> str:
+        # Only truthiness matters
+        if node is not None and node.type in COMPARISON_OPERATORS:
+            return '{} {} {}'.format(
+                self.compile_expression(node.left),
+                COMPARISON_OPERATORS[node.type],
+                self.compile_expression(node.right))
+        return self.compile_expression(node)
+
+    def compile_expression(self, node: Optional[Node]) -> str:
+        # Every value is an int
+        if node is None:
+            raise NotSpecializable()
+        elif node.type is NodeType.INT:
+            return repr(int(node.value))
+        elif node.type is NodeType.IDENTIFIER:
+            if self.resolver.resolve(node.value) is None:
+                # Referenced before assignment
+                raise NotSpecializable()
+            return local_name(node.value)
+        elif node.type in ARITHMETIC_OPERATORS:
+            return '({} {} {})'.format(
+                self.compile_expression(node.left),
+                ARITHMETIC_OPERATORS[node.type],
+                self.compile_expression(node.right))
+        elif node.type in COMPARISON_OPERATORS:
+            return '(1 if {} else 0)'.format(self.compile_condition(node))
+        elif node.type in LOGICAL_OPERATORS:
+            return '({} {} {})'.format(
+                self.compile_expression(node.left),
+                LOGICAL_OPERATORS[node.type],
+                self.compile_expression(node.right))
+        elif node.type is NodeType.NOT:
+            return '(0 if {} else 1)'.format(self.compile_expression(node.left))
+        raise NotSpecializable()
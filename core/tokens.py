@@ -1,5 +1,12 @@
+import struct
+import sys
+
+from array import array
 from enum import Enum
-from typing import Any, Dict, Iterable, NamedTuple
+from typing import (
+    Any, BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple)
+
+from core.errors import TokenFileError
 
 
 class Token(NamedTuple):
@@ -14,6 +21,8 @@ class TokenType(Enum):
         value = len(cls.__members__) + 1
         obj = object.__new__(cls)
         obj._value_ = value
+        # Plain attribute, avoids enum property lookup on hot paths
+        obj.id = value
         obj.pattern = pattern
         obj.sequence = sequence
         return obj
@@ -105,3 +114,179 @@ def get_token_type_by_sequence(token_types: Iterable[TokenType]) -> Dict[str, To
     ])
 
 KEYWORDS_BY_SEQUENCE = get_token_type_by_sequence(KEYWORD_TOKEN_TYPES)
+
+TOKEN_TYPE_BY_ID = dict([
+    (token_type.id, token_type)
+    for token_type in TokenType
+])
+
+TOKEN_ID_BY_NAME = dict([
+    (token_type.name, token_type.id)
+    for token_type in TokenType
+])
+
+
+# Token as (id, row, column, value), where id is the TokenType id
+CompactToken = Tuple[int, int, int, Optional[str]]
+
+
+def as_compact_tokens(tokens: Iterable[Token]) -> Iterator[CompactToken]:
+    if isinstance(tokens, TokenStream):
+        return tokens.iter_compact()
+    return (
+        (TOKEN_ID_BY_NAME[token.name], token.row, token.column, token.value)
+        for token in tokens
+    )
+
+
+# Binary token file: magic, version, then length-prefixed sections
+TOKEN_FILE_MAGIC = b'ELTK'
+TOKEN_FILE_VERSION = 1
+TOKEN_FILE_HEADER = struct.Struct('<4sH')
+TOKEN_FILE_LENGTH = struct.Struct('<I')
+
+
+def read_exactly(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise TokenFileError('unexpected end of token file')
+    return data
+
+
+def read_length(file: BinaryIO) -> int:
+    return TOKEN_FILE_LENGTH.unpack(read_exactly(file, TOKEN_FILE_LENGTH.size))[0]
+
+
+# Typecode of the u32 columns, whichever is 4 bytes on this platform
+UINT32_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+
+
+def as_little_endian(column: array) -> bytes:
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def from_little_endian(typecode: str, data: bytes) -> array:
+    column = array(typecode)
+    try:
+        column.frombytes(data)
+    except ValueError:
+        # Not a whole number of items
+        raise TokenFileError('token file column is truncated')
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+class TokenStream:
+    '''
+    Columnar token storage: parallel arrays of token id, row and column,
+    and an index into a table of interned values (0 is no value).
+    '''
+    def __init__(self) -> None:
+        self.ids = array('B')
+        self.rows = array(UINT32_TYPECODE)
+        self.columns = array(UINT32_TYPECODE)
+        self.value_ids = array(UINT32_TYPECODE)
+        self.values: List[Optional[str]] = [None]
+        self.value_id_by_value: Dict[str, int] = dict()
+
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[Token]) -> 'TokenStream':
+        stream = cls()
+        for token in tokens:
+            stream.append(
+                TOKEN_ID_BY_NAME[token.name], token.row, token.column, token.value)
+        return stream
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        value_id = self.value_id_by_value.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.values.append(value)
+            self.value_id_by_value[value] = value_id
+        return value_id
+
+    def append(self, id: int, row: int, column: int, value: Optional[str]) -> None:
+        self.ids.append(id)
+        self.rows.append(row)
+        self.columns.append(column)
+        self.value_ids.append(self.intern(value))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, index: int) -> Token:
+        return Token(
+            row=self.rows[index],
+            column=self.columns[index],
+            name=TOKEN_TYPE_BY_ID[self.ids[index]].name,
+            value=self.values[self.value_ids[index]])
+
+    def __iter__(self) -> Iterator[Token]:
+        for id, row, column, value in self.iter_compact():
+            yield Token(
+                row=row,
+                column=column,
+                name=TOKEN_TYPE_BY_ID[id].name,
+                value=value)
+
+    def iter_compact(self) -> Iterator[CompactToken]:
+        return zip(
+            self.ids,
+            self.rows,
+            self.columns,
+            map(self.values.__getitem__, self.value_ids))
+
+    def dump(self, file: BinaryIO) -> None:
+        '''
+        Layout (little endian):
+            magic "ELTK", version u16,
+            value count u32, { length u32, utf-8 bytes },
+            then ids, rows, columns and value ids as length-prefixed arrays.
+        '''
+        file.write(TOKEN_FILE_HEADER.pack(TOKEN_FILE_MAGIC, TOKEN_FILE_VERSION))
+        file.write(TOKEN_FILE_LENGTH.pack(len(self.values) - 1))
+        for value in self.values[1:]:
+            data = value.encode('utf-8')
+            file.write(TOKEN_FILE_LENGTH.pack(len(data)))
+            file.write(data)
+        for column in [self.ids, self.rows, self.columns, self.value_ids]:
+            data = as_little_endian(column)
+            file.write(TOKEN_FILE_LENGTH.pack(len(data)))
+            file.write(data)
+
+    @classmethod
+    def load(cls, file: BinaryIO) -> 'TokenStream':
+        magic, version = TOKEN_FILE_HEADER.unpack(
+            read_exactly(file, TOKEN_FILE_HEADER.size))
+        if magic != TOKEN_FILE_MAGIC:
+            raise TokenFileError('not a binary token file')
+        if version != TOKEN_FILE_VERSION:
+            raise TokenFileError(
+                'unsupported token file version {}'.format(version))
+        stream = cls()
+        for _ in range(read_length(file)):
+            try:
+                value = read_exactly(file, read_length(file)).decode('utf-8')
+            except UnicodeDecodeError:
+                raise TokenFileError('token file value is not utf-8')
+            stream.values.append(value)
+        stream.value_id_by_value = dict(
+            (value, value_id)
+            for value_id, value in enumerate(stream.values)
+            if value_id > 0)
+        stream.ids, stream.rows, stream.columns, stream.value_ids = [
+            from_little_endian(column.typecode, read_exactly(file, read_length(file)))
+            for column in [stream.ids, stream.rows, stream.columns, stream.value_ids]
+        ]
+        size = len(stream.ids)
+        if not (size == len(stream.rows) == len(stream.columns) == len(stream.value_ids)):
+            raise TokenFileError('token file columns differ in length')
+        if stream.value_ids and max(stream.value_ids) >= len(stream.values):
+            raise TokenFileError('token file value out of range')
+        return stream
@@ -0,0 +1,432 @@
+import functools
+import sys
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from core.ast import Node, NodeType
+from core.cache import CodeCache
+from core.output import Output, print_str, print_value, unescape
+from core.resolver import Resolver, arithmetic_type, undefined_message
+from core.variables import (
+    VARIABLE_TYPE_BY_VALUE_TYPE, Table, Variable, VariableType)
+from core.vm import VirtualMachine
+from core.walker import as_map_key
+
+
+# Source of an expression, with the Python type of its value when known
+Expression = Tuple[str, Optional[type]]
+
+ARITHMETIC_OPERATORS = dict([
+    (NodeType.ADD, '+'),
+    (NodeType.SUBTRACT, '-'),
+    (NodeType.MULTIPLY, '*'),
+    (NodeType.DIVIDE, '//'),
+    (NodeType.MOD, '%'),
+])
+
+COMPARISON_OPERATORS = dict([
+    (NodeType.EQUAL, '=='),
+    (NodeType.NOT_EQUAL, '!='),
+    (NodeType.LESS_THAN, '<'),
+    (NodeType.LESS_THAN_OR_EQUAL, '<='),
+    (NodeType.GREATER_THAN, '>'),
+    (NodeType.GREATER_THAN_OR_EQUAL, '>='),
+])
+
+# Right operand only evaluated when the left does not decide the result
+LOGICAL_OPERATORS = dict([
+    (NodeType.AND, 'and'),
+    (NodeType.OR, 'or'),
+])
+
+INDENT = '    '
+
+
+def undefined(name: str) -> None:
+    raise Exception('variable {} referenced before assignment'.format(name))
+
+
+def fail(message: str, *values: Any) -> None:
+    # Values are the operands evaluated before the error, like the walker
+    raise Exception(message)
+
+
+def expect_type(name: str, value: Any, variable_type: VariableType) -> Any:
+    if VARIABLE_TYPE_BY_VALUE_TYPE.get(type(value)) is not variable_type:
+        raise Exception(
+            'variable type mismatch - {} is not of type {}'.format(name, variable_type))
+    return value
+
+
+def same_type(old_value: Any, new_value: Any) -> Any:
+    if type(new_value) is not type(old_value):
+        raise Exception('variable type mismatch')
+    return new_value
+
+
+def assertion_failed(debug_message: str, flush: Callable[[], None]) -> None:
+    # Program output first
+    flush()
+    print(debug_message, file=sys.stderr)
+    raise AssertionError('assertion failed')
+
+
+# Globals of the generated program, except those bound to the output of a run
+HELPERS = dict([
+    ('undefined', undefined),
+    ('fail', fail),
+    ('expect_type', expect_type),
+    ('same_type', same_type),
+    ('as_map_key', as_map_key),
+    ('VariableType', VariableType),
+])
+
+
+class Declaration(NamedTuple):
+    python_name: str
+    type: Optional[type]
+
+
+def local_name(name: str, depth: int) -> str:
+    if name.endswith('#'):
+        # Never ends with a digit, unlike identifiers
+        return '{}_{}_map'.format(name[:-1], depth)
+    return '{}_{}'.format(name, depth)
+
+
+class Transpiler:
+    '''
+    Translate a tree into the source of a Python function `program(scope)`,
+    which returns the variables of the global scope.
+
+    Every variable is a Python local, named after its identifier and the
+    depth of its block, as resolved by the resolver.
+    '''
+    def __call__(
+        self,
+        node: Optional[Node],
+        variables: Optional[Dict[str, Variable]] = None,
+    ) -> str:
+        self.lines: List[str] = []
+        self.resolver = Resolver(variables)
+        self.depth = 0
+        self.emit('def program(scope):')
+        self.depth = 1
+        # Variables of earlier runs, eg. previous top-level statements
+        for name in self.resolver.global_names():
+            self.emit('{} = scope[{!r}].value'.format(local_name(name, 0), name))
+        self.compile_statement(node)
+        self.emit('return {{{}}}'.format(', '.join(
+            '{!r}: {}'.format(name, local_name(name, 0))
+            for name in self.resolver.global_names())))
+        return '\n'.join(self.lines) + '\n'
+
+    def emit(self, line: str) -> None:
+        self.lines.append(INDENT * self.depth + line)
+
+    def resolve(self, name: str) -> Optional[Declaration]:
+        slot = self.resolver.resolve(name)
+        if slot is None:
+            return None
+        return Declaration(local_name(name, slot.depth), slot.type)
+
+    def declare(self, name: str, value_type: Optional[type]) -> Declaration:
+        slot = self.resolver.declare(name, value_type)
+        return Declaration(local_name(name, slot.depth), value_type)
+
+    def compile_suite(self, node: Optional[Node]) -> None:
+        # Body of if, else and while
+        self.depth += 1
+        count = len(self.lines)
+        self.compile_statement(node)
+        if len(self.lines) == count:
+            self.emit('pass')
+        self.depth -= 1
+
+    def compile_statement(self, node: Optional[Node]) -> None:
+        if node is None:
+            return
+        elif node.type is NodeType.STATEMENT_LIST:
+            for child in node.children:
+                self.compile_statement(child)
+        elif node.type is NodeType.SEQUENCE:
+            # Chain is linked backwards, from last statement to first
+            nodes = []
+            while node is not None and node.type is NodeType.SEQUENCE:
+                nodes.append(node.left)
+                node = node.right
+            nodes.append(node)
+            for child in reversed(nodes):
+                self.compile_statement(child)
+        elif node.type is NodeType.BLOCK:
+            self.resolver.enter()
+            self.compile_statement(node.left)
+            self.resolver.exit()
+        elif node.type is NodeType.ASSIGN:
+            self.compile_assign(node)
+        elif node.type is NodeType.IF:
+            self.emit('if {}:'.format(self.compile_condition(node.left)))
+            self.compile_suite(node.right.left)
+            if node.right.right is not None:
+                self.emit('else:')
+                self.compile_suite(node.right.right)
+        elif node.type is NodeType.WHILE:
+            self.emit('while {}:'.format(self.compile_condition(node.left)))
+            self.compile_suite(node.right)
+        elif node.type is NodeType.PRINT_CHARACTER:
+            source, _ = self.compile_expression(node.left)
+            self.emit('write(chr({}))'.format(source))
+        elif node.type is NodeType.PRINT_STRING:
+            self.compile_print(node.left)
+        elif node.type is NodeType.ASSERT:
+            source, _ = self.compile_expression(node.left)
+            self.emit('if not {}:'.format(source))
+            self.depth += 1
+            self.emit('assertion_failed({!r})'.format(
+                'assertion failed - node {}'.format(node.left.type.name)))
+            self.depth -= 1
+        else:
+            # Expression as statement, value is unused
+            source, _ = self.compile_expression(node)
+            self.emit(source)
+
+    def compile_print(self, node: Node) -> None:
+        if node is not None and node.type is NodeType.STR:
+            # Escapes are replaced once, here
+            self.emit('write({!r})'.format(unescape(node.value)))
+            return
+        source, value_type = self.compile_expression(node)
+        if value_type is int:
+            self.emit('write(str({}))'.format(source))
+        elif value_type is str:
+            self.emit('print_str({})'.format(source))
+        else:
+            self.emit('print_value({})'.format(source))
+
+    def compile_condition(self, node: Node) -> str:
+        # Only truthiness matters, an indexed identifier is its item
+        if node.type in COMPARISON_OPERATORS:
+            left, _ = self.compile_expression(node.left)
+            right, _ = self.compile_expression(node.right)
+            return '{} {} {}'.format(left, COMPARISON_OPERATORS[node.type], right)
+        elif node.type is NodeType.AND:
+            return '({}) and ({})'.format(
+                self.compile_condition(node.left), self.compile_condition(node.right))
+        source, _ = self.compile_expression(node)
+        return source
+
+    def compile_assign(self, node: Node) -> None:
+        target = node.left
+        if target.type is NodeType.IDENTIFIER:
+            self.compile_assign_identifier(target.value, node.right)
+        elif target.type is NodeType.IDENTIFIER_ARRAY:
+            self.compile_assign_array(target, node.right)
+        elif target.type is NodeType.IDENTIFIER_MAP:
+            self.compile_assign_map(target, node.right)
+        else:
+            self.emit('fail({!r})'.format('cannot assign to unknown type'))
+
+    def compile_assign_identifier(self, name: str, expression: Node) -> None:
+        declaration = self.resolve(name)
+        if (
+            declaration is not None and
+            declaration.type is int and
+            expression.type in (NodeType.ADD, NodeType.SUBTRACT) and
+            expression.left.type is NodeType.IDENTIFIER and
+            expression.left.value == name and
+            expression.right.type is NodeType.INT
+        ):
+            # x = + x 1
+            self.emit('{} {}= {}'.format(
+                declaration.python_name,
+                ARITHMETIC_OPERATORS[expression.type],
+                int(expression.right.value)))
+            return
+        source, value_type = self.compile_expression(expression)
+        if declaration is None:
+            declaration = self.declare(name, value_type)
+        elif value_type is None or value_type is not declaration.type:
+            # Type of the variable is fixed by its first assignment
+            source = 'same_type({}, {})'.format(declaration.python_name, source)
+        self.emit('{} = {}'.format(declaration.python_name, source))
+
+    def compile_array(self, node: Node) -> Optional[Tuple[str, List[Node]]]:
+        # Source of the array in `name @ index @ ...`, and the index expressions
+        indices = []
+        while node.type is NodeType.IDENTIFIER_ARRAY:
+            indices.append(node.right)
+            node = node.left
+        if node.type is not NodeType.IDENTIFIER:
+            return None
+        indices.reverse()
+        name = node.value
+        declaration = self.resolve(name)
+        if declaration is None:
+            return 'fail({!r})'.format(undefined_message(name)), indices
+        elif declaration.type is list:
+            return declaration.python_name, indices
+        return 'expect_type({!r}, {}, VariableType.ARRAY)'.format(
+            name, declaration.python_name), indices
+
+    def compile_assign_array(self, target: Node, expression: Node) -> None:
+        source, _ = self.compile_expression(expression)
+        compiled = self.compile_array(target)
+        if compiled is None:
+            self.emit('fail({!r}, {})'.format(
+                'identifier array missing identifier', source))
+            return
+        array, indices = compiled
+        self.emit('{}{} = {}'.format(array, ''.join(
+            '[{}]'.format(self.compile_expression(index)[0])
+            for index in indices), source))
+
+    def compile_map_key(self, node: Node) -> str:
+        source, value_type = self.compile_expression(node)
+        if value_type is int or value_type is str:
+            return source
+        return 'as_map_key({})'.format(source)
+
+    def compile_assign_map(self, target: Node, expression: Node) -> None:
+        source, _ = self.compile_expression(expression)
+        if target.left.type is not NodeType.IDENTIFIER:
+            self.emit('fail({!r}, {})'.format(
+                'identifier map missing identifier', source))
+            return
+        name = target.left.value
+        key = self.compile_map_key(target.right)
+        if self.resolve(name) is None:
+            # Default value must be assigned first
+            self.emit('fail({!r}, {}, {})'.format(undefined_message(name), source, key))
+            return
+        map_declaration = self.resolve(name + '#')
+        if map_declaration is None:
+            map_declaration = self.declare(name + '#', dict)
+            self.emit('{} = {{}}'.format(map_declaration.python_name))
+        self.emit('{}[{}] = {}'.format(map_declaration.python_name, key, source))
+
+    def compile_expression(self, node: Optional[Node]) -> Expression:
+        if node is None:
+            return 'None', None
+        elif node.type is NodeType.INT:
+            return repr(int(node.value)), int
+        elif node.type is NodeType.STR:
+            return repr(node.value), str
+        elif node.type is NodeType.IDENTIFIER:
+            declaration = self.resolve(node.value)
+            if declaration is None:
+                return 'undefined({!r})'.format(node.value), None
+            return declaration
+        elif node.type in ARITHMETIC_OPERATORS:
+            left, left_type = self.compile_expression(node.left)
+            right, right_type = self.compile_expression(node.right)
+            return '({} {} {})'.format(
+                left, ARITHMETIC_OPERATORS[node.type], right), arithmetic_type(
+                    node.type, left_type, right_type)
+        elif node.type in COMPARISON_OPERATORS:
+            return '(1 if {} else 0)'.format(self.compile_condition(node)), int
+        elif node.type in LOGICAL_OPERATORS:
+            left, left_type = self.compile_expression(node.left)
+            right, right_type = self.compile_expression(node.right)
+            value_type = left_type if left_type is right_type else None
+            return '({} {} {})'.format(
+                left, LOGICAL_OPERATORS[node.type], right), value_type
+        elif node.type is NodeType.NOT:
+            source, _ = self.compile_expression(node.left)
+            return '(0 if {} else 1)'.format(source), int
+        elif node.type is NodeType.ARRAY_LIST:
+            if node.constant is not None:
+                # A list display builds a new list every time
+                return repr(node.constant), list
+            return '[{}]'.format(', '.join(
+                self.compile_expression(child)[0]
+                for child in node.children)), list
+        elif node.type is NodeType.ARRAY:
+            # Chain is linked backwards, from last item to first
+            items = []
+            while node is not None and node.type is NodeType.ARRAY:
+                items.append(self.compile_expression(node.left)[0])
+                node = node.right
+            return '[{}]'.format(', '.join(reversed(items))), list
+        elif node.type is NodeType.IDENTIFIER_ARRAY:
+            compiled = self.compile_array(node)
+            if compiled is None:
+                return 'fail({!r})'.format('identifier array missing identifier'), None
+            array, indices = compiled
+            return array + ''.join(
+                '[{}]'.format(self.compile_expression(index)[0])
+                for index in indices), None
+        elif node.type is NodeType.IDENTIFIER_MAP:
+            if node.left.type is not NodeType.IDENTIFIER:
+                return 'fail({!r})'.format('identifier map missing identifier'), None
+            name = node.left.value
+            key = self.compile_map_key(node.right)
+            declaration = self.resolve(name)
+            map_declaration = self.resolve(name + '#')
+            if declaration is None:
+                return 'fail({!r}, {})'.format(undefined_message(name), key), None
+            elif map_declaration is None:
+                return 'fail({!r}, {})'.format(undefined_message(name + '#'), key), None
+            return '{}.get({}, {})'.format(
+                map_declaration.python_name, key, declaration.python_name), None
+        return 'fail({!r})'.format(
+            'unknown node type - node {}'.format(node.type.name)), None
+
+
+@functools.lru_cache(maxsize=64)
+def compile_program(source: str) -> Any:
+    return compile(source, '<elang>', 'exec')
+
+
+class PythonEngine:
+    '''
+    Transpile a tree into Python source, compile it and run it, so programs
+    run as CPython bytecode. The global scope of the table is read before
+    and written after the run.
+    '''
+    def __init__(
+        self,
+        table: Optional[Table] = None,
+        code_cache: Optional[CodeCache] = None,
+        output: Optional[Output] = None,
+    ) -> None:
+        self.table = Table() if table is None else table
+        self.code_cache = code_cache
+        self.output = Output() if output is None else output
+        self.transpiler = Transpiler()
+
+    def __call__(self, node: Node) -> None:
+        global_scope = self.table.scope_stack[self.table.scope_global]
+        try:
+            source = self.transpiler(node, global_scope)
+            code = self.compile(source)
+        except (SyntaxError, RecursionError, MemoryError):
+            # Nested beyond the limits of the Python compiler
+            VirtualMachine(self.table, self.output)(node)
+            return
+        write = self.output.write
+        namespace = dict(HELPERS)
+        namespace['write'] = write
+        namespace['print_str'] = functools.partial(print_str, write=write)
+        namespace['print_value'] = functools.partial(print_value, write=write)
+        namespace['assertion_failed'] = functools.partial(
+            assertion_failed, flush=self.output.flush)
+        exec(code, namespace)
+        try:
+            variables = namespace['program'](global_scope)
+        finally:
+            self.output.flush()
+        for name, value in variables.items():
+            if name in global_scope:
+                global_scope[name].value = value
+            else:
+                global_scope[name] = Variable(
+                    name, VARIABLE_TYPE_BY_VALUE_TYPE[type(value)], value)
+
+    def compile(self, source: str) -> Any:
+        if self.code_cache is None:
+            return compile_program(source)
+        source_bytes = source.encode('utf-8')
+        code = self.code_cache.get(source_bytes)
+        if code is None:
+            code = compile_program(source)
+            self.code_cache.set(source_bytes, code)
+        return code
@@ -11,6 +11,14 @@ VariableType = Enum('VariableType', [
 ])
 
 
+VARIABLE_TYPE_BY_VALUE_TYPE = dict([
+    (int, VariableType.INT),
+    (str, VariableType.STR),
+    (list, VariableType.ARRAY),
+    (dict, VariableType.MAP),
+])
+
+
 class Variable:
     def __init__(
         self,
@@ -0,0 +1,264 @@
+import sys
+from typing import List, Optional
+
+from core.ast import Node
+from core.bytecode import BytecodeCompiler, Code, Opcode
+from core.output import Output, print_value
+from core.resolver import global_frame, store_global_frame
+from core.variables import Table, VariableType
+from core.walker import as_map_key, copy_array
+
+
+# Plain integers, compared in the dispatch loop
+LOAD_CONST = int(Opcode.LOAD_CONST)
+LOAD_CONST_ARRAY = int(Opcode.LOAD_CONST_ARRAY)
+LOAD_SLOT = int(Opcode.LOAD_SLOT)
+STORE_SLOT = int(Opcode.STORE_SLOT)
+STORE_SLOT_CHECKED = int(Opcode.STORE_SLOT_CHECKED)
+POP = int(Opcode.POP)
+BUILD_ARRAY = int(Opcode.BUILD_ARRAY)
+LOAD_ARRAY = int(Opcode.LOAD_ARRAY)
+LOAD_INDEX = int(Opcode.LOAD_INDEX)
+STORE_INDEX = int(Opcode.STORE_INDEX)
+LOAD_MAP = int(Opcode.LOAD_MAP)
+STORE_MAP = int(Opcode.STORE_MAP)
+BUILD_MAP = int(Opcode.BUILD_MAP)
+ADD = int(Opcode.ADD)
+SUBTRACT = int(Opcode.SUBTRACT)
+MULTIPLY = int(Opcode.MULTIPLY)
+DIVIDE = int(Opcode.DIVIDE)
+MOD = int(Opcode.MOD)
+EQUAL = int(Opcode.EQUAL)
+NOT_EQUAL = int(Opcode.NOT_EQUAL)
+LESS_THAN = int(Opcode.LESS_THAN)
+LESS_THAN_OR_EQUAL = int(Opcode.LESS_THAN_OR_EQUAL)
+GREATER_THAN = int(Opcode.GREATER_THAN)
+GREATER_THAN_OR_EQUAL = int(Opcode.GREATER_THAN_OR_EQUAL)
+NOT = int(Opcode.NOT)
+JUMP = int(Opcode.JUMP)
+POP_JUMP_IF_FALSE = int(Opcode.POP_JUMP_IF_FALSE)
+SCOPE_ENTER = int(Opcode.SCOPE_ENTER)
+SCOPE_EXIT = int(Opcode.SCOPE_EXIT)
+JUMP_IF_FALSE_OR_POP = int(Opcode.JUMP_IF_FALSE_OR_POP)
+JUMP_IF_TRUE_OR_POP = int(Opcode.JUMP_IF_TRUE_OR_POP)
+JUMP_IF_NOT_EQUAL = int(Opcode.JUMP_IF_NOT_EQUAL)
+JUMP_IF_NOT_NOT_EQUAL = int(Opcode.JUMP_IF_NOT_NOT_EQUAL)
+JUMP_IF_NOT_LESS_THAN = int(Opcode.JUMP_IF_NOT_LESS_THAN)
+JUMP_IF_NOT_LESS_THAN_OR_EQUAL = int(Opcode.JUMP_IF_NOT_LESS_THAN_OR_EQUAL)
+JUMP_IF_NOT_GREATER_THAN = int(Opcode.JUMP_IF_NOT_GREATER_THAN)
+JUMP_IF_NOT_GREATER_THAN_OR_EQUAL = int(Opcode.JUMP_IF_NOT_GREATER_THAN_OR_EQUAL)
+LOAD_SLOT_SLOT = int(Opcode.LOAD_SLOT_SLOT)
+LOAD_SLOT_CONST = int(Opcode.LOAD_SLOT_CONST)
+INCREMENT_SLOT = int(Opcode.INCREMENT_SLOT)
+PRINT_CHARACTER = int(Opcode.PRINT_CHARACTER)
+PRINT_VALUE = int(Opcode.PRINT_VALUE)
+ASSERT = int(Opcode.ASSERT)
+FAIL = int(Opcode.FAIL)
+
+
+class VirtualMachine:
+    '''
+    Compile a tree into bytecode, then run it in a single dispatch loop over
+    a value stack. Like the closure engine, indexed identifiers are always
+    evaluated to their value.
+
+    Variables live in list frames, one per block declaring any, at slots
+    resolved when compiled. The global frame is read from and written back to
+    the table.
+    '''
+    def __init__(
+        self,
+        table: Optional[Table] = None,
+        output: Optional[Output] = None,
+    ) -> None:
+        self.table = Table() if table is None else table
+        self.output = Output() if output is None else output
+        self.compiler = BytecodeCompiler()
+
+    def __call__(self, node: Node) -> None:
+        global_scope = self.table.scope_stack[self.table.scope_global]
+        self.run(self.compiler(node, global_scope))
+
+    def run(self, code: Code) -> None:
+        global_scope = self.table.scope_stack[self.table.scope_global]
+        frames = [global_frame(code.preset_names, code.global_names, global_scope)]
+        try:
+            self.dispatch(code, frames)
+        finally:
+            self.output.flush()
+            store_global_frame(code.global_names, frames[0], global_scope)
+
+    def dispatch(self, code: Code, frames: List[list]) -> None:
+        # Lists index faster than arrays
+        instructions = code.instructions.tolist()
+        constants = code.constants
+        slots = code.slots
+        write = self.output.write
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        end = len(instructions)
+        pc = 0
+        while pc < end:
+            opcode = instructions[pc]
+            a = instructions[pc + 1]
+            pc += 3
+            # Most frequent first
+            if opcode == LOAD_SLOT_SLOT:
+                depth, index = slots[a]
+                push(frames[depth][index])
+                depth, index = slots[instructions[pc - 1]]
+                push(frames[depth][index])
+            elif opcode == LOAD_SLOT_CONST:
+                depth, index = slots[a]
+                push(frames[depth][index])
+                push(constants[instructions[pc - 1]])
+            elif opcode == LOAD_SLOT:
+                depth, index = slots[a]
+                push(frames[depth][index])
+            elif opcode == LOAD_CONST:
+                push(constants[a])
+            elif opcode == STORE_SLOT:
+                depth, index = slots[a]
+                frames[depth][index] = pop()
+            elif opcode == STORE_SLOT_CHECKED:
+                value = pop()
+                depth, index = slots[a]
+                frame = frames[depth]
+                if type(value) is not type(frame[index]):
+                    raise Exception('variable type mismatch')
+                frame[index] = value
+            elif opcode == INCREMENT_SLOT:
+                depth, index = slots[a]
+                frames[depth][index] += constants[instructions[pc - 1]]
+            elif opcode == SCOPE_ENTER:
+                # Frame is sized to the variables the block declares
+                frames.append([None] * a)
+            elif opcode == SCOPE_EXIT:
+                frames.pop()
+            elif opcode == JUMP:
+                pc = a
+            elif opcode == JUMP_IF_NOT_LESS_THAN:
+                right = pop()
+                if not pop() < right:
+                    pc = a
+            elif opcode == JUMP_IF_NOT_LESS_THAN_OR_EQUAL:
+                right = pop()
+                if not pop() <= right:
+                    pc = a
+            elif opcode == JUMP_IF_NOT_GREATER_THAN:
+                right = pop()
+                if not pop() > right:
+                    pc = a
+            elif opcode == JUMP_IF_NOT_GREATER_THAN_OR_EQUAL:
+                right = pop()
+                if not pop() >= right:
+                    pc = a
+            elif opcode == JUMP_IF_NOT_EQUAL:
+                right = pop()
+                if not pop() == right:
+                    pc = a
+            elif opcode == JUMP_IF_NOT_NOT_EQUAL:
+                right = pop()
+                if not pop() != right:
+                    pc = a
+            elif opcode == POP_JUMP_IF_FALSE:
+                if not pop():
+                    pc = a
+            elif opcode == ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+            elif opcode == SUBTRACT:
+                right = pop()
+                stack[-1] = stack[-1] - right
+            elif opcode == MULTIPLY:
+                right = pop()
+                stack[-1] = stack[-1] * right
+            elif opcode == DIVIDE:
+                right = pop()
+                stack[-1] = stack[-1] // right
+            elif opcode == MOD:
+                right = pop()
+                stack[-1] = stack[-1] % right
+            elif opcode == LESS_THAN:
+                right = pop()
+                stack[-1] = 1 if stack[-1] < right else 0
+            elif opcode == LESS_THAN_OR_EQUAL:
+                right = pop()
+                stack[-1] = 1 if stack[-1] <= right else 0
+            elif opcode == GREATER_THAN:
+                right = pop()
+                stack[-1] = 1 if stack[-1] > right else 0
+            elif opcode == GREATER_THAN_OR_EQUAL:
+                right = pop()
+                stack[-1] = 1 if stack[-1] >= right else 0
+            elif opcode == EQUAL:
+                right = pop()
+                stack[-1] = 1 if stack[-1] == right else 0
+            elif opcode == NOT_EQUAL:
+                right = pop()
+                stack[-1] = 1 if stack[-1] != right else 0
+            elif opcode == JUMP_IF_FALSE_OR_POP:
+                if stack[-1]:
+                    pop()
+                else:
+                    pc = a
+            elif opcode == JUMP_IF_TRUE_OR_POP:
+                if stack[-1]:
+                    pc = a
+                else:
+                    pop()
+            elif opcode == NOT:
+                stack[-1] = 0 if stack[-1] else 1
+            elif opcode == LOAD_ARRAY:
+                depth, index = slots[a]
+                value = frames[depth][index]
+                if type(value) is not list:
+                    raise Exception(
+                        'variable type mismatch - {} is not of type {}'.format(
+                            code.names[a], VariableType.ARRAY))
+                push(value)
+            elif opcode == LOAD_INDEX:
+                index = pop()
+                stack[-1] = stack[-1][index]
+            elif opcode == STORE_INDEX:
+                index = pop()
+                item = pop()
+                item[index] = pop()
+            elif opcode == PRINT_CHARACTER:
+                write(chr(pop()))
+            elif opcode == PRINT_VALUE:
+                print_value(pop(), write)
+            elif opcode == LOAD_CONST_ARRAY:
+                push(copy_array(constants[a]))
+            elif opcode == BUILD_ARRAY:
+                if a:
+                    items = stack[-a:]
+                    del stack[-a:]
+                else:
+                    items = []
+                push(items)
+            elif opcode == LOAD_MAP:
+                map_key = as_map_key(pop())
+                depth, index = slots[a]
+                default_value = frames[depth][index]
+                depth, index = slots[instructions[pc - 1]]
+                push(frames[depth][index].get(map_key, default_value))
+            elif opcode == STORE_MAP:
+                map_key = as_map_key(pop())
+                depth, index = slots[a]
+                frames[depth][index][map_key] = pop()
+            elif opcode == BUILD_MAP:
+                push(dict())
+            elif opcode == POP:
+                pop()
+            elif opcode == ASSERT:
+                if not pop():
+                    # Program output first
+                    self.output.flush()
+                    print(constants[a], file=sys.stderr)
+                    raise AssertionError('assertion failed')
+            elif opcode == FAIL:
+                raise Exception(constants[a])
+            else:
+                raise Exception('unknown opcode - {}'.format(opcode))
@@ -1,39 +1,24 @@
 import sys
-from typing import Any, List, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
 
 from core.ast import Node, NodeType
+from core.operators import BINARY_OPERATORS, LOGICAL_NODE_TYPES, UNARY_OPERATORS
+from core.output import Output, unescape
+from core.specializer import HOT_LOOP_ITERATIONS, LoopSpecializer, SpecializedLoop
+from core.inference import InferredTypes, infer_types
 from core.variables import Table, Variable, VariableType
 
+if TYPE_CHECKING:
+    # Only annotations, the walker runs without it
+    from core.profiler import Profiler
 
-def as_int(value: Union[int, bool]) -> int:
-    return 1 if value else 0
 
-
-BINARY_OPERATORS = dict([
-    # Returns integer
-    (NodeType.ADD, lambda a, b: a + b),
-    (NodeType.SUBTRACT, lambda a, b: a - b),
-    (NodeType.MULTIPLY, lambda a, b: a * b),
-    (NodeType.DIVIDE, lambda a, b: a // b),
-    (NodeType.MOD, lambda a, b: a % b),
-
-    # Returns 1 or 0
-    (NodeType.EQUAL, lambda a, b: as_int(a == b)),
-    (NodeType.NOT_EQUAL, lambda a, b: as_int(a != b)),
-    (NodeType.LESS_THAN, lambda a, b: as_int(a < b)),
-    (NodeType.LESS_THAN_OR_EQUAL, lambda a, b: as_int(a <= b)),
-    (NodeType.GREATER_THAN, lambda a, b: as_int(a > b)),
-    (NodeType.GREATER_THAN_OR_EQUAL, lambda a, b: as_int(a >= b)),
-
-    # Binary, but does not necessarily return int
-    (NodeType.AND, lambda a, b: a and b),
-    (NodeType.OR, lambda a, b: a or b),
-])
-
-
-UNARY_OPERATORS = dict([
-    (NodeType.NOT, lambda x: 0 if x else 1)
-])
+def copy_array(array: list) -> list:
+    # Arrays are mutable, every evaluation of a literal gets its own copy
+    return [
+        copy_array(item) if type(item) is list else item
+        for item in array
+    ]
 
 
 def expect_variable(
@@ -51,6 +36,19 @@ def expect_variable(
     return variable
 
 
+def as_map_key(key: Union[int, str, list]) -> Union[int, str, tuple]:
+    # Convert to hashable
+    if isinstance(key, (List, Tuple)):
+        if len(key) == 1:
+            return key[0]
+        else:
+            return tuple(key)
+    elif type(key) is int or type(key) is str:
+        return key
+    else:
+        raise Exception('unknown identifier map key type')
+
+
 class IdentifierOperator:
     def __repr__(self) -> str:
         return '<{class_name} {identifier}>'.format(
@@ -81,16 +79,7 @@ class IdentifierArray(IdentifierOperator):
 class IdentifierMap(IdentifierOperator):
     def __init__(self, identifier: str, key: Union[int, str, list]) -> None:
         self.identifier = identifier
-        # Convert to hashable
-        if isinstance(key, (List, Tuple)):
-            if len(key) == 1:
-                self.key = key[0]
-            else:
-                self.key = tuple(key)
-        elif type(key) is int or type(key) is str:
-            self.key = key
-        else:
-            raise Exception('unknown identifier map key type')
+        self.key = as_map_key(key)
     
     @property
     def name(self):
@@ -106,29 +95,121 @@ class IdentifierMap(IdentifierOperator):
         return default_variable.value
 
     def set(self, table: Table, value: Union[int, str, list]) -> None:
-        default_variable = expect_variable(table, self.identifier)
-        if default_variable.is_undefined:
-            # Infer default value from type
-            if type(value) is int:
-                table.set(Variable(self.identifier, VariableType.INT, 0))
-            elif type(value) is str:
-                table.set(Variable(self.identifier, VariableType.STR, str()))
-            elif type(value) is list:
-                table.set(Variable(self.identifier, VariableType.ARRAY, list()))
-            else:
-                raise Exception('unknown type of identifier key')
-        map_variable, _ = table.get(self.name)
-        if map_variable.is_undefined:
-            map_variable = Variable(self.name, VariableType.MAP, dict())
-            table.set(map_variable)
-        map_variable.value[self.key] = value
+        set_map_item(table, self.identifier, self.name, self.key, value)
+
+
+def set_map_item(
+    table: Table,
+    identifier: str,
+    name: str,
+    key: Union[int, str, tuple],
+    value: Union[int, str, list],
+) -> None:
+    default_variable = expect_variable(table, identifier)
+    if default_variable.is_undefined:
+        # Infer default value from type
+        if type(value) is int:
+            table.set(Variable(identifier, VariableType.INT, 0))
+        elif type(value) is str:
+            table.set(Variable(identifier, VariableType.STR, str()))
+        elif type(value) is list:
+            table.set(Variable(identifier, VariableType.ARRAY, list()))
+        else:
+            raise Exception('unknown type of identifier key')
+    map_variable, _ = table.get(name)
+    if map_variable.is_undefined:
+        map_variable = Variable(name, VariableType.MAP, dict())
+        table.set(map_variable)
+    map_variable.value[key] = value
+
+
+def array_identifier(node: Node) -> Tuple[str, int]:
+    # Name and number of indices of a chain like `a @ 1 @ 0`
+    count = 0
+    while node.type is NodeType.IDENTIFIER_ARRAY:
+        node = node.left
+        count += 1
+    if node.type is not NodeType.IDENTIFIER:
+        raise Exception('identifier array missing identifier')
+    return node.value, count
 
 
 class Walker:
-    def __init__(self):
+    '''
+    Walk the tree with an explicit stack instead of recursion, so the depth
+    of a program is only limited by memory, and a walk can be suspended
+    between any two steps.
+    '''
+    def __init__(
+        self,
+        output: Optional[Output] = None,
+        hot_loop_iterations: Optional[int] = HOT_LOOP_ITERATIONS,
+        profiler: Optional['Profiler'] = None,
+    ):
         self.table = Table()
+        self.output = Output() if output is None else output
+        # Loops run this often are compiled to Python, never when None
+        self.hot_loop_iterations = hot_loop_iterations
+        self.specializer = LoopSpecializer()
+        # Iterations of every while loop, and its compiled function if any,
+        # by id of the while node
+        self.loop_counts: Dict[int, int] = dict()
+        self.specialized_loops: Dict[int, Optional[SpecializedLoop]] = dict()
+        # While node of the compiled loop running, if any
+        self.running_loop: Optional[Node] = None
+        # Variables declared by every block, by id of the block node
+        self.frame_sizes = dict()
+        # Checks proven unnecessary before running, inferred on every call
+        # unless disabled, eg. for statements run one by one
+        self.infer = True
+        self.types = InferredTypes()
+        # Name of the map variable, by name of its default variable
+        self.map_names: Dict[str, str] = dict()
+        # Continuations still to run, and values of evaluated nodes
+        self.tasks: List[Tuple[Callable[[Any], None], Any]] = []
+        self.values: List[Any] = []
+        self.evaluate_by_type = dict([
+            (NodeType.STATEMENT_LIST, self.evaluate_statement_list),
+            (NodeType.SEQUENCE, self.evaluate_sequence),
+            (NodeType.BLOCK, self.evaluate_block),
+            (NodeType.STR, self.evaluate_str),
+            (NodeType.INT, self.evaluate_int),
+            (NodeType.ARRAY_LIST, self.evaluate_array_list),
+            (NodeType.ARRAY, self.evaluate_array),
+            (NodeType.IDENTIFIER, self.evaluate_identifier),
+            (NodeType.IDENTIFIER_ARRAY, self.evaluate_identifier_array),
+            (NodeType.IDENTIFIER_MAP, self.evaluate_identifier_map),
+            (NodeType.ASSIGN, self.evaluate_assign),
+            (NodeType.IF, self.evaluate_if),
+            (NodeType.WHILE, self.evaluate_while),
+            (NodeType.PRINT_CHARACTER, self.evaluate_print_character),
+            (NodeType.PRINT_STRING, self.evaluate_print_string),
+            (NodeType.ASSERT, self.evaluate_assert),
+        ])
+        for node_type in BINARY_OPERATORS:
+            self.evaluate_by_type[node_type] = self.evaluate_binary
+        for node_type in UNARY_OPERATORS:
+            self.evaluate_by_type[node_type] = self.evaluate_unary
+        for node_type in LOGICAL_NODE_TYPES:
+            self.evaluate_by_type[node_type] = self.evaluate_logical
+        self.profiler = profiler
+        if profiler is not None:
+            # Swapped in only when profiling, no cost otherwise
+            self.evaluate = self.evaluate_profiled
+            self.evaluate_value = self.evaluate_value_profiled
+            # Compiled loops would run as a single step, every loop is walked
+            self.hot_loop_iterations = None
 
     def __call__(self, node: Node) -> Any:
+        if self.infer:
+            self.types = infer_types(
+                node, self.table.scope_stack[self.table.scope_global])
+        else:
+            # Every check is run
+            self.types = InferredTypes()
+        self.frame_sizes = self.types.frame_sizes
+        self.loop_counts = dict()
+        self.specialized_loops = dict()
         return self.walk(node)
 
     def fail(self, message: str, node: Optional[Node] = None, constructor = None) -> None:
@@ -160,6 +241,8 @@ class Walker:
         # TODO: Debugging information to assiciate node and token
         if node:
             message = self.debug_info(message, node)
+        # Program output first
+        self.output.flush()
         print(message, file=sys.stderr)
 
     def dereference(self, value: Any) -> IdentifierOperator:
@@ -173,130 +256,441 @@ class Walker:
             self.fail(message=message, node=node, constructor=AssertionError)
 
     def print_str(self, value: str) -> None:
-        # Replace escaped newline in string
-        value = value.replace(r'\n', '\n')
-        # Replace escaped tab in string
-        value = value.replace(r'\t', '\t')
-        print(value, end=str())
+        self.output.write(unescape(value))
 
     def print(self, value: Any) -> None:
-        if type(value) is int:
-            self.print_str(str(value))
-        elif type(value) is str:
-            self.print_str(value)
-        elif type(value) is list:
-            for item in value:
-                self.print(item)
-        elif isinstance(value, IdentifierOperator):
-            value = self.dereference(value)
-            self.print(value)
-        else:
-            self.fail('cannot print unknown value type')
+        # Nested arrays are printed in order, without recursion
+        values = [value]
+        while values:
+            value = values.pop()
+            if type(value) is int:
+                self.print_str(str(value))
+            elif type(value) is str:
+                self.print_str(value)
+            elif type(value) is list:
+                values.extend(reversed(value))
+            elif isinstance(value, IdentifierOperator):
+                values.append(self.dereference(value))
+            else:
+                self.fail('cannot print unknown value type')
 
     def walk(self, node: Node) -> Any:
-        # TODO: Convert to non-recursive
+        self.start(node)
+        self.resume()
+        return self.values.pop()
+
+    def start(self, node: Node) -> None:
+        '''
+        Prepare to walk a tree, one step at a time (see resume).
+
+        Instead of recursing, every step pops a continuation from the task
+        stack, which may push more tasks and values. Every node evaluated
+        leaves exactly one value on the value stack, None for statements.
+        '''
+        self.tasks = [(self.evaluate, node)]
+        self.values = []
+        if self.profiler is not None:
+            self.profiler.start()
+
+    @property
+    def finished(self) -> bool:
+        return len(self.tasks) == 0
+
+    def resume(self, steps: Optional[int] = None) -> bool:
+        '''
+        Run at most this many steps, or until the walk is finished. Returns
+        whether it is finished, the result is then the only value left.
+        '''
+        tasks = self.tasks
+        pop = tasks.pop
+        try:
+            if steps is None:
+                while tasks:
+                    action, argument = pop()
+                    action(argument)
+            else:
+                while tasks and steps > 0:
+                    action, argument = pop()
+                    action(argument)
+                    steps -= 1
+        finally:
+            # Suspended, finished or failed
+            self.output.flush()
+        return not tasks
+
+    def evaluate(self, node: Optional[Node]) -> None:
         if node is None:
+            self.values.append(None)
             return
-        elif node.type is NodeType.SEQUENCE:
-            self.walk(node.right)
-            self.walk(node.left)
-        elif node.type is NodeType.BLOCK:
-            self.table.scope_enter()
-            self.walk(node.left)
-            self.table.scope_exit()
-        elif node.type is NodeType.STR:
-            return node.value
-        elif node.type is NodeType.INT:
-            return int(node.value)
-        elif node.type is NodeType.ARRAY:
-            array = []
-            right_value = self.walk(node.right)
-            if right_value is not None:
-                array.extend(right_value)
-            left_value = self.walk(node.left)
-            array.append(left_value)
-            return array
-        elif node.type is NodeType.IDENTIFIER:
-            name = node.value
-            variable, _ = self.table.get(name)
-            if variable.is_undefined:
-                self.fail('variable {} referenced before assignment'.format(name), node)
-            else:
-                return variable.value
-        elif node.type is NodeType.IDENTIFIER_ARRAY:
-            if node.left.type is NodeType.IDENTIFIER:
-                # Leaf node: has name and index
-                identifier_array = IdentifierArray(
-                    identifier=node.left.value)
-            else:
-                # Inner node: has index only
-                identifier_array = self.walk(node.left)  # identifier index
-            index = self.walk(node.right)  # expression
-            identifier_array.indices.append(index)
-            return identifier_array
-        elif node.type is NodeType.IDENTIFIER_MAP:
-            if node.left.type is not NodeType.IDENTIFIER:
+        evaluate_node = self.evaluate_by_type.get(node.type)
+        if evaluate_node is None:
+            self.fail('unknown node type', node)
+        evaluate_node(node)
+
+    def evaluate_profiled(self, node: Optional[Node]) -> None:
+        if node is not None:
+            # Runs once the node left its value
+            self.tasks.append((self.profiler.exit, node))
+            self.profiler.enter(node)
+        Walker.evaluate(self, node)
+
+    def evaluate_value_profiled(self, node: Optional[Node]) -> None:
+        # Indexed identifiers are read without evaluate, see evaluate_value
+        if node is not None and node.type in (
+            NodeType.IDENTIFIER_ARRAY, NodeType.IDENTIFIER_MAP,
+        ):
+            self.tasks.append((self.profiler.exit, node))
+            self.profiler.enter(node)
+        Walker.evaluate_value(self, node)
+
+    # Continuations, popped from the task stack
+
+    def push_value(self, value: Any) -> None:
+        self.values.append(value)
+
+    def discard_value(self, _: Any) -> None:
+        self.values.pop()
+
+    def clear_value(self, _: Any) -> None:
+        # Statements evaluate to None
+        self.values[-1] = None
+
+    def build_list(self, size: int) -> None:
+        values = self.values
+        items = values[-size:]
+        del values[-size:]
+        values.append(items)
+
+    def build_array(self, _: Any) -> None:
+        values = self.values
+        left_value = values.pop()
+        right_value = values.pop()
+        array = []
+        if right_value is not None:
+            array.extend(right_value)
+        array.append(left_value)
+        values.append(array)
+
+    def append_index(self, _: Any) -> None:
+        index = self.values.pop()
+        self.values[-1].indices.append(index)
+
+    def build_identifier_map(self, identifier: str) -> None:
+        values = self.values
+        values[-1] = IdentifierMap(identifier=identifier, key=values[-1])
+
+    def array_variable(self, node: Node, identifier: str) -> Variable:
+        if id(node) in self.types.arrays:
+            # Proven an array before running
+            variable, _ = self.table.get(identifier)
+            return variable
+        return expect_variable(self.table, identifier, VariableType.ARRAY)
+
+    def load_array_item(self, node: Node) -> None:
+        # Indices are on the value stack, innermost first
+        identifier, count = array_identifier(node)
+        variable = self.array_variable(node, identifier)
+        values = self.values
+        item = variable.value
+        for position in range(-count, 0):
+            item = item[values[position]]
+        del values[-count:]
+        values.append(item)
+
+    def store_array_item(self, node: Node) -> None:
+        # Value to store is below the indices
+        identifier, count = array_identifier(node)
+        variable = self.array_variable(node, identifier)
+        values = self.values
+        item = variable.value
+        for position in range(-count, -1):
+            item = item[values[position]]
+        item[values[-1]] = values[-count - 1]
+        del values[-count:]
+
+    def map_name(self, identifier: str) -> str:
+        name = self.map_names.get(identifier)
+        if name is None:
+            name = self.map_names[identifier] = identifier + '#'
+        return name
+
+    def load_map_item(self, node: Node) -> None:
+        values = self.values
+        key = as_map_key(values[-1])
+        identifier = node.left.value
+        map_variable, _ = self.table.get(self.map_name(identifier))
+        if map_variable.is_undefined:
+            # Same errors as IdentifierMap
+            expect_variable(self.table, identifier)
+            expect_variable(self.table, self.map_name(identifier), VariableType.MAP)
+        items = map_variable.value
+        if key in items:
+            values[-1] = items[key]
+        else:
+            # Defined whenever the map is, maps are only set with a default
+            values[-1] = expect_variable(self.table, identifier).value
+
+    def store_map_item(self, node: Node) -> None:
+        key = as_map_key(self.values.pop())
+        identifier = node.left.value
+        set_map_item(
+            self.table, identifier, self.map_name(identifier), key, self.values[-1])
+
+    def assign(self, node: Node) -> None:
+        target = node.left
+        if target.type is NodeType.IDENTIFIER_ARRAY:
+            self.push_indices(self.store_array_item, target)
+        elif target.type is NodeType.IDENTIFIER_MAP:
+            if target.left.type is not NodeType.IDENTIFIER:
                 self.fail('identifier map missing identifier')
-            return IdentifierMap(
-                identifier=node.left.value,
-                key=self.walk(node.right))
-        elif node.type is NodeType.ASSIGN:
-            value = self.walk(node.right)  # expression
-            value = self.dereference(value)
-            if node.left.type is NodeType.IDENTIFIER_ARRAY:
-                identifier_array = self.walk(node.left)
-                identifier_array.set(self.table, value)
-            elif node.left.type is NodeType.IDENTIFIER_MAP:
-                identifier_map = self.walk(node.left)
-                identifier_map.set(self.table, value)
-            elif node.left.type is NodeType.IDENTIFIER:
-                identifier = node.left.value
-                if type(value) is int:
-                    self.table.set(Variable(identifier, VariableType.INT, value))
-                elif type(value) is str:
-                    self.table.set(Variable(identifier, VariableType.STR, value))
-                elif type(value) is list:
-                    self.table.set(Variable(identifier, VariableType.ARRAY, value))
-                elif type(value) is dict:
-                    self.table.set(Variable(identifier, VariableType.MAP, value))
-                else:
-                    self.fail('unknown type - {}'.format(value), node)
-            else:
-                self.fail('cannot assign to unknown type')
-            return value
-        elif node.type in BINARY_OPERATORS:
-            operation = BINARY_OPERATORS[node.type]
-            left = self.walk(node.left)
-            left = self.dereference(left)
-            right = self.walk(node.right)
-            right = self.dereference(right)
-            return operation(left, right)
-        elif node.type in UNARY_OPERATORS:
-            operation = UNARY_OPERATORS[node.type]
-            return operation(self.walk(node.left))
-        elif node.type is NodeType.IF:
-            if self.walk(node.left):
-                self.walk(node.right.left)
+            self.tasks.append((self.store_map_item, target))
+            self.tasks.append((self.evaluate_value, target.right))
+        elif target.type is NodeType.IDENTIFIER:
+            identifier = target.value
+            value = self.values[-1]
+            if id(node) in self.types.updates:
+                # Same type as the variable, proven before running
+                variable, _ = self.table.get(identifier)
+                variable.value = value
+                return
+            variable_type = self.types.declarations.get(id(node))
+            if variable_type is not None:
+                table = self.table
+                table.scope_stack[-1][identifier] = Variable(identifier, variable_type, value)
+            elif type(value) is int:
+                self.table.set(Variable(identifier, VariableType.INT, value))
+            elif type(value) is str:
+                self.table.set(Variable(identifier, VariableType.STR, value))
+            elif type(value) is list:
+                self.table.set(Variable(identifier, VariableType.ARRAY, value))
+            elif type(value) is dict:
+                self.table.set(Variable(identifier, VariableType.MAP, value))
             else:
-                self.walk(node.right.right)
-        elif node.type is NodeType.WHILE:
-            while self.walk(node.left):
-                self.walk(node.right)
-        elif node.type is NodeType.PRINT_CHARACTER:
-            # TODO: Why does `putc(144);` cause the walker stdout to stop?
-            value = self.walk(node.left)
-            character = chr(value)
-            print(character, end=str())
-        elif node.type is NodeType.PRINT_STRING:
-            # TODO: handle escaped characters
-            value = self.walk(node.left)
-            self.print(value)
-        elif node.type is NodeType.ASSERT:
-            expression_parenthesis = self.walk(node.left)
-            self.assert_true(
-                message='assertion failed',
-                node=node.left,
-                truthy=expression_parenthesis,
-            )
+                self.fail('unknown type - {}'.format(value), node)
         else:
-            self.fail('unknown node type', node)
+            self.fail('cannot assign to unknown type')
+
+    def apply_binary(self, operation: Callable[[Any, Any], Any]) -> None:
+        values = self.values
+        right = values.pop()
+        values[-1] = operation(values[-1], right)
+
+    def short_circuit(self, node: Node) -> None:
+        left = self.values[-1]
+        if node.type is NodeType.AND and not left:
+            return
+        elif node.type is NodeType.OR and left:
+            return
+        self.values.pop()
+        self.tasks.append((self.evaluate_value, node.right))
+
+    def apply_unary(self, operation: Callable[[Any], Any]) -> None:
+        values = self.values
+        values[-1] = operation(values[-1])
+
+    def branch(self, node: Node) -> None:
+        branch = node.right.left if self.values.pop() else node.right.right
+        # Node is left on the task stack, see SamplingProfiler
+        self.tasks.append((self.clear_value, node))
+        self.tasks.append((self.evaluate, branch))
+
+    def run_specialized(self, node: Node) -> bool:
+        # Runs the rest of the loop at once, unless it cannot be compiled or
+        # its variables no longer hold ints
+        if id(node) not in self.specialized_loops:
+            self.specialized_loops[id(node)] = self.specializer(node, self.table)
+        loop = self.specialized_loops[id(node)]
+        if loop is None:
+            return False
+        variables = loop.guard(self.table)
+        if variables is None:
+            # Try again after as many iterations
+            self.loop_counts[id(node)] = 0
+            return False
+        self.running_loop = node
+        try:
+            loop(variables, self.output.write)
+        finally:
+            self.running_loop = None
+        return True
+
+    def loop(self, node: Node) -> None:
+        if self.values.pop():
+            if self.hot_loop_iterations is not None:
+                count = self.loop_counts.get(id(node), 0) + 1
+                self.loop_counts[id(node)] = count
+                if count >= self.hot_loop_iterations and self.run_specialized(node):
+                    self.values.append(None)
+                    return
+            tasks = self.tasks
+            tasks.append((self.loop, node))
+            tasks.append((self.evaluate_value, node.left))
+            tasks.append((self.discard_value, None))
+            tasks.append((self.evaluate, node.right))
+        else:
+            self.values.append(None)
+
+    def exit_scope(self, _: Any) -> None:
+        self.table.scope_exit()
+        self.values[-1] = None
+
+    def print_character(self, _: Any) -> None:
+        # TODO: Why does `putc(144);` cause the walker stdout to stop?
+        self.output.write(chr(self.values[-1]))
+        self.values[-1] = None
+
+    def print_value(self, _: Any) -> None:
+        # TODO: handle escaped characters
+        self.print(self.values[-1])
+        self.values[-1] = None
+
+    def assert_value(self, node: Node) -> None:
+        self.assert_true(
+            message='assertion failed',
+            node=node.left,
+            truthy=self.values[-1],
+        )
+        self.values[-1] = None
+
+    # Evaluation of each node type, pushing tasks in reverse order
+
+    def evaluate_value(self, node: Optional[Node]) -> None:
+        # Indexed identifiers are read directly, without IdentifierOperator,
+        # so conditions, operands, indices and keys get the item, as in every
+        # engine. Any other node already evaluates to a value.
+        if node is not None:
+            if node.type is NodeType.IDENTIFIER_ARRAY:
+                self.push_indices(self.load_array_item, node)
+                return
+            elif node.type is NodeType.IDENTIFIER_MAP:
+                if node.left.type is not NodeType.IDENTIFIER:
+                    self.fail('identifier map missing identifier')
+                self.tasks.append((self.load_map_item, node))
+                self.tasks.append((self.evaluate_value, node.right))
+                return
+        self.evaluate(node)
+
+    def push_indices(self, action: Callable[[Node], None], node: Node) -> None:
+        # Outermost index is pushed first, so evaluated last
+        tasks = self.tasks
+        tasks.append((action, node))
+        while node.type is NodeType.IDENTIFIER_ARRAY:
+            tasks.append((self.evaluate_value, node.right))
+            node = node.left
+
+    def evaluate_statement_list(self, node: Node) -> None:
+        tasks = self.tasks
+        tasks.append((self.push_value, None))
+        for child in reversed(node.children):
+            tasks.append((self.discard_value, None))
+            tasks.append((self.evaluate, child))
+
+    def evaluate_sequence(self, node: Node) -> None:
+        tasks = self.tasks
+        tasks.append((self.clear_value, None))
+        tasks.append((self.evaluate, node.left))
+        tasks.append((self.discard_value, None))
+        tasks.append((self.evaluate, node.right))
+
+    def evaluate_block(self, node: Node) -> None:
+        if self.frame_sizes.get(id(node)) == 0:
+            # Declares nothing, no scope needed
+            self.tasks.append((self.clear_value, node))
+        else:
+            self.table.scope_enter()
+            self.tasks.append((self.exit_scope, node))
+        self.tasks.append((self.evaluate, node.left))
+
+    def evaluate_str(self, node: Node) -> None:
+        self.values.append(node.value)
+
+    def evaluate_int(self, node: Node) -> None:
+        # Converted already when optimized
+        value = node.constant
+        self.values.append(int(node.value) if value is None else value)
+
+    def evaluate_array_list(self, node: Node) -> None:
+        if node.constant is not None:
+            self.values.append(copy_array(node.constant))
+            return
+        elif len(node.children) == 0:
+            self.values.append([])
+            return
+        tasks = self.tasks
+        tasks.append((self.build_list, len(node.children)))
+        for child in reversed(node.children):
+            tasks.append((self.evaluate_value, child))
+
+    def evaluate_array(self, node: Node) -> None:
+        tasks = self.tasks
+        tasks.append((self.build_array, None))
+        tasks.append((self.evaluate_value, node.left))
+        tasks.append((self.evaluate_value, node.right))
+
+    def evaluate_identifier(self, node: Node) -> None:
+        name = node.value
+        variable, _ = self.table.get(name)
+        if variable.is_undefined:
+            self.fail('variable {} referenced before assignment'.format(name), node)
+        self.values.append(variable.value)
+
+    def evaluate_identifier_array(self, node: Node) -> None:
+        tasks = self.tasks
+        tasks.append((self.append_index, None))
+        tasks.append((self.evaluate_value, node.right))  # expression
+        if node.left.type is NodeType.IDENTIFIER:
+            # Leaf node: has name and index
+            self.values.append(IdentifierArray(identifier=node.left.value))
+        else:
+            # Inner node: has index only
+            tasks.append((self.evaluate, node.left))  # identifier index
+
+    def evaluate_identifier_map(self, node: Node) -> None:
+        if node.left.type is not NodeType.IDENTIFIER:
+            self.fail('identifier map missing identifier')
+        self.tasks.append((self.build_identifier_map, node.left.value))
+        self.tasks.append((self.evaluate_value, node.right))
+
+    def evaluate_assign(self, node: Node) -> None:
+        tasks = self.tasks
+        tasks.append((self.assign, node))
+        tasks.append((self.evaluate_value, node.right))  # expression
+
+    def evaluate_binary(self, node: Node) -> None:
+        tasks = self.tasks
+        tasks.append((self.apply_binary, BINARY_OPERATORS[node.type]))
+        tasks.append((self.evaluate_value, node.right))
+        tasks.append((self.evaluate_value, node.left))
+
+    def evaluate_logical(self, node: Node) -> None:
+        self.tasks.append((self.short_circuit, node))
+        self.tasks.append((self.evaluate_value, node.left))
+
+    def evaluate_unary(self, node: Node) -> None:
+        self.tasks.append((self.apply_unary, UNARY_OPERATORS[node.type]))
+        self.tasks.append((self.evaluate_value, node.left))
+
+    def evaluate_if(self, node: Node) -> None:
+        self.tasks.append((self.branch, node))
+        self.tasks.append((self.evaluate_value, node.left))
+
+    def evaluate_while(self, node: Node) -> None:
+        self.tasks.append((self.loop, node))
+        self.tasks.append((self.evaluate_value, node.left))
+
+    def evaluate_print_character(self, node: Node) -> None:
+        self.tasks.append((self.print_character, None))
+        self.tasks.append((self.evaluate_value, node.left))
+
+    def evaluate_print_string(self, node: Node) -> None:
+        if node.constant is not None:
+            # Text printed, known when optimized
+            self.output.write(node.constant)
+            self.values.append(None)
+            return
+        self.tasks.append((self.print_value, None))
+        self.tasks.append((self.evaluate_value, node.left))
+
+    def evaluate_assert(self, node: Node) -> None:
+        self.tasks.append((self.assert_value, node))
+        self.tasks.append((self.evaluate_value, node.left))
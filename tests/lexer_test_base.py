@@ -23,6 +23,13 @@ class LexerTestBase(unittest.TestCase):
         # Convert generator to list
         self.output = list(self.output)
     
+    def whenLexBuffer(self):
+        buffer = '\n'.join(self.program_lines).encode('utf-8')
+        self.output = lex.from_program_buffer(buffer)
+        self.assertIsInstance(self.output, Iterable)
+        # Convert generator to list
+        self.output = list(self.output)
+
     def whenLexParseLine(self):
         self.assertEqual(1, len(self.program_lines))
         self.output = lex(self.program_lines[0])
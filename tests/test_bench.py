@@ -0,0 +1,43 @@
+import unittest
+
+from core.bench import ProgramGenerator, bench_pipeline, count_nodes
+from core.lexer import Lexer
+from core.parser import Parser
+from core.walker import Walker
+
+
+class TestProgramGenerator(unittest.TestCase):
+    def test_seeded(self):
+        self.assertEqual(
+            ProgramGenerator(seed=1, statements=20)(),
+            ProgramGenerator(seed=1, statements=20)())
+        self.assertNotEqual(
+            ProgramGenerator(seed=1, statements=20)(),
+            ProgramGenerator(seed=2, statements=20)())
+
+    def test_runs(self):
+        program = ProgramGenerator(
+            seed=3, statements=50, depth=3, array_length=5, identifiers=4)()
+        ast = Parser()(Lexer().from_program_text(program))
+        Walker()(ast)
+
+    def test_array_length(self):
+        program = ProgramGenerator(
+            seed=4, statements=50, depth=0, array_length=7)()
+        self.assertIn('a0 = [', program)
+        array_line = next(line for line in program.split('\n') if line.startswith('a0'))
+        self.assertEqual(7, array_line.count(','))
+
+
+class TestBenchPipeline(unittest.TestCase):
+    def test_report(self):
+        report = bench_pipeline(ProgramGenerator(statements=10)(), repeat=1)
+        self.assertEqual(['source', 'lex', 'parse', 'walk'], list(report))
+        self.assertGreater(report['lex']['tokens'], 0)
+        self.assertGreater(report['parse']['nodes_per_second'], 0)
+        self.assertGreater(report['walk']['peak_memory_bytes'], 0)
+
+    def test_count_nodes(self):
+        ast = Parser()(Lexer().from_program_text('x = + 1 2;'))
+        # STATEMENT_LIST, ASSIGN, IDENTIFIER, ADD, INT, INT
+        self.assertEqual(6, count_nodes(ast))
@@ -0,0 +1,95 @@
+import glob
+import os
+import tempfile
+import unittest
+
+from core.cache import AstCache, CodeCache, dump_ast, load_ast
+from core.lexer import Lexer
+from core.parser import Parser
+
+
+lex = Lexer()
+parser = Parser()
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+def parse(source: bytes):
+    return parser(lex.from_program_buffer(source))
+
+
+class TestDumpAst(unittest.TestCase):
+    def test_round_trip_examples(self):
+        for path in sorted(glob.glob(os.path.join(EXAMPLES_PATH, '*.src'))):
+            with self.subTest('test example {}'.format(path)):
+                with open(path, 'rb') as file:
+                    ast = parse(file.read())
+                self.assertEqual(ast.as_dict(), load_ast(dump_ast(ast)).as_dict())
+
+    def test_constant(self):
+        ast = load_ast(dump_ast(parse(b'a = [[1, ], "x", ];')))
+        self.assertEqual([[1], 'x'], ast.children[0].right.constant)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            load_ast(b'not an ast')
+
+
+class TestAstCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = AstCache(path=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_miss_then_hit(self):
+        source = b'x = 1;'
+        self.assertIsNone(self.cache.get(source))
+        self.cache.set(source, parse(source))
+        self.assertEqual(parse(source).as_dict(), self.cache.get(source).as_dict())
+
+    def test_keyed_by_content_and_variant(self):
+        self.cache.set(b'x = 1;', parse(b'x = 1;'))
+        self.assertIsNone(self.cache.get(b'x = 2;'))
+        self.assertIsNone(self.cache.get(b'x = 1;', variant='O1'))
+
+    def test_corrupt_entry(self):
+        source = b'x = 1;'
+        self.cache.set(source, parse(source))
+        file_path = self.cache.get_file_path(self.cache.get_key(source))
+        with open(file_path, 'wb') as file:
+            file.write(b'garbage')
+        self.assertIsNone(self.cache.get(source))
+        self.assertFalse(os.path.exists(file_path))
+
+    def test_eviction(self):
+        self.cache.set(b'x = 1;', parse(b'x = 1;'))
+        first_path = self.cache.get_file_path(self.cache.get_key(b'x = 1;'))
+        os.utime(first_path, (0, 0))
+        self.cache.max_bytes = os.path.getsize(first_path) + 1
+        self.cache.set(b'y = 2;', parse(b'y = 2;'))
+        self.assertIsNone(self.cache.get(b'x = 1;'))
+        self.assertIsNotNone(self.cache.get(b'y = 2;'))
+
+
+class TestCodeCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = CodeCache(path=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_miss_then_hit(self):
+        source = b'x = 1\n'
+        self.assertIsNone(self.cache.get(source))
+        self.cache.set(source, compile(source, '<test>', 'exec'))
+        namespace = dict()
+        exec(self.cache.get(source), namespace)
+        self.assertEqual(1, namespace['x'])
+
+    def test_separate_from_ast_cache(self):
+        source = b'x = 1;'
+        AstCache(path=self.directory.name).set(source, parse(source))
+        self.assertIsNone(self.cache.get(source))
@@ -0,0 +1,444 @@
+import contextlib
+import glob
+import io
+import os
+import sys
+import unittest
+
+from core.ast import Node, NodeType
+from core.bytecode import INSTRUCTION_SIZE, BytecodeCompiler, Opcode, disassemble
+from core.closures import ClosureEngine
+from core.engines import ENGINES, load_engine
+from core.optimizer import OPTIMIZE_MAX, OPTIMIZE_NONE, Optimizer
+from core.transpiler import PythonEngine, Transpiler
+from core.lexer import Lexer
+from core.parser import Parser
+from core.vm import VirtualMachine
+from core.walker import Walker
+from tests import test_walker_array, test_walker_logical
+from tests.walker_test_base import WalkerTestBase
+
+
+lex = Lexer()
+parser = Parser()
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+# Takes seconds in the walker
+SLOW_EXAMPLES = ['mandelbrot.src']
+
+
+def run_program(engine_class, source: str) -> str:
+    ast = parser(lex.from_program_text(source))
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout):
+        engine_class()(ast)
+    return stdout.getvalue()
+
+
+def nested_blocks(depth: int) -> Node:
+    # x = 0; { y1 = x; { y0 = x; x = + y0 1; } }, every block a scope
+    def assign(name: str, expression: Node) -> Node:
+        return Node(
+            type=NodeType.ASSIGN,
+            left=Node(type=NodeType.IDENTIFIER, value=name),
+            right=expression)
+
+    statement = assign('x', Node(
+        type=NodeType.ADD,
+        left=Node(type=NodeType.IDENTIFIER, value='y0'),
+        right=Node(type=NodeType.INT, value='1')))
+    for level in range(depth):
+        name = 'y{}'.format(level)
+        statement = Node(type=NodeType.BLOCK, left=Node(
+            type=NodeType.STATEMENT_LIST,
+            children=[assign(name, Node(type=NodeType.IDENTIFIER, value='x')), statement]))
+    return Node(
+        type=NodeType.STATEMENT_LIST,
+        children=[assign('x', Node(type=NodeType.INT, value='0')), statement])
+
+
+class EngineTestBase:
+    engine_class = None
+
+    def test_examples_same_as_walker(self):
+        for path in sorted(glob.glob(os.path.join(EXAMPLES_PATH, '*.src'))):
+            if os.path.basename(path) in SLOW_EXAMPLES:
+                continue
+            with self.subTest('test example {}'.format(path)):
+                with open(path) as file:
+                    source = file.read()
+                self.assertEqual(
+                    run_program(Walker, source),
+                    run_program(self.engine_class, source))
+
+
+class TestEveryEngine(unittest.TestCase):
+    def thenSameOnEveryEngine(self, lines, expected_output):
+        ast = parser(lex.from_program_lines(lines))
+        for name in ENGINES:
+            engine_class = load_engine(name)
+            for level in range(OPTIMIZE_NONE, OPTIMIZE_MAX + 1):
+                with self.subTest('engine {} level {}'.format(name, level)):
+                    stdout = io.StringIO()
+                    with contextlib.redirect_stdout(stdout):
+                        engine_class()(Optimizer(level)(ast))
+                    self.assertEqual(expected_output, stdout.getvalue())
+
+    def test_indexed_values(self):
+        self.thenSameOnEveryEngine([
+            'a = [0, 66, 1, ];',
+            'm = 0; m # 1 = 2;',
+            'if (a @ 0) print("a"); else print("b");',
+            'if (not (a @ 0)) print("c");',
+            'assert(a @ 1);',
+            'putc(a @ 1);',
+            'i = 2; while (a @ i) { i = - i 1; }',
+            'print([i, a @ (a @ 2), m # (a @ 2), ]);',
+            'a @ (a @ 2) = 7; m # (a @ 2) = 8;',
+            'print([a @ 1, m # 1, ]);',
+        ], 'bcB066278')
+
+
+class TestClosureEngine(EngineTestBase, unittest.TestCase):
+    engine_class = ClosureEngine
+
+
+class TestClosureEngineArrayLiteral(test_walker_array.TestArrayLiteral):
+    engine_class = ClosureEngine
+
+
+class TestClosureEngineShortCircuit(test_walker_logical.TestShortCircuit):
+    engine_class = ClosureEngine
+
+
+class TestClosureEngineSemantics(WalkerTestBase):
+    engine_class = ClosureEngine
+
+    def test_block_scope_each_iteration(self):
+        self.givenProgramLines([
+            'i = 0;',
+            'while (< i 2) { if (== i 1) print(x); x = i; i = + i 1; }',
+        ])
+        with self.assertRaisesRegex(Exception, 'referenced before assignment'):
+            self.whenWalk()
+
+    def test_statements_share_table(self):
+        self.walker = self.engine_class()
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            for line in ['x = 1;', 'm = 0;', 'm # 2 = + x 1;', 'print(m # 2);']:
+                self.givenProgramLine(line)
+                self.whenParse()
+                self.walker(self.ast)
+        self.assertEqual('2', stdout.getvalue())
+        self.thenVariable('x', 1)
+        self.thenVariable('m#', dict([(2, 2)]))
+
+    def test_deeply_nested_blocks(self):
+        self.ast = nested_blocks(sys.getrecursionlimit())
+        self.walker = self.engine_class()
+        self.walker(self.ast)
+        self.thenVariable('x', 1)
+
+    def test_indexed_condition(self):
+        self.givenProgramLines([
+            'a = [0, 1, ];',
+            'if (a @ 0) print("yes"); else print("no");',
+        ])
+        self.whenWalk()
+        self.thenPrint('no')
+
+    def test_map(self):
+        self.givenProgramLines([
+            'm = 0;',
+            'm # "x" = 5;',
+            'print([m # "x", m # "y", ]);',
+        ])
+        self.whenWalk()
+        self.thenPrint('50')
+
+    def test_block_scope(self):
+        self.givenProgramLines(['y = 1;', '{ x = 2; y = + x y; }'])
+        self.whenWalk()
+        self.thenVariable('y', 3)
+        self.thenVariable('x', None)
+
+    def test_block_declaring_nothing(self):
+        self.givenProgramLines([
+            'x = 1;',
+            'i = 0;',
+            'while (< i 3) { x = * x 2; { i = + i 1; } }',
+        ])
+        self.whenWalk()
+        self.thenVariable('x', 8)
+        self.thenVariable('i', 3)
+
+    def test_type_mismatch(self):
+        self.givenProgramLines(['x = 1;', 'x = "one";'])
+        with self.assertRaisesRegex(Exception, 'variable type mismatch'):
+            self.whenWalk()
+
+    def test_undefined(self):
+        self.givenProgramLine('print(x);')
+        with self.assertRaisesRegex(Exception, 'referenced before assignment'):
+            self.whenWalk()
+
+
+class TestVirtualMachine(EngineTestBase, unittest.TestCase):
+    engine_class = VirtualMachine
+
+
+class TestVirtualMachineArrayLiteral(test_walker_array.TestArrayLiteral):
+    engine_class = VirtualMachine
+
+
+class TestVirtualMachineShortCircuit(test_walker_logical.TestShortCircuit):
+    engine_class = VirtualMachine
+
+
+class TestVirtualMachineSemantics(TestClosureEngineSemantics):
+    engine_class = VirtualMachine
+
+    def test_while_increment(self):
+        self.givenProgramLines([
+            'i = 0;',
+            'total = 0;',
+            'while (< i 5) { total = + total i; i = + i 1; }',
+            'j = 9;',
+            'while (j) j = - j 3;',
+        ])
+        self.whenWalk()
+        self.thenVariable('i', 5)
+        self.thenVariable('total', 10)
+        self.thenVariable('j', 0)
+
+    def test_if_else(self):
+        self.givenProgramLines([
+            'x = 3;',
+            'if (== x 3) print("a"); else print("b");',
+            'if (!= x 3) print("c"); else print("d");',
+            'if (x) print("e");',
+        ])
+        self.whenWalk()
+        self.thenPrint('ade')
+
+    def test_nested_array_assign(self):
+        self.givenProgramLines([
+            'a = [[1, 2, ], [3, 4, ], ];',
+            'a @ 1 @ 0 = 7;',
+            'print(a @ 1);',
+        ])
+        self.whenWalk()
+        self.thenPrint('74')
+
+    def test_increment_undefined(self):
+        self.givenProgramLine('x = + x 1;')
+        with self.assertRaisesRegex(Exception, 'referenced before assignment'):
+            self.whenWalk()
+
+
+class TestBytecodeCompiler(WalkerTestBase):
+    def whenCompile(self):
+        self.whenParse()
+        self.code = BytecodeCompiler()(self.ast)
+
+    def thenOpcodes(self, opcodes):
+        instructions = self.code.instructions
+        self.assertEqual(
+            [Opcode(instructions[offset]) for offset in range(0, len(instructions), 3)],
+            opcodes)
+
+    def test_block_declaring_nothing(self):
+        self.givenProgramLines(['x = 0;', '{ putc(x); }', '{ y = x; }'])
+        self.whenCompile()
+        self.thenOpcodes([
+            Opcode.LOAD_CONST,
+            Opcode.STORE_SLOT,
+            Opcode.LOAD_SLOT,
+            Opcode.PRINT_CHARACTER,
+            Opcode.SCOPE_ENTER,
+            Opcode.LOAD_SLOT,
+            Opcode.STORE_SLOT,
+            Opcode.SCOPE_EXIT,
+        ])
+
+    def test_short_circuit(self):
+        self.givenProgramLines(['i = 0;', 'if (and < i 1 i) putc(65);', 'i = or i 1;'])
+        self.whenCompile()
+        self.thenOpcodes([
+            Opcode.LOAD_CONST,
+            Opcode.STORE_SLOT,
+            Opcode.LOAD_SLOT_CONST,
+            Opcode.JUMP_IF_NOT_LESS_THAN,
+            Opcode.LOAD_SLOT,
+            Opcode.POP_JUMP_IF_FALSE,
+            Opcode.LOAD_CONST,
+            Opcode.PRINT_CHARACTER,
+            Opcode.LOAD_SLOT,
+            Opcode.JUMP_IF_TRUE_OR_POP,
+            Opcode.LOAD_CONST,
+            Opcode.STORE_SLOT,
+        ])
+
+    def test_superinstructions(self):
+        self.givenProgramLines(['n = 3;', 'i = 0;', 'while (< i n) i = + i 1;'])
+        self.whenCompile()
+        self.thenOpcodes([
+            Opcode.LOAD_CONST,
+            Opcode.STORE_SLOT,
+            Opcode.LOAD_CONST,
+            Opcode.STORE_SLOT,
+            Opcode.LOAD_SLOT_SLOT,
+            Opcode.JUMP_IF_NOT_LESS_THAN,
+            Opcode.INCREMENT_SLOT,
+            Opcode.JUMP,
+        ])
+
+    def test_type_checked_when_unknown(self):
+        self.givenProgramLines(['a = [1, ];', 'x = 1;', 'x = a @ 0;', 'x = 2;'])
+        self.whenCompile()
+        self.thenOpcodes([
+            Opcode.LOAD_CONST_ARRAY,
+            Opcode.STORE_SLOT,
+            Opcode.LOAD_CONST,
+            Opcode.STORE_SLOT,
+            Opcode.LOAD_SLOT,
+            Opcode.LOAD_CONST,
+            Opcode.LOAD_INDEX,
+            Opcode.STORE_SLOT_CHECKED,
+            Opcode.LOAD_CONST,
+            Opcode.STORE_SLOT,
+        ])
+
+    def test_deeply_nested_blocks(self):
+        # Compiled without recursion, deeper than the parser can parse
+        depth = sys.getrecursionlimit()
+        self.ast = nested_blocks(depth)
+        self.code = BytecodeCompiler()(self.ast)
+        opcodes = self.code.instructions[::INSTRUCTION_SIZE]
+        self.assertEqual(depth, opcodes.count(Opcode.SCOPE_ENTER))
+        self.walker = VirtualMachine()
+        self.walker(self.ast)
+        self.thenVariable('x', 1)
+
+    def test_indexed_condition(self):
+        # Jumps on the item, as every engine does (see TestEveryEngine)
+        self.givenProgramLines(['a = [0, ];', 'if (a @ 0) putc(65);'])
+        self.whenCompile()
+        self.thenOpcodes([
+            Opcode.LOAD_CONST_ARRAY,
+            Opcode.STORE_SLOT,
+            Opcode.LOAD_SLOT,
+            Opcode.LOAD_CONST,
+            Opcode.LOAD_INDEX,
+            Opcode.POP_JUMP_IF_FALSE,
+            Opcode.LOAD_CONST,
+            Opcode.PRINT_CHARACTER,
+        ])
+
+    def test_disassemble(self):
+        self.givenProgramLines(['x = 2;', 'if (> x 1) { y = x; putc(10); }'])
+        self.whenCompile()
+        self.assertEqual(list(disassemble(self.code)), [
+            '     0  LOAD_CONST                         0 (2)',
+            '     3  STORE_SLOT                         0 (x 0:0)',
+            '     6  LOAD_SLOT_CONST                    0 (x 0:0) 1 (1)',
+            '     9  JUMP_IF_NOT_GREATER_THAN           -> 30',
+            '    12  SCOPE_ENTER                        1',
+            '    15  LOAD_SLOT                          0 (x 0:0)',
+            '    18  STORE_SLOT                         1 (y 1:0)',
+            '    21  LOAD_CONST                         2 (10)',
+            '    24  PRINT_CHARACTER',
+            '    27  SCOPE_EXIT',
+        ])
+
+
+class TestPythonEngine(EngineTestBase, unittest.TestCase):
+    engine_class = PythonEngine
+
+
+class TestPythonEngineArrayLiteral(test_walker_array.TestArrayLiteral):
+    engine_class = PythonEngine
+
+
+class TestPythonEngineShortCircuit(test_walker_logical.TestShortCircuit):
+    engine_class = PythonEngine
+
+
+class TestPythonEngineSemantics(TestClosureEngineSemantics):
+    engine_class = PythonEngine
+
+    def test_sibling_blocks(self):
+        self.givenProgramLines([
+            '{ x = 1; print(x); }',
+            '{ x = "a"; print(x); }',
+            'x = [2, ];',
+            'print(x);',
+        ])
+        self.whenWalk()
+        self.thenPrint('1a2')
+        self.thenVariable('x', [2])
+
+    def test_unknown_type_mismatch(self):
+        self.givenProgramLines(['a = [1, "b", ];', 'x = a @ 0;', 'x = a @ 1;'])
+        with self.assertRaisesRegex(Exception, 'variable type mismatch'):
+            self.whenWalk()
+
+    def test_too_deep_for_python(self):
+        self.givenProgramLines(
+            ['x = 0;'] + ['while (< x 1) {'] * 30 + ['x = + x 1;'] + ['}'] * 30)
+        self.whenWalk()
+        self.thenVariable('x', 1)
+
+
+class TestTranspiler(WalkerTestBase):
+    def whenTranspile(self):
+        self.whenParse()
+        self.source = Transpiler()(self.ast)
+
+    def thenSource(self, lines):
+        self.assertEqual('\n'.join(lines) + '\n', self.source)
+
+    def test_renamed_by_depth(self):
+        self.givenProgramLines([
+            'i = 0;',
+            'while (< i 3) { j = + i 1; i = + i 1; }',
+            'print("done\\n");',
+        ])
+        self.whenTranspile()
+        self.thenSource([
+            'def program(scope):',
+            '    i_0 = 0',
+            '    while i_0 < 3:',
+            '        j_1 = (i_0 + 1)',
+            '        i_0 += 1',
+            "    write('done\\n')",
+            "    return {'i': i_0}",
+        ])
+
+    def test_indexed_condition(self):
+        # Same meaning in every engine, see TestEveryEngine
+        self.givenProgramLines(['a = [0, ];', 'if (a @ 0) putc(65);', 'while (a @ 0) a @ 0 = 0;'])
+        self.whenTranspile()
+        self.thenSource([
+            'def program(scope):',
+            '    a_0 = [0]',
+            '    if a_0[0]:',
+            '        write(chr(65))',
+            '    while a_0[0]:',
+            '        a_0[0] = 0',
+            "    return {'a': a_0}",
+        ])
+
+    def test_type_checked_when_unknown(self):
+        self.givenProgramLines(['a = [1, ];', 'x = 1;', 'x = a @ 0;', 'x = 2;'])
+        self.whenTranspile()
+        self.thenSource([
+            'def program(scope):',
+            '    a_0 = [1]',
+            '    x_0 = 1',
+            '    x_0 = same_type(x_0, a_0[0])',
+            '    x_0 = 2',
+            "    return {'a': a_0, 'x': x_0}",
+        ])
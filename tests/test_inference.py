@@ -0,0 +1,149 @@
+import sys
+import unittest
+from unittest import mock
+
+from core.ast import Node, NodeType
+from core.inference import block_frame_sizes, infer_types
+from core.lexer import Lexer
+from core.parser import Parser
+from core.variables import Variable, VariableType
+from core.walker import Walker, expect_variable
+from tests.walker_test_base import WalkerTestBase
+
+
+lex = Lexer()
+parser = Parser()
+
+
+class TestInferTypes(unittest.TestCase):
+    def givenProgram(self, source: str, variables=None):
+        self.ast = parser(lex.from_program_text(source))
+        self.inferred = infer_types(self.ast, variables)
+
+    def thenGlobalTypes(self, expected_types):
+        self.assertEqual(expected_types, self.inferred.scopes[id(self.ast)])
+
+    def thenErrors(self, expected_messages):
+        self.assertEqual(
+            expected_messages, [str(error) for error in self.inferred.errors])
+
+    def test_types_of_variables(self):
+        self.givenProgram('i = 0; s = "a"; a = [1, ]; b = a @ 0; c = + b 1; d = * b 2;')
+        self.thenGlobalTypes(dict([
+            ('i', int), ('s', str), ('a', list), ('b', None), ('c', int), ('d', None),
+        ]))
+        self.thenErrors([])
+
+    def test_types_of_block(self):
+        self.givenProgram('x = 0; { y = "a"; x = + x 1; }')
+        block = self.ast.children[1]
+        self.assertEqual(dict([('y', str)]), self.inferred.scopes[id(block)])
+        self.assertEqual(1, self.inferred.frame_sizes[id(block)])
+
+    def test_variables_of_earlier_runs(self):
+        self.givenProgram('y = + x 1;', dict([('x', Variable('x', VariableType.INT, 1))]))
+        self.thenGlobalTypes(dict([('x', int), ('y', int)]))
+
+    def test_mismatch(self):
+        self.givenProgram('x = 0; if (0) { x = "a"; } s = "b"; print(s @ 0);')
+        self.thenErrors([
+            'variable type mismatch - x is of type VariableType.INT, not VariableType.STR',
+            'variable type mismatch - s is not of type VariableType.ARRAY',
+        ])
+
+    def test_unknown_not_reported(self):
+        self.givenProgram('a = [1, "a", ]; x = a @ 0; x = 2; x = "b";')
+        self.thenErrors([])
+
+    def test_proven_checks(self):
+        self.givenProgram('x = 0; x = + x 1; a = [0, ]; a @ 0 = x; x = a @ 0;')
+        declare_x, update_x, declare_a, assign_item, assign_x = self.ast.children
+        self.assertEqual(
+            dict([(id(declare_x), VariableType.INT), (id(declare_a), VariableType.ARRAY)]),
+            self.inferred.declarations)
+        self.assertEqual(set([id(update_x)]), self.inferred.updates)
+        self.assertEqual(
+            set([id(assign_item.left), id(assign_x.right)]), self.inferred.arrays)
+
+    def test_deep_expression(self):
+        expression = Node(type=NodeType.INT, value='0')
+        for _ in range(sys.getrecursionlimit() * 4):
+            expression = Node(
+                type=NodeType.ADD, left=expression, right=Node(type=NodeType.INT, value='1'))
+        self.ast = Node(
+            type=NodeType.ASSIGN,
+            left=Node(type=NodeType.IDENTIFIER, value='x'),
+            right=expression)
+        self.inferred = infer_types(self.ast)
+        self.thenGlobalTypes(dict([('x', int)]))
+
+
+class TestWalkerProvenTypes(WalkerTestBase):
+    def test_unchecked_when_proven(self):
+        self.givenProgramLines([
+            'a = [1, 2, ];',
+            'i = 0;',
+            'while (< i 2) { a @ i = * (a @ i) 10; i = + i 1; }',
+        ])
+        with mock.patch('core.walker.expect_variable') as expect_variable:
+            self.whenWalk()
+        expect_variable.assert_not_called()
+        self.thenVariable('a', [10, 20])
+        self.thenVariable('i', 2)
+
+    def test_checked_without_inference(self):
+        walker = Walker()
+        walker.infer = False
+        self.engine_class = lambda: walker
+        self.givenProgramLines([
+            'a = [1, 2, ];',
+            'i = 0;',
+            'while (< i 2) { a @ i = * (a @ i) 10; i = + i 1; }',
+        ])
+        with mock.patch('core.walker.infer_types') as infer_types, \
+                mock.patch('core.walker.expect_variable', wraps=expect_variable) as expect:
+            self.whenWalk()
+        infer_types.assert_not_called()
+        self.assertGreater(expect.call_count, 0)
+        self.thenVariable('a', [10, 20])
+
+    def test_mismatch_still_raised(self):
+        self.givenProgramLines([
+            'x = 0;',
+            'print(x);',
+            'x = "a";',
+        ])
+        with self.assertRaises(Exception) as context:
+            self.whenWalk()
+        self.assertEqual('variable type mismatch', str(context.exception))
+
+
+class TestBlockFrameSizes(unittest.TestCase):
+    def thenSizes(self, source: str, expected_sizes, variables=None):
+        ast = parser(lex.from_program_text(source))
+        sizes = block_frame_sizes(ast, variables)
+        blocks = []
+
+        def visit(node):
+            if node is None:
+                return
+            elif node.type is NodeType.BLOCK:
+                blocks.append(node)
+            for child in node.children or [node.left, node.right]:
+                visit(child)
+        visit(ast)
+        self.assertEqual(expected_sizes, [sizes[id(block)] for block in blocks])
+
+    def test_block_declaring_nothing(self):
+        self.thenSizes('x = 0; { x = + x 1; print(x); }', [0])
+
+    def test_nested_blocks(self):
+        self.thenSizes('x = 0; { y = x; { x = y; z = y; } }', [1, 1])
+
+    def test_map_declared_once(self):
+        self.thenSizes('m = 0; { m # 1 = 2; m # 2 = 3; }', [1])
+
+    def test_variables_of_earlier_runs(self):
+        self.thenSizes('{ x = 1; }', [0], dict([
+            ('x', Variable('x', VariableType.INT, 0)),
+        ]))
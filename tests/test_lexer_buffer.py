@@ -0,0 +1,132 @@
+import glob
+import os
+import tempfile
+
+from core import readlines
+from core.errors import LexerSyntaxError
+from core.lexer import Lexer, LineTokenCache, split_chunks
+from core.tokens import Token, TokenType
+from tests.lexer_test_base import LexerTestBase
+
+
+lex = Lexer()
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+class TestBuffer(LexerTestBase):
+    def test_same_as_lines(self):
+        self.givenProgramLines([
+            r'if ( p ) { // meaning n is prime',
+            r"   print ( n , ' ', '\n' ) ;",
+            '\tcount = count + 1 ;',
+            r'}',
+        ])
+        self.whenLex()
+        expected = self.output
+        self.whenLexBuffer()
+        self.thenReturnTokens(expected)
+
+    def test_without_trailing_newline(self):
+        self.givenProgramLines(['x = 1;', 'y = 2;'])
+        self.whenLexBuffer()
+        self.assertEqual(
+            Token(2, 6, TokenType.SYMBOL_SEMICOLON.name, None), self.output[-2])
+        self.assertEqual(
+            Token(3, 1, TokenType.TERMINAL.name, None), self.output[-1])
+
+    def test_empty(self):
+        self.givenProgramLines([])
+        self.whenLexBuffer()
+        self.thenReturnTokens([Token(1, 1, TokenType.TERMINAL.name, None)])
+
+    def test_non_ascii_columns(self):
+        self.givenProgramLine('x = "héllo"; y = 1;')
+        self.whenLexBuffer()
+        self.assertEqual(
+            Token(1, 5, TokenType.LITERAL_STR.name, 'héllo'), self.output[2])
+        self.assertEqual(
+            Token(1, 14, TokenType.IDENTIFIER.name, 'y'), self.output[4])
+
+    def test_syntax_error_row(self):
+        self.givenProgramLines(['x = 1;', 'y = $;'])
+        with self.assertRaisesRegex(LexerSyntaxError, 'line 2 at character 5'):
+            self.whenLexBuffer()
+
+
+class TestProgramFile(LexerTestBase):
+    def test_examples(self):
+        for path in sorted(glob.glob(os.path.join(EXAMPLES_PATH, '*.src'))):
+            with self.subTest('test example {}'.format(path)):
+                with open(path) as file:
+                    expected = list(lex.from_program_lines(readlines(file)))
+                with open(path) as file:
+                    self.assertEqual(expected, list(lex.from_program_file(file)))
+
+    def test_crlf(self):
+        source = 'x = 1;\r\nprint(x);\r\ny = \'a\'; // end\ry = 2;\r\n'
+        expected = list(lex.from_program_lines([
+            'x = 1;', 'print(x);', "y = 'a'; // end", 'y = 2;']))
+        self.assertEqual(expected, list(lex.from_program_text(source)))
+        self.assertEqual(expected, list(lex.from_program_buffer(source.encode())))
+        with tempfile.TemporaryFile('w+b') as file:
+            file.write(source.encode())
+            file.seek(0)
+            self.assertEqual(expected, list(lex.from_program_file(file)))
+
+    def test_empty_file(self):
+        with tempfile.TemporaryFile('w+') as file:
+            self.assertEqual(
+                [Token(1, 1, TokenType.TERMINAL.name, None)],
+                list(lex.from_program_file(file)))
+
+
+class TestLineTokenCache(LexerTestBase):
+    def test_same_as_uncached(self):
+        lexer = Lexer(cache=LineTokenCache())
+        lines = ['x = 1;', 'print(x);', 'x = 1;', '// x = 1;']
+        self.assertEqual(
+            list(lex.from_program_lines(lines)),
+            list(lexer.from_program_lines(lines)))
+        self.assertEqual(1, lexer.cache.hits)
+        self.assertEqual(3, lexer.cache.misses)
+
+    def test_syntax_error_row(self):
+        lexer = Lexer(cache=LineTokenCache())
+        with self.assertRaisesRegex(LexerSyntaxError, 'line 2 at character 5'):
+            list(lexer.from_program_lines(['x = 1;', 'y = $;']))
+
+    def test_eviction(self):
+        lexer = Lexer(cache=LineTokenCache(max_size=2))
+        list(lexer.from_program_lines(['a;', 'b;', 'c;']))
+        self.assertEqual(['b;', 'c;'], list(lexer.cache.tokens_by_line))
+
+
+class TestParallel(LexerTestBase):
+    def test_split_chunks(self):
+        self.assertEqual(
+            [(1, 'a;\nb;\n'), (3, 'c;\nd;')],
+            split_chunks('a;\nb;\nc;\nd;', 3))
+
+    def test_same_as_serial(self):
+        text = '\n'.join([
+            'x = "héllo"; // comment',
+            'while (< x 10) {',
+            '    putc(\'\\n\');',
+            '}',
+        ] * 50)
+        for jobs in [2, 3]:
+            with self.subTest('test {} jobs'.format(jobs)):
+                self.assertEqual(
+                    list(lex.from_program_text(text)),
+                    list(lex.merge_chunks(text, jobs)))
+
+    def test_syntax_error_row(self):
+        text = 'x = 1;\n' * 100 + 'y = $;\n'
+        with self.assertRaisesRegex(LexerSyntaxError, 'line 101 at character 5'):
+            list(lex.merge_chunks(text, 2))
+
+    def test_below_threshold(self):
+        self.assertEqual(
+            list(lex.from_program_text('x = 1;')),
+            list(lex.from_program_text_parallel('x = 1;', 4)))
@@ -0,0 +1,280 @@
+import contextlib
+import glob
+import io
+import os
+import sys
+import unittest
+
+from core.ast import Node, NodeType
+from core.closures import ClosureEngine
+from core.lexer import Lexer
+from core.optimizer import OPTIMIZE_LOOPS, OPTIMIZE_MAX, Optimizer
+from core.parser import Parser
+from core.transpiler import PythonEngine
+from core.vm import VirtualMachine
+from core.walker import Walker
+
+
+lex = Lexer()
+parser = Parser()
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+# Takes seconds in the walker and vm, run by the other engines only
+SLOW_EXAMPLES = ['mandelbrot.src']
+
+STATEMENT_NAMES = frozenset([
+    'ASSIGN', 'BLOCK', 'IF', 'WHILE', 'PRINT_STRING', 'PRINT_CHARACTER', 'ASSERT',
+])
+
+
+class TestOptimizer(unittest.TestCase):
+    def givenProgram(self, source: str):
+        self.ast = parser(lex.from_program_text(source))
+
+    def whenOptimize(self, level: int = 1):
+        self.lines = list(self.ast.as_lines())
+        self.optimized = Optimizer(level)(self.ast)
+
+    def thenLines(self, expected_lines):
+        self.assertEqual(expected_lines, list(self.optimized.as_lines()))
+
+    def thenUnchanged(self):
+        self.assertEqual(self.lines, list(self.ast.as_lines()))
+
+    def test_fold_constants(self):
+        self.givenProgram('x = * (- 0 4) (+ 2 3);')
+        self.whenOptimize()
+        self.thenLines(['STATEMENT_LIST\t1', 'ASSIGN', 'IDENTIFIER\tx', 'INT\t-20'])
+        self.assertEqual(-20, self.optimized.children[0].right.constant)
+        self.thenUnchanged()
+
+    def test_fold_strings(self):
+        self.givenProgram('x = + "a" "b"; y = == "a" "b";')
+        self.whenOptimize()
+        self.thenLines([
+            'STATEMENT_LIST\t2',
+            'ASSIGN', 'IDENTIFIER\tx', 'STR\tab',
+            'ASSIGN', 'IDENTIFIER\ty', 'INT\t0',
+        ])
+
+    def test_errors_not_folded(self):
+        self.givenProgram('x = / 1 0; y = + 1 "a";')
+        self.whenOptimize()
+        self.thenLines(list(self.ast.as_lines()))
+
+    def test_variables_not_folded(self):
+        self.givenProgram('x = + y 1;')
+        self.whenOptimize()
+        self.thenLines(list(self.ast.as_lines()))
+
+    def test_dead_branches(self):
+        self.givenProgram('if (> 1 2) x = 1; else y = 2; if (0) z = 3; while (0) w = 4;')
+        self.whenOptimize()
+        self.thenLines([
+            'STATEMENT_LIST\t3',
+            'BLOCK', 'ASSIGN', 'IDENTIFIER\ty', 'INT\t2', ';',
+            'STATEMENT_LIST\t0',
+            'STATEMENT_LIST\t0',
+        ])
+
+    def test_logical(self):
+        self.givenProgram('a = and 0 x; b = or 2 x; c = and 1 3; d = and 1 x;')
+        self.whenOptimize()
+        self.thenLines([
+            'STATEMENT_LIST\t4',
+            'ASSIGN', 'IDENTIFIER\ta', 'INT\t0',
+            'ASSIGN', 'IDENTIFIER\tb', 'INT\t2',
+            'ASSIGN', 'IDENTIFIER\tc', 'INT\t3',
+            'ASSIGN', 'IDENTIFIER\td', 'AND', 'INT\t1', 'IDENTIFIER\tx',
+        ])
+
+    def test_printed_text(self):
+        self.givenProgram(r'print("a\n"); print([1, "\tb", ]); print(x);')
+        self.whenOptimize()
+        self.assertEqual(
+            ['a\n', '1\tb', None],
+            [statement.constant for statement in self.optimized.children])
+
+    def test_level_zero(self):
+        self.givenProgram('x = + 1 2;')
+        self.whenOptimize(level=0)
+        self.assertIs(self.ast, self.optimized)
+
+    def test_deep(self):
+        self.givenProgram('x = + 1 2;')
+        for _ in range(sys.getrecursionlimit() * 4):
+            self.ast = Node(type=NodeType.BLOCK, left=self.ast)
+        self.whenOptimize()
+        node = self.optimized
+        while node.type is NodeType.BLOCK:
+            node = node.left
+        self.assertEqual(3, node.children[0].right.constant)
+
+
+class TestSubexpressionOptimizer(unittest.TestCase):
+    def givenProgramLines(self, lines):
+        self.ast = parser(lex.from_program_lines(lines))
+
+    def whenOptimize(self):
+        self.optimized = Optimizer(OPTIMIZE_LOOPS)(self.ast)
+
+    def thenStatements(self, expected_statements):
+        # Statements of the optimized tree, on one line each
+        statements = []
+        for line in self.optimized.as_lines():
+            if line.split('\t')[0] in STATEMENT_NAMES:
+                statements.append([])
+            if len(statements) > 0:
+                statements[-1].append(line.replace('\t', ' '))
+        self.assertEqual(expected_statements, [
+            ' '.join(words) for words in statements])
+
+    def thenSameOutput(self):
+        outputs = []
+        for ast in [self.ast, self.optimized]:
+            for engine_class in [Walker, ClosureEngine, VirtualMachine, PythonEngine]:
+                stdout = io.StringIO()
+                with contextlib.redirect_stdout(stdout):
+                    engine_class()(ast)
+                outputs.append(stdout.getvalue())
+        self.assertEqual([outputs[0]] * len(outputs), outputs)
+
+    def test_hoist_invariant(self):
+        self.givenProgramLines([
+            'n = 10; k = 3; t = 0; i = 0;',
+            'while (< i (* n 2)) { t = + t (* k (+ n 1)); i = + i 1; }',
+            'print(t);',
+        ])
+        self.whenOptimize()
+        self.thenStatements([
+            'ASSIGN IDENTIFIER n INT 10',
+            'ASSIGN IDENTIFIER k INT 3',
+            'ASSIGN IDENTIFIER t INT 0',
+            'ASSIGN IDENTIFIER i INT 0',
+            'BLOCK STATEMENT_LIST 3',
+            'ASSIGN IDENTIFIER τ0 MULTIPLY IDENTIFIER n INT 2',
+            'ASSIGN IDENTIFIER τ1 MULTIPLY IDENTIFIER k ADD IDENTIFIER n INT 1',
+            'WHILE LESS_THAN IDENTIFIER i IDENTIFIER τ0',
+            'BLOCK STATEMENT_LIST 2',
+            'ASSIGN IDENTIFIER t ADD IDENTIFIER t IDENTIFIER τ1',
+            'ASSIGN IDENTIFIER i ADD IDENTIFIER i INT 1 ; ;',
+            'PRINT_STRING IDENTIFIER t ;',
+        ])
+        self.thenSameOutput()
+
+    def test_not_hoisted(self):
+        self.givenProgramLines([
+            'n = 2; d = 0; s = "a"; i = 0;',
+            'while (< i 3) {',
+            # Assigned in the loop, may fail, not an int
+            '    n = + n 1; i = + i (/ n n); print(/ 1 d); print(+ s s);',
+            '}',
+        ])
+        self.whenOptimize()
+        self.assertEqual(list(self.ast.as_lines()), list(self.optimized.as_lines()))
+
+    def test_nested_loops(self):
+        self.givenProgramLines([
+            'n = 3; i = 0;',
+            'while (< i n) {',
+            '    j = 0;',
+            '    while (< j (+ i n)) { print(* (+ i n) (- n 1)); j = + j 1; }',
+            '    i = + i 1;',
+            '}',
+        ])
+        self.whenOptimize()
+        self.thenStatements([
+            'ASSIGN IDENTIFIER n INT 3',
+            'ASSIGN IDENTIFIER i INT 0',
+            'BLOCK STATEMENT_LIST 2',
+            'ASSIGN IDENTIFIER τ0 SUBTRACT IDENTIFIER n INT 1',
+            'WHILE LESS_THAN IDENTIFIER i IDENTIFIER n',
+            'BLOCK STATEMENT_LIST 3',
+            'ASSIGN IDENTIFIER j INT 0',
+            # Depends on i, computed once per run of the inner loop
+            'BLOCK STATEMENT_LIST 3',
+            'ASSIGN IDENTIFIER τ1 ADD IDENTIFIER i IDENTIFIER n',
+            'ASSIGN IDENTIFIER τ2 MULTIPLY ADD IDENTIFIER i IDENTIFIER n IDENTIFIER τ0',
+            'WHILE LESS_THAN IDENTIFIER j IDENTIFIER τ1',
+            'BLOCK STATEMENT_LIST 2',
+            'PRINT_STRING IDENTIFIER τ2 ;',
+            'ASSIGN IDENTIFIER j ADD IDENTIFIER j INT 1 ; ;',
+            'ASSIGN IDENTIFIER i ADD IDENTIFIER i INT 1 ; ;',
+        ])
+        self.thenSameOutput()
+
+    def test_common_subexpression(self):
+        self.givenProgramLines([
+            '{',
+            '    x = 3;',
+            '    a = / (* x x) 2;',
+            '    if (> (* x x) 5) { print(+ a (* x x)); }',
+            '    x = 4;',
+            '    b = * x x;',
+            '    print([a, b, ]);',
+            '}',
+        ])
+        self.whenOptimize()
+        self.thenStatements([
+            'BLOCK STATEMENT_LIST 7',
+            'ASSIGN IDENTIFIER x INT 3',
+            'ASSIGN IDENTIFIER τ0 MULTIPLY IDENTIFIER x IDENTIFIER x',
+            'ASSIGN IDENTIFIER a DIVIDE IDENTIFIER τ0 INT 2',
+            'IF GREATER_THAN IDENTIFIER τ0 INT 5',
+            # Only conditions are shared, not statements of branches
+            'IF',
+            'BLOCK STATEMENT_LIST 1',
+            'PRINT_STRING ADD IDENTIFIER a MULTIPLY IDENTIFIER x IDENTIFIER x ; ; ;',
+            'ASSIGN IDENTIFIER x INT 4',
+            'ASSIGN IDENTIFIER b MULTIPLY IDENTIFIER x IDENTIFIER x',
+            'PRINT_STRING ARRAY_LIST 2 IDENTIFIER a IDENTIFIER b ; ;',
+        ])
+        self.thenSameOutput()
+
+    def test_top_level_common_subexpression(self):
+        self.givenProgramLines([
+            'x = 3;',
+            'a = * (+ x 1) 2;',
+            'print(- (+ x 1) a);',
+        ])
+        self.whenOptimize()
+        self.thenStatements([
+            'ASSIGN IDENTIFIER x INT 3',
+            'ASSIGN IDENTIFIER τ0 ADD IDENTIFIER x INT 1',
+            'ASSIGN IDENTIFIER a MULTIPLY IDENTIFIER τ0 INT 2',
+            'PRINT_STRING SUBTRACT IDENTIFIER τ0 IDENTIFIER a ;',
+        ])
+        self.thenSameOutput()
+
+    def test_given_tree_unchanged(self):
+        self.givenProgramLines(['n = 1; while (< n (* 2 n)) { n = 3; }'])
+        lines = list(self.ast.as_lines())
+        self.whenOptimize()
+        self.assertEqual(lines, list(self.ast.as_lines()))
+
+
+class TestOptimizedExamples(unittest.TestCase):
+    def test_same_output(self):
+        for path in sorted(glob.glob(os.path.join(EXAMPLES_PATH, '*.src'))):
+            with open(path) as file:
+                ast = parser(lex.from_program_text(file.read()))
+            for engine_class in [Walker, ClosureEngine, VirtualMachine, PythonEngine]:
+                if (
+                    engine_class in (Walker, VirtualMachine) and
+                    os.path.basename(path) in SLOW_EXAMPLES
+                ):
+                    continue
+                with self.subTest(
+                    'test example {} with {}'.format(path, engine_class.__name__),
+                ):
+                    outputs = []
+                    for level in range(OPTIMIZE_MAX + 1):
+                        stdout = io.StringIO()
+                        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+                            try:
+                                engine_class()(Optimizer(level)(ast))
+                            except Exception as error:
+                                print(type(error).__name__, error)
+                        outputs.append(stdout.getvalue())
+                    self.assertEqual([outputs[0]] * len(outputs), outputs)
@@ -0,0 +1,70 @@
+import contextlib
+import io
+import unittest
+
+from core.closures import ClosureEngine
+from core.lexer import Lexer
+from core.output import FlushMode, Output, unescape
+from core.parser import Parser
+from core.transpiler import PythonEngine
+from core.vm import VirtualMachine
+from core.walker import Walker
+
+
+class TestOutput(unittest.TestCase):
+    def givenOutput(self, flush_mode, buffer_size=4):
+        self.sink = io.StringIO()
+        self.output = Output(self.sink, flush_mode, buffer_size)
+
+    def thenSink(self, expected_text: str):
+        self.assertEqual(expected_text, self.sink.getvalue())
+
+    def test_flush_on_line(self):
+        self.givenOutput(FlushMode.LINE)
+        self.output.write('abcdef')
+        self.thenSink('')
+        self.output.write('\n')
+        self.thenSink('abcdef\n')
+
+    def test_flush_on_size(self):
+        self.givenOutput(FlushMode.SIZE)
+        self.output.write('abc')
+        self.output.write('\n')
+        self.thenSink('abc\n')
+        self.output.write('d')
+        self.thenSink('abc\n')
+
+    def test_flush_on_exit(self):
+        self.givenOutput(FlushMode.EXIT)
+        self.output.write('abcdef\n')
+        self.thenSink('')
+        self.assertEqual('abcdef\n', self.output.getvalue())
+        self.output.flush()
+        self.thenSink('abcdef\n')
+        self.assertEqual('', self.output.getvalue())
+
+    def test_standard_output_when_flushed(self):
+        output = Output()
+        output.write('a')
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            output.flush()
+        self.assertEqual('a', stdout.getvalue())
+
+    def test_unescape(self):
+        self.assertEqual('a\nb\t', unescape(r'a\nb\t'))
+        self.assertEqual('ab', unescape('ab'))
+
+
+class TestEngineOutput(unittest.TestCase):
+    def test_injected_sink(self):
+        ast = Parser()(Lexer().from_program_text(
+            'putc(97); print([1, "b\\n", ]); x = "c"; print(x);'))
+        for engine_class in [Walker, ClosureEngine, VirtualMachine, PythonEngine]:
+            with self.subTest(engine=engine_class.__name__):
+                sink = io.StringIO()
+                stdout = io.StringIO()
+                with contextlib.redirect_stdout(stdout):
+                    engine_class(output=Output(sink, FlushMode.EXIT))(ast)
+                self.assertEqual('a1b\nc', sink.getvalue())
+                self.assertEqual('', stdout.getvalue())
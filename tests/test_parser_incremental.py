@@ -0,0 +1,66 @@
+from core.lexer import Lexer, LineTokenCache
+from core.parser import IncrementalParser, Parser
+from tests.parser_test_base import ParserTestBase
+
+
+lex = Lexer()
+
+
+class TestIncrementalParser(ParserTestBase):
+    def setUp(self):
+        self.lexer = Lexer(cache=LineTokenCache())
+        self.incremental_parser = IncrementalParser()
+
+    def whenParseIncremental(self, lines):
+        self.ast = self.incremental_parser(
+            self.lexer.from_program_lines(lines), lines)
+
+    def thenSameAsFullParse(self, lines):
+        self.thenReturnNode(Parser()(lex.from_program_lines(lines)))
+
+    def thenReused(self, count):
+        self.assertEqual(count, self.incremental_parser.reused)
+
+    def test_first_parse(self):
+        lines = ['x = 1;', 'y = 2;']
+        self.whenParseIncremental(lines)
+        self.thenSameAsFullParse(lines)
+        self.thenReused(0)
+
+    def test_change_line(self):
+        self.whenParseIncremental(['x = 1;', 'y = 2;', 'z = 3;'])
+        lines = ['x = 1;', 'y = 20;', 'z = 3;']
+        self.whenParseIncremental(lines)
+        self.thenSameAsFullParse(lines)
+        self.thenReused(2)
+        self.assertEqual(1, self.lexer.cache.misses - 3)
+
+    def test_insert_line_shifts_rows(self):
+        self.whenParseIncremental(['x = 1;', 'while (0) {', '  x = 2;', '}'])
+        lines = ['x = 1;', 'print(x);', 'while (0) {', '  x = 2;', '}']
+        self.whenParseIncremental(lines)
+        self.thenSameAsFullParse(lines)
+        self.thenReused(2)
+
+    def test_lookahead_changed(self):
+        self.whenParseIncremental(['if (1)', '  x = 1;', 'y = 2;'])
+        lines = ['if (1)', '  x = 1;', 'else', '  x = 2;', 'y = 2;']
+        self.whenParseIncremental(lines)
+        self.thenSameAsFullParse(lines)
+        self.thenReused(1)
+
+    def test_statement_swallowed_by_block(self):
+        self.whenParseIncremental(['x = 1;', 'y = 2;', 'z = 3;'])
+        lines = ['x = 1;', '{', 'y = 2;', 'z = 3;', '}']
+        self.whenParseIncremental(lines)
+        self.thenSameAsFullParse(lines)
+        self.thenReused(1)
+
+    def test_after_failed_parse(self):
+        self.whenParseIncremental(['x = 1;', 'y = 2;'])
+        with self.assertRaises(Exception):
+            self.whenParseIncremental(['x = 1;', 'y = ;'])
+        lines = ['x = 1;', 'y = 3;']
+        self.whenParseIncremental(lines)
+        self.thenSameAsFullParse(lines)
+        self.thenReused(0)
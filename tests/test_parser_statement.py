@@ -11,7 +11,8 @@ class TestParserStatementSemicolon(ParserTestBase):
         ])
         self.whenParse()
         self.thenReturnNode(Node(
-            type=NodeType.SEQUENCE,
+            type=NodeType.STATEMENT_LIST,
+            children=[],
         ))
     
     def test_semicolon_as_lines(self):
@@ -26,6 +27,66 @@ class TestParserStatementSemicolon(ParserTestBase):
         ])
 
 
+class TestParserStatementList(ParserTestBase):
+    def test_statements_in_order(self):
+        self.givenTokens([
+            Token(1, 1, TokenType.KEYWORD_PRINT_CHARACTER.name, None),
+            Token(1, 5, TokenType.SYMBOL_OPEN_PARENTHESIS.name, None),
+            Token(1, 6, TokenType.LITERAL_INT.name, '1'),
+            Token(1, 7, TokenType.SYMBOL_CLOSE_PARENTHESIS.name, None),
+            Token(1, 8, TokenType.SYMBOL_SEMICOLON.name, None),
+            Token(2, 1, TokenType.SYMBOL_OPEN_BRACE.name, None),
+            Token(2, 2, TokenType.SYMBOL_CLOSE_BRACE.name, None),
+            Token(3, 1, TokenType.TERMINAL.name, None),
+        ])
+        self.whenParse()
+        self.thenReturnNode(Node(
+            type=NodeType.STATEMENT_LIST,
+            children=[
+                Node(
+                    type=NodeType.PRINT_CHARACTER,
+                    left=Node(
+                        type=NodeType.INT,
+                        value='1',
+                    ),
+                ),
+                Node(
+                    type=NodeType.BLOCK,
+                    left=Node(
+                        type=NodeType.STATEMENT_LIST,
+                        children=[],
+                    ),
+                ),
+            ],
+        ))
+
+    def test_statements_as_lines(self):
+        self.givenNode(Node(
+            type=NodeType.STATEMENT_LIST,
+            children=[
+                Node(
+                    type=NodeType.PRINT_CHARACTER,
+                    left=Node(
+                        type=NodeType.INT,
+                        value='1',
+                    ),
+                ),
+                Node(
+                    type=NodeType.STATEMENT_LIST,
+                    children=[],
+                ),
+            ],
+        ))
+        self.whenNodeAsLines()
+        self.thenReturnLines([
+            NodeType.STATEMENT_LIST.name + '\t' + '2',
+            NodeType.PRINT_CHARACTER.name,
+            NodeType.INT.name + '\t' + '1',
+            ';',
+            NodeType.STATEMENT_LIST.name + '\t' + '0',
+        ])
+
+
 class TestParserStatementAssignment(ParserTestBase):
     def test_assign_literal_integer(self):
         self.givenTokens([
@@ -37,8 +98,8 @@ class TestParserStatementAssignment(ParserTestBase):
         ])
         self.whenParse()
         self.thenReturnNode(Node(
-            type=NodeType.SEQUENCE,
-            left=Node(
+            type=NodeType.STATEMENT_LIST,
+            children=[Node(
                 type=NodeType.ASSIGN,
                 left=Node(
                     type=NodeType.IDENTIFIER,
@@ -48,7 +109,7 @@ class TestParserStatementAssignment(ParserTestBase):
                     type=NodeType.INT,
                     value='123',
                 ),
-            ),
+            )],
         ))
 
     def test_assign_identifier(self):
@@ -61,8 +122,8 @@ class TestParserStatementAssignment(ParserTestBase):
         ])
         self.whenParse()
         self.thenReturnNode(Node(
-            type=NodeType.SEQUENCE,
-            left=Node(
+            type=NodeType.STATEMENT_LIST,
+            children=[Node(
                 type=NodeType.ASSIGN,
                 left=Node(
                     type=NodeType.IDENTIFIER,
@@ -72,7 +133,7 @@ class TestParserStatementAssignment(ParserTestBase):
                     type=NodeType.IDENTIFIER,
                     value='xyz',
                 ),
-            ),
+            )],
         ))
 
 
@@ -88,14 +149,14 @@ class TestParserStatementPrintCharacter(ParserTestBase):
         ])
         self.whenParse()
         self.thenReturnNode(Node(
-            type=NodeType.SEQUENCE,
-            left=Node(
+            type=NodeType.STATEMENT_LIST,
+            children=[Node(
                 type=NodeType.PRINT_CHARACTER,
                 left=Node(
                     type=NodeType.INT,
                     value='123',
                 ),
-            ),
+            )],
         ))
 
     def test_print_character_integer_as_lines(self):
@@ -135,8 +196,8 @@ class TestParserStatementIf(ParserTestBase):
         ])
         self.whenParse()
         self.thenReturnNode(Node(
-            type=NodeType.SEQUENCE,
-            left=Node(
+            type=NodeType.STATEMENT_LIST,
+            children=[Node(
                 type=NodeType.IF,
                 left=Node(
                     type=NodeType.IDENTIFIER,
@@ -155,7 +216,7 @@ class TestParserStatementIf(ParserTestBase):
                         ),
                     ),
                 ),
-            ),
+            )],
         ))
 
     def test_if_else(self):
@@ -179,8 +240,8 @@ class TestParserStatementIf(ParserTestBase):
         ])
         self.whenParse()
         self.thenReturnNode(Node(
-            type=NodeType.SEQUENCE,
-            left=Node(
+            type=NodeType.STATEMENT_LIST,
+            children=[Node(
                 type=NodeType.IF,
                 left=Node(
                     type=NodeType.IDENTIFIER,
@@ -209,5 +270,5 @@ class TestParserStatementIf(ParserTestBase):
                         ),
                     ),
                 ),
-            ),
+            )],
         ))
@@ -0,0 +1,49 @@
+from core.ast import NodeType
+from core.lexer import Lexer
+from core.tokens import Token, TokenType
+from tests.parser_test_base import ParserTestBase, parser
+
+
+lex = Lexer()
+
+
+class TestParserStream(ParserTestBase):
+    def test_statements_in_order(self):
+        statements = list(parser.stream(lex.from_program_lines([
+            'x = 1;;',
+            'print(x); { y = 2; }',
+        ])))
+        self.assertEqual(
+            [NodeType.ASSIGN, NodeType.PRINT_STRING, NodeType.BLOCK],
+            [statement.type for statement in statements])
+
+    def test_same_as_statement_list(self):
+        lines = ['x = 1;', 'while (< x 3) x = + x 1;', 'print(x);']
+        self.givenTokens(lex.from_program_lines(lines))
+        self.whenParse()
+        self.assertEqual(
+            [statement.as_dict() for statement in self.ast.children],
+            [statement.as_dict() for statement in parser.stream(lex.from_program_lines(lines))])
+
+    def test_lazy(self):
+        consumed = []
+
+        def tokens():
+            for token in [
+                Token(1, 1, TokenType.IDENTIFIER.name, 'x'),
+                Token(1, 3, TokenType.OPERATOR_ASSIGN.name, None),
+                Token(1, 5, TokenType.LITERAL_INT.name, '1'),
+                Token(1, 6, TokenType.SYMBOL_SEMICOLON.name, None),
+                Token(2, 1, TokenType.IDENTIFIER.name, 'y'),
+                Token(2, 3, TokenType.SYMBOL_SEMICOLON.name, None),
+                Token(3, 1, TokenType.TERMINAL.name, None),
+            ]:
+                consumed.append(token)
+                yield token
+
+        statements = parser.stream(tokens())
+        self.assertIs(NodeType.ASSIGN, next(statements).type)
+        # Only the lookahead token of the next statement was read
+        self.assertEqual(5, len(consumed))
+        with self.assertRaises(Exception):
+            next(statements)
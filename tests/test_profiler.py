@@ -0,0 +1,152 @@
+import itertools
+import json
+import unittest
+
+from core.ast import NodeType
+from core.cache import dump_ast, load_ast
+from core.lexer import Lexer, LineTokenCache
+from core.optimizer import OPTIMIZE_LOOPS, Optimizer
+from core.parser import IncrementalParser, Parser
+from core.profiler import Profiler
+from core.walker import Walker
+from tests.walker_test_base import WalkerTestBase
+
+
+lex = Lexer()
+parser = Parser()
+
+
+def parse_lines(lines):
+    return parser(lex.from_program_lines(lines))
+
+
+class TestNodePositions(unittest.TestCase):
+    def thenPosition(self, node, expected_type, expected_position):
+        self.assertIs(expected_type, node.type)
+        self.assertEqual(expected_position, (node.row, node.column))
+
+    def test_parsed(self):
+        ast = parse_lines(['x = 1;', 'while (< x 3) {', '  x = + x 1;', '}'])
+        assign, loop = ast.children
+        self.thenPosition(assign, NodeType.ASSIGN, (1, 1))
+        self.thenPosition(assign.right, NodeType.INT, (1, 5))
+        self.thenPosition(loop, NodeType.WHILE, (2, 1))
+        self.thenPosition(loop.left, NodeType.LESS_THAN, (2, 8))
+        self.thenPosition(loop.right, NodeType.BLOCK, (2, 15))
+        self.thenPosition(loop.right.left.children[0].right, NodeType.ADD, (3, 7))
+
+    def test_cached(self):
+        ast = load_ast(dump_ast(parse_lines(['x = 1;', '  print(x);'])))
+        self.thenPosition(ast.children[1], NodeType.PRINT_STRING, (2, 3))
+        self.thenPosition(ast.children[1].left, NodeType.IDENTIFIER, (2, 9))
+
+    def test_optimized(self):
+        ast = Optimizer(OPTIMIZE_LOOPS)(parse_lines([
+            'i = 0;',
+            'while (< i 3) { i = + i (* 2 3); }',
+        ]))
+        loop = ast.children[1]
+        self.thenPosition(loop, NodeType.WHILE, (2, 1))
+        self.thenPosition(loop.right.left.children[0].right.right, NodeType.INT, (2, 26))
+
+    def test_reused_after_inserted_line(self):
+        lexer = Lexer(cache=LineTokenCache())
+        incremental_parser = IncrementalParser()
+        lines = ['x = 1;', 'while (0) {', '  x = 2;', '}']
+        incremental_parser(lexer.from_program_lines(lines), lines)
+        lines = ['x = 1;', 'print(x);', 'while (0) {', '  x = 2;', '}']
+        ast = incremental_parser(lexer.from_program_lines(lines), lines)
+        self.assertEqual(2, incremental_parser.reused)
+        loop = ast.children[2]
+        self.thenPosition(loop, NodeType.WHILE, (3, 1))
+        self.thenPosition(loop.right.left.children[0], NodeType.ASSIGN, (4, 3))
+
+
+class TestProfiler(WalkerTestBase):
+    def setUp(self):
+        # Every reading of the clock is a second later
+        self.profiler = Profiler(clock=itertools.count().__next__)
+        self.engine_class = lambda: Walker(profiler=self.profiler)
+
+    def test_lines(self):
+        self.givenProgramLines([
+            'i = 0;',
+            'while (< i 3) {',
+            '  i = + i 1;',
+            '}',
+        ])
+        self.whenWalk()
+        self.thenVariable('i', 3)
+        lines = dict((line.row, line) for line in self.profiler.lines())
+        self.assertEqual([1, 2, 3], sorted(lines))
+        # Assign, add, identifier and int, three times
+        self.assertEqual(12, lines[3].visits)
+        self.assertGreater(lines[3].time, lines[1].time)
+        self.assertEqual(self.profiler.total_time, sum(
+            line.time for line in lines.values()))
+
+    def test_loops(self):
+        self.givenProgramLines([
+            'i = 0;',
+            'while (< i 2) {',
+            '  j = 0;',
+            '  while (< j 3) { j = + j 1; }',
+            '  i = + i 1;',
+            '}',
+        ])
+        self.whenWalk()
+        outer, inner = self.profiler.loops()
+        self.assertEqual((2, 2), (outer.row, outer.iterations))
+        self.assertEqual((4, 6), (inner.row, inner.iterations))
+        self.assertGreater(outer.time, inner.time)
+
+    def test_hot_loops_walked(self):
+        self.givenProgramLine('i = 0; while (< i 200) { i = + i 1; }')
+        self.whenWalk()
+        self.assertEqual(dict(), self.walker.specialized_loops)
+        self.assertEqual(200, self.profiler.loops()[0].iterations)
+
+    def test_indexed_identifiers(self):
+        self.givenProgramLine('a = [1, ]; m = 0; m#0 = 1; x = + (a @ 0) (m # 0);')
+        self.whenWalk()
+        visited = set(
+            profile.node.type for profile in self.profiler.profiles.values())
+        self.assertIn(NodeType.IDENTIFIER_ARRAY, visited)
+        self.assertIn(NodeType.IDENTIFIER_MAP, visited)
+
+    def test_failed_walk(self):
+        self.givenProgramLine('i = 0; while (< i 3) { i = + i 1; x = / 1 (- 2 i); }')
+        with self.assertRaises(ZeroDivisionError):
+            self.whenWalk()
+        self.walker(parse_lines(['y = 1;']))
+        self.assertEqual([], self.profiler.frames)
+        # Failed in the second
+        self.assertEqual(2, self.profiler.loops()[0].iterations)
+
+    def test_json(self):
+        self.givenProgramLine('i = 0; while (< i 3) { i = + i 1; }')
+        self.whenWalk()
+        profile = json.loads(self.profiler.as_json())
+        self.assertEqual([1], [line['row'] for line in profile['lines']])
+        self.assertEqual(3, profile['loops'][0]['iterations'])
+        self.assertIn(
+            dict(type='WHILE', row=1, column=8, visits=1),
+            [
+                dict((key, node[key]) for key in ('type', 'row', 'column', 'visits'))
+                for node in profile['nodes']
+            ])
+
+    def test_report(self):
+        self.givenProgramLines(['i = 0;', 'while (< i 3) { i = + i 1; }'])
+        self.whenWalk()
+        report = list(self.profiler.report(self.program_lines))
+        self.assertIn('Hottest lines', report)
+        self.assertTrue(any(
+            line.split()[:2] == ['2', '3'] and line.endswith(self.program_lines[1])
+            for line in report[report.index('Hottest loops'):]))
+
+    def test_disabled(self):
+        walker = Walker()
+        self.assertIsNone(walker.profiler)
+        self.assertEqual(Walker.evaluate, walker.evaluate.__func__)
+        self.assertEqual(Walker.evaluate_value, walker.evaluate_value.__func__)
@@ -0,0 +1,90 @@
+import sys
+import unittest
+
+from core.ast import Node, NodeType
+from core.resolver import Resolver, Slot
+from core.variables import Variable, VariableType
+
+
+def identifier(name: str) -> Node:
+    return Node(type=NodeType.IDENTIFIER, value=name)
+
+
+def binary(node_type: NodeType, left: Node, right: Node) -> Node:
+    return Node(type=node_type, left=left, right=right)
+
+
+class TestResolver(unittest.TestCase):
+    def setUp(self):
+        self.resolver = Resolver()
+
+    def test_slots_in_order_of_declaration(self):
+        self.assertEqual(Slot(0, 0, int), self.resolver.declare('x', int))
+        self.assertEqual(Slot(0, 1, None), self.resolver.declare('y', None))
+        self.resolver.enter()
+        self.assertEqual(Slot(1, 0, str), self.resolver.declare('z', str))
+        self.assertEqual(Slot(0, 1, None), self.resolver.resolve('y'))
+        self.assertEqual(1, self.resolver.exit())
+        self.assertIsNone(self.resolver.resolve('z'))
+
+    def test_sibling_blocks(self):
+        self.resolver.enter()
+        self.resolver.declare('x', int)
+        self.resolver.exit()
+        self.resolver.enter()
+        self.assertIsNone(self.resolver.resolve('x'))
+        self.assertEqual(Slot(1, 0, list), self.resolver.declare('x', list))
+
+    def test_variables_of_earlier_runs(self):
+        resolver = Resolver(dict([
+            ('x', Variable('x', VariableType.INT, 1)),
+            ('m#', Variable('m#', VariableType.MAP, dict())),
+        ]))
+        self.assertEqual(Slot(0, 0, int), resolver.resolve('x'))
+        self.assertEqual(Slot(0, 1, dict), resolver.resolve('m#'))
+        self.assertEqual(['x', 'm#'], resolver.global_names())
+
+
+class TestExpressionType(unittest.TestCase):
+    def setUp(self):
+        self.resolver = Resolver()
+        self.resolver.declare('i', int)
+        self.resolver.declare('s', str)
+        self.resolver.declare('u', None)
+
+    def thenType(self, node: Node, expected_type):
+        self.assertIs(expected_type, self.resolver.expression_type(node))
+
+    def test_literal(self):
+        self.thenType(Node(type=NodeType.INT, value=1), int)
+        self.thenType(Node(type=NodeType.STR, value='a'), str)
+        self.thenType(Node(type=NodeType.ARRAY_LIST, children=[]), list)
+
+    def test_arithmetic(self):
+        self.thenType(binary(NodeType.MULTIPLY, identifier('i'), identifier('i')), int)
+        self.thenType(binary(NodeType.ADD, identifier('s'), identifier('s')), str)
+        self.thenType(binary(NodeType.MULTIPLY, identifier('s'), identifier('i')), None)
+        self.thenType(binary(NodeType.MULTIPLY, identifier('i'), identifier('u')), None)
+        self.thenType(binary(NodeType.MOD, identifier('u'), identifier('i')), None)
+
+    def test_int_operand(self):
+        # Fails unless both are int
+        self.thenType(binary(NodeType.ADD, identifier('i'), identifier('u')), int)
+        self.thenType(binary(NodeType.SUBTRACT, identifier('u'), identifier('i')), int)
+        self.thenType(binary(NodeType.DIVIDE, identifier('u'), identifier('i')), int)
+        self.thenType(binary(NodeType.MOD, identifier('i'), identifier('u')), int)
+
+    def test_comparison(self):
+        self.thenType(binary(NodeType.LESS_THAN, identifier('u'), identifier('s')), int)
+
+    def test_deeply_nested(self):
+        node = identifier('i')
+        for _ in range(sys.getrecursionlimit()):
+            node = binary(NodeType.ADD, node, identifier('i'))
+        self.thenType(node, int)
+
+    def test_unknown(self):
+        self.thenType(identifier('undeclared'), None)
+        self.thenType(binary(NodeType.OR, identifier('i'), identifier('s')), None)
+        self.thenType(binary(NodeType.IDENTIFIER_ARRAY, identifier('u'), identifier('i')), None)
+
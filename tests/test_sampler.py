@@ -0,0 +1,85 @@
+from core.sampler import SamplingProfiler
+from core.walker import Walker
+from tests.walker_test_base import WalkerTestBase
+
+
+class TestSamplingProfiler(WalkerTestBase):
+    def givenSampler(self, walker):
+        self.walker = walker
+        self.sampler = SamplingProfiler(walker, name='test.src')
+
+    def whenStart(self):
+        self.whenParse()
+        self.walker.start(self.ast)
+
+    def whenSampleAfter(self, steps):
+        self.walker.resume(steps)
+        self.sampler.sample()
+
+    def thenCollapsed(self, expected_lines):
+        self.assertEqual(expected_lines, list(self.sampler.collapsed()))
+
+    def test_nested_path(self):
+        self.givenSampler(Walker())
+        self.givenProgramLines([
+            'i = 0;',
+            'while (< i 2) {',
+            '  if (== i 1) {',
+            '    x = i;',
+            '  }',
+            '  i = + i 1;',
+            '}',
+        ])
+        self.whenStart()
+        self.whenSampleAfter(1)
+        steps = 0
+        while not self.walker.finished:
+            self.whenSampleAfter(1)
+            steps += 1
+        self.assertEqual(steps, sum(self.sampler.samples.values()))
+        paths = set(self.sampler.samples)
+        self.assertIn(('test.src',), paths)
+        self.assertIn(('test.src', 'while:2', 'block:2', 'if:3', 'block:3'), paths)
+        self.assertNotIn(('test.src', 'while:2', 'if:3'), paths)
+
+    def test_not_walking(self):
+        self.givenSampler(Walker())
+        self.sampler.sample()
+        self.thenCollapsed([])
+
+    def test_compiled_loop(self):
+        walker = Walker()
+        self.givenSampler(walker)
+        # Sampled whenever the program writes
+        walker.output.write = lambda text: self.sampler.sample()
+        self.givenProgramLines([
+            'i = 0;',
+            'while (< i 200) {',
+            '  putc(46); i = + i 1;',
+            '}',
+        ])
+        self.whenParse()
+        walker(self.ast)
+        self.assertEqual(1, len(walker.specialized_loops))
+        self.thenCollapsed([
+            'test.src;while:2 101',
+            'test.src;while:2;block:2 99',
+        ])
+
+    def test_thread(self):
+        walker = Walker()
+        self.givenSampler(walker)
+        self.sampler.interval = 0.0001
+        self.givenProgramLine('i = 0; while (< i 20000) { s = "a"; i = + i 1; }')
+        self.whenParse()
+        self.sampler.start()
+        try:
+            walker(self.ast)
+        finally:
+            self.sampler.stop()
+        self.assertIsNone(self.sampler.thread)
+        self.assertGreater(sum(self.sampler.samples.values()), 0)
+        for line in self.sampler.collapsed():
+            path, count = line.rsplit(' ', 1)
+            self.assertTrue(path.startswith('test.src'))
+            self.assertGreater(int(count), 0)
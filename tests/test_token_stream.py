@@ -0,0 +1,107 @@
+import io
+import unittest
+
+from core.ast import NodeType
+from core.errors import TokenFileError
+from core.lexer import Lexer
+from core.tokens import Token, TokenStream, TokenType
+from tests.parser_test_base import ParserTestBase
+
+
+lex = Lexer()
+
+
+class TestTokenStream(unittest.TestCase):
+    def test_round_trip(self):
+        tokens = list(lex.from_program_lines([
+            'count = 1;',
+            'while (< count 10) print(["count is: ", count, "\\n", ]);',
+        ]))
+        stream = TokenStream.from_tokens(tokens)
+        self.assertEqual(len(tokens), len(stream))
+        self.assertEqual(tokens, list(stream))
+        self.assertEqual(tokens[3], stream[3])
+
+    def test_values_are_interned(self):
+        stream = TokenStream.from_tokens([
+            Token(1, 1, TokenType.IDENTIFIER.name, 'count'),
+            Token(1, 7, TokenType.IDENTIFIER.name, 'count'),
+            Token(1, 13, TokenType.SYMBOL_SEMICOLON.name, None),
+        ])
+        self.assertEqual([None, 'count'], stream.values)
+        self.assertEqual([1, 1, 0], list(stream.value_ids))
+
+    def test_ids(self):
+        stream = TokenStream.from_tokens([
+            Token(1, 1, TokenType.KEYWORD_WHILE.name, None),
+        ])
+        self.assertEqual([TokenType.KEYWORD_WHILE.id], list(stream.ids))
+
+
+class TestTokenStreamBinary(unittest.TestCase):
+    def dump(self, stream: TokenStream) -> bytes:
+        file = io.BytesIO()
+        stream.dump(file)
+        return file.getvalue()
+
+    def test_round_trip(self):
+        tokens = list(lex.from_program_lines([
+            'print("tab\tand \'quote\'");',
+            'x = "héllo";',
+        ]))
+        data = self.dump(TokenStream.from_tokens(tokens))
+        self.assertTrue(data.startswith(b'ELTK'))
+        self.assertEqual(tokens, list(TokenStream.load(io.BytesIO(data))))
+
+    def test_empty(self):
+        data = self.dump(TokenStream())
+        self.assertEqual(0, len(TokenStream.load(io.BytesIO(data))))
+
+    def test_invalid_magic(self):
+        with self.assertRaises(TokenFileError):
+            TokenStream.load(io.BytesIO(b'1\t1\tTERMINAL\n'))
+
+    def test_unsupported_version(self):
+        data = bytearray(self.dump(TokenStream()))
+        data[4] = 99
+        with self.assertRaises(TokenFileError):
+            TokenStream.load(io.BytesIO(bytes(data)))
+
+    def test_truncated(self):
+        data = self.dump(TokenStream.from_tokens(lex.from_program_lines(['x = 1;'])))
+        with self.assertRaises(TokenFileError):
+            TokenStream.load(io.BytesIO(data[:-1]))
+
+
+    def test_truncated_column(self):
+        # Rows of 3 bytes, not a whole u32
+        data = b''.join([
+            b'ELTK\x01\x00',
+            b'\x00\x00\x00\x00',
+            b'\x01\x00\x00\x00\x01',
+            b'\x03\x00\x00\x00\x01\x00\x00',
+            b'\x00\x00\x00\x00',
+            b'\x00\x00\x00\x00',
+        ])
+        with self.assertRaisesRegex(TokenFileError, 'truncated'):
+            TokenStream.load(io.BytesIO(data))
+
+    def test_fixed_width(self):
+        stream = TokenStream.from_tokens(lex.from_program_lines(['x = 1;']))
+        for column in [stream.rows, stream.columns, stream.value_ids]:
+            self.assertEqual(4, column.itemsize)
+
+
+class TestParserTokenStream(ParserTestBase):
+    def test_same_as_tokens(self):
+        tokens = list(lex.from_program_lines([
+            'x = 1;',
+            'if (< x 2) { putc(+ x 64); } else print("no");',
+        ]))
+        self.givenTokens(tokens)
+        self.whenParse()
+        expected = self.ast
+        self.givenTokens(TokenStream.from_tokens(tokens))
+        self.whenParse()
+        self.thenReturnNode(expected)
+        self.assertIs(NodeType.STATEMENT_LIST, self.ast.type)
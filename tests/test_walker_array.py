@@ -0,0 +1,97 @@
+from unittest import mock
+
+from core.ast import NodeType
+from tests.walker_test_base import WalkerTestBase
+
+
+class TestArrayLiteral(WalkerTestBase):
+    def test_in_order(self):
+        self.givenProgramLine('a = [1, "two", + 1 2, ];')
+        self.whenWalk()
+        self.thenVariable('a', [1, 'two', 3])
+
+    def test_empty(self):
+        self.givenProgramLine('a = [];')
+        self.whenWalk()
+        self.thenVariable('a', [])
+
+    def test_literals_built_at_parse_time(self):
+        self.givenProgramLine('a = [[1, 2, ], "x", ];')
+        self.whenParse()
+        array = self.ast.children[0].right
+        self.assertIs(NodeType.ARRAY_LIST, array.type)
+        self.assertEqual([[1, 2], 'x'], array.constant)
+
+    def test_literal_copied_on_every_evaluation(self):
+        self.givenProgramLines([
+            'i = 0;',
+            'while (< i 2) {',
+            '    a = [[0, ], ];',
+            '    print(a @ 0 @ 0);',
+            '    a @ 0 @ 0 = 9;',
+            '    i = + i 1;',
+            '}',
+        ])
+        self.whenWalk()
+        self.thenPrint('00')
+
+    def test_elements_dereferenced(self):
+        self.givenProgramLines([
+            'a = [1, 2, ];',
+            'b = [a @ 1, ];',
+            'a @ 1 = 5;',
+        ])
+        self.whenWalk()
+        self.thenVariable('b', [2])
+
+    def test_long(self):
+        self.givenProgramLine('a = [{}];'.format('+ 1 1, ' * 5000))
+        self.whenWalk()
+        self.thenVariable('a', [2] * 5000)
+
+
+class TestIndexedAccess(WalkerTestBase):
+    def test_nested_read_and_write(self):
+        self.givenProgramLines([
+            'a = [[1, 2, ], [3, 4, ], ];',
+            'a @ 1 @ 0 = + (a @ 1 @ 0) (a @ 0 @ 1);',
+            'print(a @ 1);',
+        ])
+        self.whenWalk()
+        self.thenPrint('54')
+
+    def test_map_read_and_write(self):
+        self.givenProgramLines([
+            'm = 7;',
+            'm # [1, 2, ] = 3;',
+            'm # "x" = + (m # [1, 2, ]) (m # "y");',
+            'print([m # "x", m # 5, ]);',
+        ])
+        self.whenWalk()
+        self.thenPrint('107')
+        self.thenVariable('m#', dict([((1, 2), 3), ('x', 10)]))
+
+    def test_no_wrapper_objects(self):
+        self.givenProgramLines([
+            'a = [[1, ], ];',
+            'm = 0;',
+            'm # 1 = a @ 0 @ 0;',
+            'a @ 0 @ 0 = + (m # 1) 1;',
+            'print(a @ 0 @ 0);',
+        ])
+        with mock.patch('core.walker.IdentifierArray') as identifier_array:
+            with mock.patch('core.walker.IdentifierMap') as identifier_map:
+                self.whenWalk()
+        identifier_array.assert_not_called()
+        identifier_map.assert_not_called()
+        self.thenPrint('2')
+
+    def test_undefined_map(self):
+        self.givenProgramLines(['m = 0;', 'x = m # 1;'])
+        with self.assertRaisesRegex(Exception, 'm# is undefined'):
+            self.whenWalk()
+
+    def test_not_an_array(self):
+        self.givenProgramLines(['a = 1;', 'x = a @ 0;'])
+        with self.assertRaisesRegex(Exception, 'a is not of type'):
+            self.whenWalk()
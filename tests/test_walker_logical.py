@@ -0,0 +1,46 @@
+from tests.walker_test_base import WalkerTestBase
+
+
+class TestShortCircuit(WalkerTestBase):
+    def test_and_value(self):
+        self.givenProgramLines(['a = and 0 5;', 'b = and 2 5;', 'c = and "x" "y";'])
+        self.whenWalk()
+        self.thenVariable('a', 0)
+        self.thenVariable('b', 5)
+        self.thenVariable('c', 'y')
+
+    def test_or_value(self):
+        self.givenProgramLines(['a = or 0 5;', 'b = or 2 5;', 'c = or "x" "y";'])
+        self.whenWalk()
+        self.thenVariable('a', 5)
+        self.thenVariable('b', 2)
+        self.thenVariable('c', 'x')
+
+    def test_right_not_evaluated(self):
+        self.givenProgramLines(['a = and 0 undefined;', 'b = or 1 undefined;'])
+        self.whenWalk()
+        self.thenVariable('a', 0)
+        self.thenVariable('b', 1)
+
+    def test_right_evaluated(self):
+        self.givenProgramLine('a = and 1 undefined;')
+        with self.assertRaisesRegex(Exception, 'referenced before assignment'):
+            self.whenWalk()
+
+    def test_loop_guard(self):
+        # Index is out of range once the loop ends
+        self.givenProgramLines([
+            'a = [1, 1, ];',
+            'i = 0;',
+            'while (and < i 2 (a @ i)) i = + i 1;',
+        ])
+        self.whenWalk()
+        self.thenVariable('i', 2)
+
+    def test_condition(self):
+        self.givenProgramLines([
+            'if (or 1 undefined) print("a");',
+            'if (and 0 undefined) print("b"); else print("c");',
+        ])
+        self.whenWalk()
+        self.thenPrint('ac')
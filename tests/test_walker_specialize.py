@@ -0,0 +1,82 @@
+import contextlib
+import io
+
+from core.specializer import LoopSpecializer, SpecializedLoop
+from core.variables import Table, Variable, VariableType
+from core.walker import Walker
+from tests.walker_test_base import WalkerTestBase
+
+
+class TestHotLoops(WalkerTestBase):
+    def whenWalkWithout(self):
+        # Same program, every loop walked
+        walker = Walker(hot_loop_iterations=None)
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            walker(self.ast)
+        return stdout.getvalue()
+
+    def thenSpecialized(self, expected_count: int):
+        loops = [
+            loop for loop in self.walker.specialized_loops.values()
+            if loop is not None
+        ]
+        self.assertEqual(expected_count, len(loops))
+
+    def test_hot_loop(self):
+        self.givenProgramLines([
+            'count = 0; n = 1;',
+            'while (< n 500) {',
+            '    n = + n 2; k = 3; p = 1;',
+            '    while (and (<= (* k k) n) p) { p = % n k; k = + k 2; }',
+            '    if (p) { count = + count 1; print([n, " ", ]); }',
+            '}',
+            'putc(10);',
+        ])
+        self.whenWalk()
+        self.thenSpecialized(2)
+        self.thenVariable('count', 94)
+        self.thenVariable('n', 501)
+        self.thenPrint(self.whenWalkWithout())
+
+    def test_cold_loop(self):
+        self.givenProgramLine('i = 0; while (< i 3) { i = + i 1; }')
+        self.whenWalk()
+        self.assertEqual(dict(), self.walker.specialized_loops)
+        self.thenVariable('i', 3)
+
+    def test_not_only_ints(self):
+        self.givenProgramLines([
+            's = "a"; i = 0;',
+            'while (< i 200) { i = + i 1; }',
+            'while (< i 400) { s = + s "b"; i = + i 1; }',
+        ])
+        self.whenWalk()
+        self.thenSpecialized(1)
+        variable, _ = self.walker.table.get('s')
+        self.assertEqual(200, len(variable.value) - 1)
+
+    def test_error_keeps_values(self):
+        self.givenProgramLine(
+            'i = 0; while (< i 200) { i = + i 1; d = / 1 (- 150 i); }')
+        with self.assertRaises(ZeroDivisionError):
+            self.whenWalk()
+        self.thenSpecialized(1)
+        self.thenVariable('i', 150)
+
+    def test_guard(self):
+        self.givenProgramLine('while (< i 10) { j = i; i = + j 1; }')
+        self.whenParse()
+        table = Table()
+        table.set(Variable('i', VariableType.INT, 0))
+        loop = LoopSpecializer()(self.ast.children[0], table)
+        self.assertIsInstance(loop, SpecializedLoop)
+        self.assertEqual(['i'], loop.outer_names)
+        self.assertEqual(['j'], loop.inner_names)
+        self.assertIsNotNone(loop.guard(table))
+        # Declared before the loop this time
+        table.set(Variable('j', VariableType.INT, 0))
+        self.assertIsNone(loop.guard(table))
+        other_table = Table()
+        other_table.set(Variable('i', VariableType.STR, 'a'))
+        self.assertIsNone(loop.guard(other_table))
@@ -0,0 +1,93 @@
+import contextlib
+import io
+import sys
+
+from core.ast import Node, NodeType
+from core.walker import Walker
+from tests.walker_test_base import WalkerTestBase
+
+
+# Deeper than Python recursion allows
+DEPTH = sys.getrecursionlimit() * 4
+
+
+def leaf(node_type: NodeType, value: str) -> Node:
+    return Node(type=node_type, value=value)
+
+
+def assign(name: str, expression: Node) -> Node:
+    return Node(type=NodeType.ASSIGN, left=leaf(NodeType.IDENTIFIER, name), right=expression)
+
+
+class TestWalkerStack(WalkerTestBase):
+    def whenWalkTree(self, ast: Node):
+        self.ast = ast
+        self.walker = Walker()
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self.walker(self.ast)
+        self.output = stdout.getvalue()
+
+    def test_deep_expression(self):
+        expression = leaf(NodeType.INT, '0')
+        for _ in range(DEPTH):
+            expression = Node(
+                type=NodeType.ADD, left=expression, right=leaf(NodeType.INT, '1'))
+        self.whenWalkTree(assign('x', expression))
+        self.thenVariable('x', DEPTH)
+
+    def test_deep_blocks(self):
+        statement = Node(
+            type=NodeType.PRINT_STRING, left=leaf(NodeType.IDENTIFIER, 'x'))
+        for _ in range(DEPTH):
+            statement = Node(type=NodeType.BLOCK, left=statement)
+        self.whenWalkTree(Node(
+            type=NodeType.STATEMENT_LIST,
+            children=[assign('x', leaf(NodeType.INT, '7')), statement]))
+        self.thenPrint('7')
+
+    def test_long_sequence(self):
+        # Chain is linked backwards, from last statement to first
+        sequence = assign('x', leaf(NodeType.INT, '0'))
+        increment = assign('x', Node(
+            type=NodeType.ADD,
+            left=leaf(NodeType.IDENTIFIER, 'x'),
+            right=leaf(NodeType.INT, '1')))
+        for _ in range(DEPTH):
+            sequence = Node(type=NodeType.SEQUENCE, left=increment, right=sequence)
+        self.whenWalkTree(sequence)
+        self.thenVariable('x', DEPTH)
+
+    def test_long_array(self):
+        array = None
+        for index in range(DEPTH):
+            array = Node(
+                type=NodeType.ARRAY, left=leaf(NodeType.INT, str(index)), right=array)
+        self.whenWalkTree(assign('a', array))
+        self.thenVariable('a', list(range(DEPTH)))
+
+    def test_suspend_and_resume(self):
+        self.givenProgramLines([
+            'i = 0;',
+            'while (< i 3) { putc(+ 48 i); i = + i 1; }',
+        ])
+        self.whenParse()
+        walker = Walker()
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            walker.start(self.ast)
+            outputs = []
+            while not walker.resume(steps=5):
+                outputs.append(stdout.getvalue())
+        self.assertTrue(walker.finished)
+        self.assertEqual('012', stdout.getvalue())
+        # Output appeared between steps, one character at a time
+        self.assertEqual(['', '0', '01', '012'], sorted(set(outputs)))
+        variable, _ = walker.table.get('i')
+        self.assertEqual(3, variable.value)
+
+    def test_result_of_expression(self):
+        self.givenProgramLine('x = * 6 7;')
+        self.whenParse()
+        walker = Walker()
+        self.assertEqual(42, walker.walk(self.ast.children[0]))
@@ -0,0 +1,43 @@
+import contextlib
+import io
+import unittest
+
+from typing import Any, Iterable
+
+from core.lexer import Lexer
+from core.parser import Parser
+from core.walker import Walker
+
+
+# Use global - should not accumulate state
+lex = Lexer()
+parser = Parser()
+
+
+class WalkerTestBase(unittest.TestCase):
+    # Anything called with a tree, with a symbol table
+    engine_class = Walker
+
+    def givenProgramLines(self, program_lines: Iterable[str]):
+        self.program_lines = program_lines
+
+    def givenProgramLine(self, program_line: str):
+        self.program_lines = [program_line]
+
+    def whenParse(self):
+        self.ast = parser(lex.from_program_lines(self.program_lines))
+
+    def whenWalk(self):
+        self.whenParse()
+        self.walker = self.engine_class()
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            self.walker(self.ast)
+        self.output = stdout.getvalue()
+
+    def thenPrint(self, expected_output: str):
+        self.assertEqual(expected_output, self.output)
+
+    def thenVariable(self, name: str, expected_value: Any):
+        variable, _ = self.walker.table.get(name)
+        self.assertEqual(expected_value, variable.value)